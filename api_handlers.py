@@ -1,134 +1,186 @@
 import json
 import requests
-import re
 from openai import OpenAI
 import google.generativeai as genai
 from groq import Groq
 from api_management import get_api_key
-from assets import SYSTEM_MESSAGE, USER_MESSAGE, LLAMA_MODEL_FULLNAME, GROQ_LLAMA_MODEL_FULLNAME, OLLAMA_MODEL_NAME
+from assets import SYSTEM_MESSAGE, USER_MESSAGE, LLAMA_MODEL_FULLNAME, GROQ_LLAMA_MODEL_FULLNAME, OLLAMA_MODEL_NAME, STREAMING_SETTINGS, RULE_EXTRACTOR_SETTINGS
 from data_models import generate_system_message
+from stream_parsing import ListingStreamParser
+from rule_extractor import extract_with_rules, first_pass
 import streamlit as st
 
-def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_model):
+def extraction_messages(system_message, data, user_message=USER_MESSAGE):
+    """
+    Chat messages for one extraction call, laid out for provider prompt caching.
+
+    The system message and the static USER_MESSAGE form a prefix that is
+    identical on every page of a crawl; only the page content at the end varies.
+    """
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message + data},
+    ]
+
+def usage_token_counts(usage):
+    """Token counts from an OpenAI-compatible usage object, with cache hits split out."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "input_tokens": usage.prompt_tokens,
+        "output_tokens": usage.completion_tokens,
+        "cached_input_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0
+    }
+
+def estimated_token_counts(prompt, response_content):
+    """Word-count estimate for when the provider reports no usage."""
+    return {
+        "input_tokens": len(prompt.split()),
+        "output_tokens": len(response_content.split())
+    }
+
+def stream_chat_completion(client, parser, **request):
+    """
+    Stream an OpenAI-compatible chat completion into a ListingStreamParser.
+
+    If the stream breaks off after some listings have arrived, those listings
+    are kept and the error is only logged.
+
+    Returns:
+        dict: Token counts from the final usage chunk, or None if the provider sent none
+    """
+    usage = None
+    try:
+        for chunk in client.chat.completions.create(stream=True, **request):
+            if chunk.choices and chunk.choices[0].delta.content:
+                parser.feed(chunk.choices[0].delta.content)
+            # OpenAI and LM Studio send usage on the last chunk, Groq in x_groq
+            chunk_usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if chunk_usage:
+                usage = chunk_usage
+    except Exception as e:
+        if not parser.listings:
+            raise
+        print(f"Stream interrupted after {len(parser.listings)} listings, keeping them: {str(e)}")
+    return usage_token_counts(usage) if usage else None
+
+def format_data(data, DynamicListingsContainer, DynamicListingModel, selected_model, on_listing=None, url=None):
+    """
+    Extract listings from page text with the selected model.
+
+    on_listing, if given, is called with each listing dict as soon as the
+    model has streamed it (OpenAI, LM Studio, Groq and Ollama). selected_model
+    is a model name or a ModelRouter, which uses url for per-domain history.
+    """
     token_counts = {}
     
-    if selected_model in ["gpt-4o-mini", "gpt-4o-2024-08-06"]:
-        return handle_openai(data, DynamicListingsContainer, selected_model)
+    # Zero-cost first pass: pages clean_html marked up fully need no model at all
+    if RULE_EXTRACTOR_SETTINGS['first_pass']:
+        rule_result = first_pass(data, list(DynamicListingModel.model_fields))
+        if rule_result is not None:
+            print(f"Extracted {len(rule_result['listings'])} listings with rules, skipping the model")
+            if on_listing is not None:
+                for listing in rule_result['listings']:
+                    on_listing(listing)
+            return rule_result, {"input_tokens": 0, "output_tokens": 0}
+    
+    if hasattr(selected_model, "extract"):
+        # A ModelRouter picks the model itself, escalating on invalid output
+        return selected_model.extract(data, DynamicListingsContainer, DynamicListingModel, on_listing, url)
+    elif selected_model in ["gpt-4o-mini", "gpt-4o-2024-08-06"]:
+        return handle_openai(data, DynamicListingsContainer, selected_model, on_listing)
     elif selected_model == "gemini-1.5-flash":
         return handle_gemini(data, DynamicListingsContainer)
     elif selected_model == "Llama3.1 8B":
-        return handle_llama(data, DynamicListingModel)
+        return handle_llama(data, DynamicListingModel, on_listing)
     elif selected_model == "Groq Llama3.1 70b":
-        return handle_groq(data, DynamicListingModel)
+        return handle_groq(data, DynamicListingModel, on_listing)
     elif selected_model == "Ollama":
-        return handle_ollama(data, DynamicListingModel)
+        return handle_ollama(data, DynamicListingModel, on_listing)
     else:
         raise ValueError(f"Unsupported model: {selected_model}")
 
-def handle_openai(data, DynamicListingsContainer, selected_model):
+def handle_openai(data, DynamicListingsContainer, selected_model, on_listing=None, user_message=USER_MESSAGE):
     client = OpenAI(api_key=get_api_key('OPENAI_API_KEY'))
-    completion = client.beta.chat.completions.parse(
-        model=selected_model,
-        messages=[
-            {"role": "system", "content": SYSTEM_MESSAGE},
-            {"role": "user", "content": USER_MESSAGE + data},
-        ],
-        response_format=DynamicListingsContainer
-    )
-    encoder = tiktoken.encoding_for_model(selected_model)
-    input_token_count = len(encoder.encode(USER_MESSAGE + data))
-    output_token_count = len(encoder.encode(json.dumps(completion.choices[0].message.parsed.dict())))
-    token_counts = {
-        "input_tokens": input_token_count,
-        "output_tokens": output_token_count
-    }
+    parser = ListingStreamParser(on_listing)
+    try:
+        with client.beta.chat.completions.stream(
+            model=selected_model,
+            messages=extraction_messages(SYSTEM_MESSAGE, data, user_message),
+            response_format=DynamicListingsContainer,
+            stream_options={"include_usage": True}
+        ) as stream:
+            for event in stream:
+                if event.type == "content.delta":
+                    parser.feed(event.delta)
+            completion = stream.get_final_completion()
+    except Exception as e:
+        if not parser.listings:
+            raise
+        print(f"Stream interrupted after {len(parser.listings)} listings, keeping them: {str(e)}")
+        return parser.result(), estimated_token_counts(SYSTEM_MESSAGE + user_message + data, parser.full_text)
+    # Billed usage, including the part of the prompt served from OpenAI's prefix cache
+    token_counts = usage_token_counts(completion.usage)
     return completion.choices[0].message.parsed, token_counts
 
-def handle_gemini(data, DynamicListingsContainer):
+def handle_gemini(data, DynamicListingsContainer, user_message=USER_MESSAGE):
     genai.configure(api_key=get_api_key("GOOGLE_API_KEY"))
     model = genai.GenerativeModel('gemini-1.5-flash',
             generation_config={
                 "response_mime_type": "application/json",
                 "response_schema": DynamicListingsContainer
             })
-    prompt = SYSTEM_MESSAGE + "\n" + USER_MESSAGE + data
-    input_tokens = model.count_tokens(prompt)
+    # Static instructions first so Gemini's implicit context cache can reuse them
+    prompt = SYSTEM_MESSAGE + "\n" + user_message + data
     completion = model.generate_content(prompt)
     usage_metadata = completion.usage_metadata
     token_counts = {
         "input_tokens": usage_metadata.prompt_token_count,
-        "output_tokens": usage_metadata.candidates_token_count
+        "output_tokens": usage_metadata.candidates_token_count,
+        "cached_input_tokens": getattr(usage_metadata, "cached_content_token_count", 0) or 0
     }
     return completion.text, token_counts
 
-def handle_llama(data, DynamicListingModel):
+def handle_llama(data, DynamicListingModel, on_listing=None):
     sys_message = generate_system_message(DynamicListingModel)
     client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
-    completion = client.chat.completions.create(
+    parser = ListingStreamParser(on_listing)
+    token_counts = stream_chat_completion(
+        client, parser,
         model=LLAMA_MODEL_FULLNAME,
-        messages=[
-            {"role": "system", "content": sys_message},
-            {"role": "user", "content": USER_MESSAGE + data}
-        ],
+        messages=extraction_messages(sys_message, data),
         temperature=0.7,
+        stream_options={"include_usage": True}
     )
-    response_content = completion.choices[0].message.content
-    parsed_response = json.loads(response_content)
-    token_counts = {
-        "input_tokens": completion.usage.prompt_tokens,
-        "output_tokens": completion.usage.completion_tokens
-    }
-    return parsed_response, token_counts
+    return parser.result(), token_counts or estimated_token_counts(sys_message + USER_MESSAGE + data, parser.full_text)
 
-def handle_groq(data, DynamicListingModel):
+def handle_groq(data, DynamicListingModel, on_listing=None):
     sys_message = generate_system_message(DynamicListingModel)
     client = Groq(api_key=get_api_key("GROQ_API_KEY"),)
-    completion = client.chat.completions.create(
-        messages=[
-            {"role": "system","content": sys_message},
-            {"role": "user","content": USER_MESSAGE + data}
-        ],
+    parser = ListingStreamParser(on_listing)
+    token_counts = stream_chat_completion(
+        client, parser,
+        messages=extraction_messages(sys_message, data),
         model=GROQ_LLAMA_MODEL_FULLNAME,
     )
-    response_content = completion.choices[0].message.content
-    parsed_response = json.loads(response_content)
-    token_counts = {
-        "input_tokens": completion.usage.prompt_tokens,
-        "output_tokens": completion.usage.completion_tokens
-    }
-    return parsed_response, token_counts
+    return parser.result(), token_counts or estimated_token_counts(sys_message + USER_MESSAGE + data, parser.full_text)
 
-def handle_ollama(data, DynamicListingModel):
-    print("DEBUG: Entering Ollama branch in format_data function")
-    sys_message = generate_system_message(DynamicListingModel)
-    
-    # Get the Ollama API URL from session state
-    ollama_url = st.session_state.get('ollama_url', '').strip()
-    
-    # Try local Ollama if no URL provided
-    if not ollama_url:
-        print("DEBUG: No Ollama URL provided, trying local instance")
-        ollama_url = 'http://localhost:11434'
-    
-    print(f"DEBUG: Attempting to use Ollama at {ollama_url}")
-    
-    prompt = f"""Extract product information from the text and format it as JSON. Each product has three pieces of information marked with specific prefixes:
+OLLAMA_PROMPT_PREFIX = """Extract product information from the text and format it as JSON. Each product has three pieces of information marked with specific prefixes:
 
 1. PRODUCT_TITLE: followed by the product name
 2. PRODUCT_PRICE: followed by the price (in format "X XXX,XX")
 3. PRODUCT_STATUS: followed by the status (if available, otherwise leave it empty)
 
 Format the extracted information as JSON like this:
-{{
+{
     "listings": [
-        {{
+        {
             "title": "The exact product title (without the ## PRODUCT_TITLE: prefix)",
             "price": "The price number without currency symbol",
             "status": "Any availability information found"
-        }},
+        },
         ...more products...
     ]
-}}
+}
 
 Example input:
 ## PRODUCT_TITLE: CANON EOS R5 Boitier nu
@@ -137,28 +189,44 @@ PRODUCT_PRICE: 3999,00
 Prochaines dispos au printemps 2025.
 
 Example output:
-{{
+{
     "listings": [
-        {{
+        {
             "title": "CANON EOS R5 Boitier nu",
             "price": "3999,00",
             "status": "Prochaines dispos au printemps 2025"
-        }}
+        }
     ]
-}}
+}
 
 IMPORTANT:
 - Only output valid JSON
 - Do not include any explanatory text
 - Do not include the currency symbol (€) in the price
 - Include all products found in the text
-- If no products are found, return {{"listings": []}}
+- If no products are found, return {"listings": []}
 - Make sure to capture the COMPLETE price, including all digits and decimal places
 
 Here's the text to process:
-{data}
 """
 
+def handle_ollama(data, DynamicListingModel, on_listing=None):
+    print("DEBUG: Entering Ollama branch in format_data function")
+    sys_message = generate_system_message(DynamicListingModel)
+    
+    # Get the Ollama API URL from session state
+    ollama_url = st.session_state.get('ollama_url', '').strip()
+    
+    # Try local Ollama if no URL provided
+    if not ollama_url:
+        print("DEBUG: No Ollama URL provided, trying local instance")
+        ollama_url = 'http://localhost:11434'
+    
+    print(f"DEBUG: Attempting to use Ollama at {ollama_url}")
+    
+    # Page text goes last so Ollama can reuse the KV cache of the static prefix
+    prompt = OLLAMA_PROMPT_PREFIX + data + "\n"
+
     print(f"DEBUG: Prompt: {prompt}")
 
     try:
@@ -168,17 +236,33 @@ Here's the text to process:
                 "model": "tinyllama:latest",
                 "prompt": prompt,
                 "system": "You are a precise JSON extractor that only outputs valid JSON.",
-                "stream": False,
+                "stream": True,
                 "temperature": 0.1,
                 "top_p": 0.95
             },
-            timeout=10  # Add timeout to fail fast if server is unreachable
+            # Fail fast if the server is unreachable, but only time out a
+            # long answer if the stream stalls, not on its total length
+            timeout=(STREAMING_SETTINGS['connect_timeout'], STREAMING_SETTINGS['read_timeout']),
+            stream=True
         )
         print(f"DEBUG: Ollama API response status code: {response.status_code}")
         
         if response.status_code == 200:
-            response_data = response.json()
-            response_content = response_data.get('response', '')
+            parser = ListingStreamParser(on_listing)
+            ollama_usage = {}
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    parser.feed(chunk.get('response', ''))
+                    if chunk.get('done'):
+                        ollama_usage = chunk
+            except requests.exceptions.RequestException as e:
+                if not parser.listings:
+                    raise requests.exceptions.Timeout(f"Ollama stream stalled: {str(e)}") from e
+                print(f"DEBUG: Ollama stream interrupted after {len(parser.listings)} listings, keeping them: {str(e)}")
+            response_content = parser.full_text
             print(f"DEBUG: Ollama API response content (first 500 characters): {response_content[:500]}")
             
             # Try to find JSON in the response
@@ -192,103 +276,56 @@ Here's the text to process:
                 # Second try: find JSON-like structure
                 json_start = response_content.find('{')
                 json_end = response_content.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
+                if parser.listings:
+                    # Wrapped or cut-off answer: keep the listings that streamed in complete
+                    print(f"DEBUG: Using {len(parser.listings)} listings parsed from the stream")
+                    parsed_response = parser.result()
+                elif json_start >= 0 and json_end > json_start:
                     try:
                         clean_json = response_content[json_start:json_end]
                         parsed_response = json.loads(clean_json)
                         print("DEBUG: Successfully parsed JSON from extracted structure")
                         print(f"DEBUG: Parsed response: {json.dumps(parsed_response, indent=2)}")
                     except json.JSONDecodeError:
-                        print("DEBUG: Failed to parse JSON from extracted structure, using regex fallback")
-                        # Use regex as a fallback
-                        titles = re.findall(r'## PRODUCT_TITLE:\s*(.*?)(?=\n|$)', data)
-                        # Updated price pattern to capture full price including thousands
-                        prices = re.findall(r'PRODUCT_PRICE:\s*(\d+\s*\d+(?:,\d+)?)', data)
-                        availability_pattern = r'Nouveauté en production ultra tendue\. (.*?)(?=\n|$)'
-                        availabilities = re.findall(availability_pattern, data)
-                        
-                        listings = []
-                        for i in range(len(titles)):
-                            # Clean up the price by removing spaces
-                            price = prices[i].strip().replace(" ", "") if i < len(prices) else ""
-                            listing = {
-                                "title": titles[i].strip(),
-                                "price": price,
-                                "status": availabilities[0].strip() if availabilities else "Prochaines dispos au printemps 2025"
-                            }
-                            listings.append(listing)
-                        
-                        parsed_response = {"listings": listings}
+                        print("DEBUG: Failed to parse JSON from extracted structure, using rule-based fallback")
+                        parsed_response = extract_with_rules(data)
                 else:
-                    print("DEBUG: No JSON-like structure found, using regex fallback")
-                    # Use regex as a fallback
-                    titles = re.findall(r'## PRODUCT_TITLE:\s*(.*?)(?=\n|$)', data)
-                    # Updated price pattern to capture full price including thousands
-                    prices = re.findall(r'PRODUCT_PRICE:\s*(\d+\s*\d+(?:,\d+)?)', data)
-                    availability_pattern = r'Nouveauté en production ultra tendue\. (.*?)(?=\n|$)'
-                    availabilities = re.findall(availability_pattern, data)
-                    
-                    listings = []
-                    for i in range(len(titles)):
-                        # Clean up the price by removing spaces
-                        price = prices[i].strip().replace(" ", "") if i < len(prices) else ""
-                        listing = {
-                            "title": titles[i].strip(),
-                            "price": price,
-                            "status": availabilities[0].strip() if availabilities else "Prochaines dispos au printemps 2025"
-                        }
-                        listings.append(listing)
-                    
-                    parsed_response = {"listings": listings}
+                    print("DEBUG: No JSON-like structure found, using rule-based fallback")
+                    parsed_response = extract_with_rules(data)
             
             # Ensure the response has the correct structure
             if "listings" not in parsed_response:
                 print("DEBUG: 'listings' key not found in parsed response, adding it")
                 parsed_response = {"listings": []}
             
-            # Estimate token counts
-            token_counts = {
-                "input_tokens": len((sys_message + prompt).split()),
-                "output_tokens": len(response_content.split())
-            }
-            print(f"DEBUG: Estimated token counts: {token_counts}")
+            # Token counts reported with the last chunk, or an estimate
+            if 'prompt_eval_count' in ollama_usage:
+                token_counts = {
+                    "input_tokens": ollama_usage['prompt_eval_count'],
+                    "output_tokens": ollama_usage.get('eval_count', 0)
+                }
+            else:
+                token_counts = estimated_token_counts(sys_message + prompt, response_content)
+            print(f"DEBUG: Token counts: {token_counts}")
             
             return parsed_response, token_counts
         else:
             print(f"DEBUG: Ollama API request failed with status code: {response.status_code}")
             raise Exception(f"Ollama API request failed with status code: {response.status_code}")
     except requests.exceptions.ConnectionError:
-        print("DEBUG: Could not connect to Ollama API")
+        # Runs on worker threads, so report here and let the caller surface the error
         if ollama_url == 'http://localhost:11434':
-            st.error("No local Ollama instance found. Please install and run Ollama locally, or provide an external Ollama API URL.")
+            print("DEBUG: No local Ollama instance found. Please install and run Ollama locally, or provide an external Ollama API URL.")
         else:
-            st.error(f"Could not connect to Ollama at {ollama_url}. Please check the URL and try again.")
+            print(f"DEBUG: Could not connect to Ollama at {ollama_url}. Please check the URL and try again.")
         raise
     except requests.exceptions.Timeout:
-        print("DEBUG: Ollama API request timed out")
-        st.error("Ollama API request timed out. Please check your connection or try again.")
+        print("DEBUG: Ollama API request timed out. Please check your connection or try again.")
         raise
     except Exception as e:
         print(f"DEBUG: An error occurred while processing Ollama request: {str(e)}")
-        # Use regex as a fallback when API call fails
-        titles = re.findall(r'## PRODUCT_TITLE:\s*(.*?)(?=\n|$)', data)
-        # Updated price pattern to capture full price including thousands
-        prices = re.findall(r'PRODUCT_PRICE:\s*(\d+\s*\d+(?:,\d+)?)', data)
-        availability_pattern = r'Nouveauté en production ultra tendue\. (.*?)(?=\n|$)'
-        availabilities = re.findall(availability_pattern, data)
-        
-        listings = []
-        for i in range(len(titles)):
-            # Clean up the price by removing spaces
-            price = prices[i].strip().replace(" ", "") if i < len(prices) else ""
-            listing = {
-                "title": titles[i].strip(),
-                "price": price,
-                "status": availabilities[0].strip() if availabilities else "Prochaines dispos au printemps 2025"
-            }
-            listings.append(listing)
-        
-        parsed_response = {"listings": listings}
+        # Fall back to the clean_html markers when the API call fails
+        parsed_response = extract_with_rules(data)
         token_counts = {
             "input_tokens": len(data.split()),
             "output_tokens": len(json.dumps(parsed_response).split())
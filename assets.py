@@ -66,14 +66,17 @@ USER_AGENTS  = [
 PRICING = {
     "gpt-4o-mini": {
         "input": 0.150 / 1_000_000,  # $0.150 per 1M input tokens
+        "cached_input": 0.075 / 1_000_000,  # $0.075 per 1M input tokens read from the prompt cache
         "output": 0.600 / 1_000_000, # $0.600 per 1M output tokens
     },
     "gpt-4o-2024-08-06": {
         "input": 2.5 / 1_000_000,  # $2.5 per 1M input tokens
+        "cached_input": 1.25 / 1_000_000,  # $1.25 per 1M input tokens read from the prompt cache
         "output": 10 / 1_000_000, # $10 per 1M output tokens
     },
     "gemini-1.5-flash": {
         "input": 0.075 / 1_000_000,  # $0.075 per 1M input tokens
+        "cached_input": 0.01875 / 1_000_000,  # $0.01875 per 1M input tokens read from the context cache
         "output": 0.30 / 1_000_000, # $0.30 per 1M output tokens
     },
     "Llama3.1 8B": {
@@ -90,6 +93,18 @@ PRICING = {
     }
 }
 
+# Pricing for requests sent through the OpenAI Batch API (50% off)
+BATCH_PRICING = {
+    "gpt-4o-mini": {
+        "input": 0.075 / 1_000_000,  # $0.075 per 1M input tokens
+        "output": 0.300 / 1_000_000, # $0.300 per 1M output tokens
+    },
+    "gpt-4o-2024-08-06": {
+        "input": 1.25 / 1_000_000,  # $1.25 per 1M input tokens
+        "output": 5 / 1_000_000, # $5 per 1M output tokens
+    }
+}
+
 # Timeout settings for web scraping
 TIMEOUT_SETTINGS = {
     "page_load": 30,
@@ -101,12 +116,54 @@ HEADLESS_OPTIONS = ["--disable-gpu", "--disable-dev-shm-usage","--window-size=19
 
 
 HEADLESS_OPTIONS_DOCKER = ["--headless=new","--no-sandbox","--disable-gpu", "--disable-dev-shm-usage","--disable-software-rasterizer","--disable-setuid-sandbox","--remote-debugging-port=9222","--disable-search-engine-choice-screen"]
-#in case you don't need to open the website
-##HEADLESS_OPTIONS=HEADLESS_OPTIONS+[ "--headless=new"]
+#in case you don't need to open the website, use a headless launch profile below
 
-#number of scrolls
+# Named Chrome launch profiles (selenium_utils.chrome_options). "args" are added on top of
+# the options above; "headless" applies outside Docker, which is always headless, and
+# attended runs always get a window. benchmarks/bench_launch_profiles.py compares them.
+LAUNCH_PROFILES = {
+    # Current behaviour: a full browser, nothing switched off
+    "compat": {
+        "headless": False,
+        "args": [],
+    },
+    # As many concurrent headless pages per core and per GB as possible
+    "max-density": {
+        "headless": True,
+        "args": [
+            "--renderer-process-limit=2",               # tabs share renderer processes
+            "--js-flags=--max-old-space-size=256",      # cap each renderer's JS heap (MB)
+            "--disable-extensions",
+            "--disable-component-extensions-with-background-pages",
+            "--disable-background-networking",          # no update checks, safe browsing or prefetch
+            "--disable-component-update",
+            "--disable-default-apps",
+            "--disable-sync",
+            "--metrics-recording-only",
+            "--mute-audio",
+            "--no-first-run",
+            "--disable-software-rasterizer",
+            "--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication,BackForwardCache",
+            "--blink-settings=imagesEnabled=false",     # listings are read from markup, images aren't needed
+        ],
+    },
+}
+DEFAULT_LAUNCH_PROFILE = "compat"
+
+#number of scrolls in a row without new content before the adaptive scroller stops
 NUMBER_SCROLL=2
 
+# Adaptive infinite-scroll limits
+SCROLL_SETTINGS = {
+    "max_scrolls": 30,     # hard cap on scroll steps
+    "max_items": 1000,     # stop once this many listing nodes are on the page
+    "max_time": 60,        # seconds spent scrolling in total
+    "idle_ms": 800,        # give up on a step if the DOM doesn't change within this time
+    "settle_ms": 300,      # a step is done once mutations have been quiet this long
+}
+# Nodes counted as listings when checking whether a scroll loaded more items
+LISTING_NODE_SELECTOR = "article, .product-miniature, .product-container, [class*='product-item'], [class*='product-card'], li[class*='product']"
+
 
 LLAMA_MODEL_FULLNAME="lmstudio-community/Meta-Llama-3.1-8B-Instruct-GGUF"
 GROQ_LLAMA_MODEL_FULLNAME="llama-3.1-70b-versatile"
@@ -135,6 +192,21 @@ Rules:
 6. Remove any currency symbols or special characters from price values"""
 
 USER_MESSAGE = f"Extract the following information from the provided text:\nPage content:\n\n"
+
+# Several small pages in one request (request_packing.py)
+PACKED_USER_MESSAGE = """Extract the following information from the provided text.
+The text holds several pages, each starting with a line "=== PAGE <page_id> ===".
+Return one entry in "pages" for every page, with its page_id and only the listings found on that page.
+
+"""
+PACKING_SETTINGS = {
+    "budget": 6000,             # tokens of page content per packed request
+    "max_page_tokens": 2000,    # larger pages are extracted on their own
+    "max_pages": 8,             # pages per packed request
+    "page_delimiter": "=== PAGE {page_id} ===",
+    # models whose answers follow the packed schema exactly
+    "models": ["gpt-4o-mini", "gpt-4o-2024-08-06", "gemini-1.5-flash"],
+}
         
 
 
@@ -161,3 +233,206 @@ Provide the output as a JSON object with the following structure:
 
 Do not include any additional text or explanations.
 """
+
+
+# Change detection for scheduled re-crawls
+FINGERPRINT_STORE_PATH = "cache/fingerprints.json"
+# Maximum number of differing simhash bits for two pages to still count as unchanged
+SIMHASH_MAX_DISTANCE = 3
+
+# Near-duplicate pages across URLs (near_duplicates.py)
+NEAR_DUPLICATE_STORE_PATH = "cache/near_duplicates.json"
+NEAR_DUPLICATE_SETTINGS = {
+    "num_perm": 128,            # MinHash signature length
+    "bands": 16,                # LSH bands of num_perm / bands rows; candidates from ~70% similarity
+    "shingle_size": 5,          # words per shingle
+    "threshold": 0.8,           # estimated Jaccard similarity to count as a near-duplicate
+    "max_changed_share": 0.5,   # extract only changed listing blocks up to this share of the page
+    "max_entries": 20000,       # oldest pages are dropped beyond this
+    "persist": False,           # keep the index across runs in NEAR_DUPLICATE_STORE_PATH
+}
+
+# XHR/JSON API capture mode
+API_MAPPING_STORE_PATH = "cache/api_mappings.json"
+API_CAPTURE_MAX_PAGES = 50
+# Query/body parameters recognised as page numbers and as item offsets
+API_PAGE_PARAMS = ["page", "p", "pg", "pagenumber", "page_number", "pageindex"]
+API_OFFSET_PARAMS = ["offset", "start", "skip", "from"]
+# Alternative key names to look for when mapping requested fields onto JSON listings
+FIELD_SYNONYMS = {
+    "title": ["name", "product_name", "productname", "label", "heading"],
+    "name": ["title", "product_name", "label"],
+    "price": ["amount", "value", "final_price", "sale_price", "current_price", "price_amount"],
+    "status": ["availability", "stock", "stock_status", "in_stock", "available"],
+    "url": ["link", "href", "permalink", "product_url"],
+    "image": ["image_url", "img", "thumbnail", "picture"],
+    "description": ["desc", "summary", "short_description"],
+}
+
+# Persistent authenticated sessions (encrypted with SESSION_STORE_KEY from the environment if set)
+SESSION_STORE_DIR = "cache/sessions"
+SESSION_MAX_AGE = 24 * 60 * 60  # seconds before a stored session is discarded
+
+# Worker processes for HTML to markdown conversion (max_workers None = one per CPU core)
+MARKDOWN_POOL_SETTINGS = {
+    "max_workers": None,
+    "max_pending": 8,  # conversions queued before submitting blocks
+}
+
+# Listing-region segmentation before markdown conversion (listing_segmentation.py)
+SEGMENTATION_SETTINGS = {
+    "enabled": False,       # send only the repeated listing blocks to the converter and model
+    "min_items": 3,         # fewer similar blocks than this is not a listing
+    "depth": 3,             # levels of tag/class paths compared between blocks
+    "similarity": 0.5,      # Jaccard overlap with the group's common shape a block needs
+    "min_text": 15,         # characters of text a block needs; skips icons and spacers
+    "min_linked": 0.5,      # share of blocks that must link to another page, as listings link to their details
+    "coverage": 0.7,        # nested blocks holding this share of the best group's text replace it
+    "min_page_share": 0.5,  # share of the page's text (links outside them aside) the blocks must hold
+    # kept next to the blocks so pagination detection still sees the next pages
+    "keep_selector": "[class*='pagination'], [class*='pager'], nav[aria-label*='agination'], a[rel='next'], a[rel='prev'], link[rel='next']",
+}
+
+# Cookie consent handling
+CONSENT_STORE_PATH = "cache/consent.json"
+CONSENT_SETTINGS = {
+    "banner_timeout_ms": 2500,      # how long to watch for a banner injected after page load
+    "cookie_wait": 0.5,             # seconds to let the consent script write its cookies after the click
+    "no_banner_ttl": 24 * 60 * 60,  # seconds before a domain without a banner is probed again
+}
+
+# Batch crawling of many seed URLs
+BATCH_SETTINGS = {
+    "drivers": 2,               # browsers shared by all seeds
+    "llm_concurrency": 4,       # extraction/pagination calls running at once
+    "max_pages_per_seed": 20,   # pagination pages crawled per seed, including the seed itself
+}
+
+# Results page in the UI
+RESULTS_DISPLAY_SETTINGS = {
+    "rows_per_page": 100,   # listings shown per table page
+    "cached_files": 32,     # result files kept in st.cache_data
+}
+
+# Background scrape jobs started from the UI
+SCRAPE_JOB_SETTINGS = {
+    "max_concurrent_jobs": 4,   # scrape runs executing at once across all sessions
+    "poll_interval": 1.0,       # seconds between progress refreshes in the UI
+}
+
+# Cached listing models and prompts, one entry per ordered field list
+SCHEMA_CACHE_SIZE = 64
+
+# OpenAI Batch API extraction
+BATCH_API_SETTINGS = {
+    "completion_window": "24h",         # the only window the Batch API offers
+    "poll_interval": 30,                # seconds between batch status checks
+    "max_wait": 24 * 60 * 60,           # seconds to wait for a batch before leaving it to be collected later
+    "local_dir": "cache/local_batches", # where LocalBatchClient keeps its results
+}
+
+# Streamed model answers
+STREAMING_SETTINGS = {
+    "connect_timeout": 10,  # seconds to reach the model server
+    "read_timeout": 60,     # seconds the stream may stall before the answer so far is kept
+}
+
+# Cost- and latency-aware model routing (the "Auto" model)
+AUTO_MODEL = "Auto"
+ROUTER_STATS_PATH = "cache/router_stats.json"
+ROUTER_SETTINGS = {
+    # models tried in order, cheapest first; a page moves up only when its output fails validation
+    "ladder": ["Ollama", "Groq Llama3.1 70b", "gpt-4o-mini", "gpt-4o-2024-08-06"],
+    # largest page (in tokens) sent to each model
+    "context_limits": {
+        "Ollama": 4_000,
+        "Groq Llama3.1 70b": 30_000,
+        "gpt-4o-mini": 120_000,
+        "gpt-4o-2024-08-06": 120_000,
+    },
+    "pagination_model": "gpt-4o-mini",  # pagination detection is not routed
+    "chars_per_token": 4,               # rough page size estimate before any tokenizer runs
+    "expected_output_ratio": 0.25,      # output tokens per input token, for budget estimates
+    "min_fill_ratio": 0.5,              # share of requested fields that must be filled for a valid extraction
+    "min_domain_accuracy": 0.5,         # skip a model on a domain where fewer of its extractions were valid
+    "min_samples": 3,                   # calls needed before accuracy and error rates are trusted
+    "max_error_rate": 0.5,              # skip providers failing more often than this
+    "max_latency": 90,                  # seconds; skip providers slower than this on average
+    "provider_cooldown": 15 * 60,       # seconds before a skipped slow or failing provider is tried again
+    "ewma_alpha": 0.3,                  # weight of the newest call in latency and error rate averages
+    "default_budget": 1.0,              # dollars per scraping job
+}
+
+# Rule-based extraction from the PRODUCT_* markers clean_html adds
+RULE_EXTRACTOR_SETTINGS = {
+    "first_pass": False,      # try the markers before calling any model
+    "min_listings": 1,        # fewer marked-up listings than this go to the model
+    "min_fill_ratio": 0.6,    # share of requested values the markers must fill to skip the model
+    "min_page_coverage": 0.5, # share of the page's priced lines the marked listings must account for
+                              # (a struck-through old price counts as unaccounted, hence the slack)
+}
+
+# Crawl frontier: URL normalisation, seen-set and per-host politeness
+FRONTIER_SETTINGS = {
+    # query parameters dropped before URLs are compared
+    "tracking_params": {"gclid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl", "igshid", "ref", "ref_src"},
+    "tracking_prefixes": ("utm_", "pk_", "hsa_"),
+    "drop_fragments": True,         # "#..." never changes what the server returns for a page
+    "crawl_delay": 2.0,             # seconds between fetch starts on the same host
+    "crawl_delay_overrides": {},    # host -> seconds, e.g. from robots.txt Crawl-delay
+    "max_per_host": 2,              # concurrent fetches per host
+    "seen_merge_threshold": 50_000, # new URL fingerprints buffered before merging into the sorted array
+    "seen_path": None,              # file keeping crawled URLs across runs (e.g. "cache/frontier_seen.bin"); None: per run
+    "next_timeout": 60,             # seconds to wait for a host slot before giving up on the queue
+}
+
+# Several pages loading at once in tabs of one browser (selenium_utils.TabPool)
+TAB_POOL_SETTINGS = {
+    "tabs": 4,                  # pages loading at once per browser
+    "isolate_contexts": False,  # give every tab its own cookie jar instead of sharing the driver's session
+                                # (isolated tabs get no login or consent cookies)
+    "poll_interval": 0.3,       # seconds per round over the busy tabs
+    # background tabs are otherwise throttled and barely load
+    "browser_args": [
+        "--disable-background-timer-throttling",
+        "--disable-backgrounding-occluded-windows",
+        "--disable-renderer-backgrounding",
+    ],
+}
+
+# Page capture over the browser's DevTools websocket (cdp_transport.py)
+CDP_SETTINGS = {
+    "transport": "cdp",         # "cdp", or "webdriver" to always go through chromedriver
+    "ready_event": "load",      # lifecycle event awaited after navigating; "networkIdle" waits longer
+    "content_wait": 5,          # seconds to wait for the first listing node before scrolling
+    "command_timeout": 10,      # seconds per DevTools command
+    "max_events": 500,          # unclaimed events kept per session
+}
+
+# chromedriver resolution and Chrome profiles (driver_cache.py)
+DRIVER_CACHE_SETTINGS = {
+    "driver_path": None,            # explicit chromedriver; the CHROME_DRIVER environment variable works too
+    "chrome_binary": None,          # explicit Chrome binary; otherwise CHROME_BIN or the usual install locations
+    "pinned_version": None,         # e.g. "126.0.6478.126" to always use that chromedriver
+    "offline": False,               # never download a driver, fail if none is cached or on PATH
+    "manifest_path": "cache/chromedriver.json",
+    "use_profile_template": True,   # start browsers from a copy of an initialised profile
+    "profile_template": "cache/chrome_profile_template",
+    "profile_root": "cache/chrome_profiles",    # per-browser copies, removed on quit
+    "template_marker": "template_ready",
+    "template_settle": 2,           # seconds Chrome gets to initialise the template
+    # locks, crash dumps and caches never copied into a new profile
+    "profile_skip": ["SingletonLock", "SingletonCookie", "SingletonSocket", "Crashpad", "Crash Reports",
+                     "ShaderCache", "GrShaderCache", "GraphiteDawnCache", "component_crx_cache"],
+    "startup_args": ["--no-first-run", "--no-default-browser-check"],
+}
+
+# Limits on the browsers running across all sessions (browser_governor.py)
+GOVERNOR_SETTINGS = {
+    "max_browsers": 6,          # Chrome instances at once; a new one waits for or evicts an idle one
+    "admit_timeout": 120,       # seconds a new browser waits for a free slot before failing
+    "idle_ttl": 1800,           # seconds a driver may go unused before it is quit
+    "memory_ceiling_mb": 1500,  # process-tree memory (PSS) above which an idle driver is recycled
+    "recycle_idle": 60,         # seconds unused before a driver may be recycled or evicted
+    "reap_interval": 30,        # seconds between reaper passes
+}
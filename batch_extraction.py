@@ -0,0 +1,254 @@
+"""
+OpenAI Batch API extraction.
+
+For large jobs that don't need interactive latency, pages are fetched and
+converted as usual but their extraction requests are written to a JSONL file
+and submitted through the Batch API, which is billed at half price. The batch
+id is saved in the output folder, so a batch that outlives the scraping run
+can be collected later with BatchExtractionJob.resume(). LocalBatchClient
+stands in for the API when testing or working offline.
+"""
+
+import json
+import os
+import time
+import uuid
+
+from openai import OpenAI
+
+from api_management import get_api_key
+from api_handlers import extraction_messages
+from data_models import get_listing_schema
+from file_operations import save_formatted_data
+from utils import calculate_price
+from assets import SYSTEM_MESSAGE, BATCH_API_SETTINGS
+
+# Batch states after which nothing changes any more
+_FINISHED_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+class OpenAIBatchClient:
+    """Submits JSONL request files to the OpenAI Batch API."""
+
+    def __init__(self, api_key=None):
+        self.client = OpenAI(api_key=api_key or get_api_key('OPENAI_API_KEY'))
+
+    def submit(self, requests_path):
+        with open(requests_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window=BATCH_API_SETTINGS['completion_window']
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        return {
+            'status': batch.status,
+            'completed': batch.request_counts.completed if batch.request_counts else 0,
+            'total': batch.request_counts.total if batch.request_counts else 0
+        }
+
+    def results(self, batch_id):
+        """Return the output and error lines of a finished batch as dicts."""
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = self.client.files.content(file_id).text
+                lines.extend(json.loads(line) for line in content.splitlines() if line.strip())
+        return lines
+
+    def cancel(self, batch_id):
+        self.client.batches.cancel(batch_id)
+
+
+class LocalBatchClient:
+    """
+    Batch API stand-in that answers every request locally.
+
+    Args:
+        directory (str): Where submitted request files and results are kept
+        responder (callable): Takes a request body and returns a chat completion
+            body; defaults to an empty listings answer with zero usage
+    """
+
+    def __init__(self, directory=BATCH_API_SETTINGS['local_dir'], responder=None):
+        self.directory = directory
+        self.responder = responder or self._empty_response
+
+    @staticmethod
+    def _empty_response(body):
+        return {
+            'model': body['model'],
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': json.dumps({'listings': []})}}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0}
+        }
+
+    def _path(self, batch_id):
+        return os.path.join(self.directory, f"{batch_id}_output.jsonl")
+
+    def submit(self, requests_path):
+        batch_id = f"batch_local_{uuid.uuid4().hex}"
+        os.makedirs(self.directory, exist_ok=True)
+        with open(requests_path, 'r', encoding='utf-8') as f, open(self._path(batch_id), 'w', encoding='utf-8') as out:
+            for line in f:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                try:
+                    result = {'custom_id': request['custom_id'], 'response': {'status_code': 200, 'body': self.responder(request['body'])}, 'error': None}
+                except Exception as e:
+                    result = {'custom_id': request['custom_id'], 'response': None, 'error': {'message': str(e)}}
+                out.write(json.dumps(result) + "\n")
+        return batch_id
+
+    def status(self, batch_id):
+        with open(self._path(batch_id), 'r', encoding='utf-8') as f:
+            total = sum(1 for line in f if line.strip())
+        return {'status': 'completed', 'completed': total, 'total': total}
+
+    def results(self, batch_id):
+        with open(self._path(batch_id), 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def cancel(self, batch_id):
+        pass
+
+
+def _usage_counts(usage):
+    details = usage.get('prompt_tokens_details') or {}
+    return {
+        'input_tokens': usage.get('prompt_tokens', 0),
+        'output_tokens': usage.get('completion_tokens', 0),
+        'cached_input_tokens': details.get('cached_tokens', 0) or 0
+    }
+
+
+class BatchExtractionJob:
+    """
+    Extraction requests of one scraping run, sent as a single Batch API job.
+
+    Args:
+        fields (list): Fields to extract from each listing
+        model (str): OpenAI model name, a key of BATCH_PRICING
+        output_folder (str): Where the request file, job state and sorted_data_N files go
+        client: OpenAIBatchClient (default) or LocalBatchClient
+    """
+
+    def __init__(self, fields, model, output_folder, client=None):
+        self.fields = list(fields)
+        self.model = model
+        self.output_folder = output_folder
+        self.client = client or OpenAIBatchClient()
+        self.requests_path = os.path.join(output_folder, 'batch_requests.jsonl')
+        self.state_path = os.path.join(output_folder, 'batch_job.json')
+        self.pages = {}
+        self.batch_id = None
+
+    @classmethod
+    def resume(cls, output_folder, client=None):
+        """Reload a submitted job from its output folder to poll or collect it."""
+        with open(os.path.join(output_folder, 'batch_job.json'), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        job = cls(state['fields'], state['model'], output_folder, client)
+        job.pages = state['pages']
+        job.batch_id = state['batch_id']
+        return job
+
+    def add_page(self, page_num, url, markdown):
+        """Queue the extraction request for one page."""
+        custom_id = f"page-{page_num}"
+        schema = get_listing_schema(self.fields)
+        request = {
+            'custom_id': custom_id,
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': {
+                'model': self.model,
+                'messages': extraction_messages(SYSTEM_MESSAGE, markdown),
+                'response_format': schema.response_format
+            }
+        }
+        os.makedirs(self.output_folder, exist_ok=True)
+        with open(self.requests_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(request) + "\n")
+        self.pages[custom_id] = {'page_num': page_num, 'url': url}
+
+    def submit(self):
+        self.batch_id = self.client.submit(self.requests_path)
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'batch_id': self.batch_id,
+                'model': self.model,
+                'fields': self.fields,
+                'pages': self.pages
+            }, f, indent=4)
+        print(f"Submitted batch {self.batch_id} with {len(self.pages)} requests")
+        return self.batch_id
+
+    def wait(self, progress=None, poll_interval=None, max_wait=None):
+        """
+        Poll the batch until it finishes, the wait times out or progress is cancelled.
+
+        Returns:
+            str: The last batch status seen
+        """
+        poll_interval = poll_interval if poll_interval is not None else BATCH_API_SETTINGS['poll_interval']
+        max_wait = max_wait if max_wait is not None else BATCH_API_SETTINGS['max_wait']
+        deadline = time.time() + max_wait
+        while True:
+            status = self.client.status(self.batch_id)
+            if status['status'] in _FINISHED_STATUSES:
+                return status['status']
+            if progress is not None:
+                if progress.cancelled:
+                    self.client.cancel(self.batch_id)
+                    return 'cancelled'
+                progress.message(f"Batch {self.batch_id}: {status['status']}, {status['completed']}/{status['total']} requests done")
+            if time.time() >= deadline:
+                return status['status']
+            time.sleep(poll_interval)
+
+    def collect(self, progress=None):
+        """
+        Save every answered request as sorted_data_N and price it at batch rates.
+
+        Returns:
+            tuple: (all_data, totals) like scrape_with_pagination
+        """
+        totals = {'input_tokens': 0, 'cached_input_tokens': 0, 'output_tokens': 0, 'total_cost': 0}
+        by_page = {}
+        for result in self.client.results(self.batch_id):
+            page = self.pages.get(result['custom_id'])
+            response = result.get('response') or {}
+            if page is None or response.get('status_code') != 200:
+                print(f"Batch request {result['custom_id']} failed: {result.get('error') or response}")
+                continue
+            body = response['body']
+            try:
+                formatted_data = json.loads(body['choices'][0]['message']['content'])
+            except (KeyError, IndexError, json.JSONDecodeError) as e:
+                print(f"Could not parse batch answer for {result['custom_id']}: {str(e)}")
+                continue
+
+            token_counts = _usage_counts(body.get('usage', {}))
+            input_tokens, output_tokens, cost = calculate_price(token_counts, self.model, batch=True)
+            totals['input_tokens'] += input_tokens
+            totals['cached_input_tokens'] += token_counts['cached_input_tokens']
+            totals['output_tokens'] += output_tokens
+            totals['total_cost'] += cost
+
+            page_num = page['page_num']
+            save_formatted_data(formatted_data, self.output_folder,
+                                f'sorted_data_{page_num}.json',
+                                f'sorted_data_{page_num}.xlsx')
+            by_page[page_num] = formatted_data
+            if progress is not None:
+                progress.page_done(formatted_data, token_counts, cost)
+
+        all_data = [by_page[page_num] for page_num in sorted(by_page)]
+        totals['batch_id'] = self.batch_id
+        return all_data, totals
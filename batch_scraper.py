@@ -0,0 +1,406 @@
+"""
+Batch crawling of many seed URLs.
+
+Every seed URL gets its own pagination crawl. Page fetches from all seeds are
+interleaved round-robin over a small pool of browser workers, and extraction
+runs on a separate thread pool that caps concurrent LLM calls, so a seed with
+hundreds of pages can't starve the others and browsers never sit idle waiting
+on the model. Fetched pages are converted to markdown in the conversion
+process pool, so conversion overlaps the next fetch and the model calls
+instead of holding the GIL in a browser worker. With request packing on, pages that don't drive pagination
+detection share model requests through a PagePacker, whatever seed they
+come from. Progress, tokens and cost are tracked per seed.
+"""
+
+import os
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from selenium_utils import setup_selenium, fetch_html_selenium, adaptive_scroll, handle_login
+from scraper import scrape_with_api_capture
+from api_handlers import format_data
+from data_models import create_dynamic_listing_model, create_listings_container_model
+from file_operations import save_raw_data, save_formatted_data, StreamedListingWriter
+from change_detection import extract_or_reuse
+from near_duplicates import extract_or_reuse_similar
+from request_packing import PagePacker
+from crawl_frontier import SeenSet, HostPoliteness, host_of
+from page_snapshot import PageSnapshot, SnapshotStats, pagination_page_urls
+from utils import calculate_price, generate_unique_folder_name
+from assets import BATCH_SETTINGS, API_CAPTURE_MAX_PAGES
+
+
+class SeedCrawl:
+    """Crawl state and progress of one seed URL."""
+
+    def __init__(self, index, url, output_folder):
+        self.index = index
+        self.url = url
+        self.output_folder = output_folder
+        self.pending = deque([url])
+        self.seen = SeenSet()
+        self.seen.add(url)
+        self.fetch_host = None
+        self.page_num = 0
+        self.data = []
+        self.progress = {
+            'seed': url,
+            'status': 'queued',
+            'pages_done': 0,
+            'pages_found': 1,
+            'input_tokens': 0,
+            'cached_input_tokens': 0,
+            'output_tokens': 0,
+            'cost': 0.0,
+            'error': None
+        }
+
+
+class BatchScraper:
+    """
+    Crawl many seed URLs, each with its own pagination, over a shared driver pool.
+
+    Args:
+        seed_urls (list): Seed URLs to crawl
+        settings (dict): Scraping settings from render_scraping_settings
+        output_folder (str): Parent folder; every seed gets its own subfolder
+        credentials (dict): Optional login credentials, applied once per driver
+        cookie_selectors (list): Optional cookie consent selectors
+        fingerprint_store (FingerprintStore): Optional store used to skip unchanged pages
+        progress (ScrapeProgress): Optional progress sink; cancelling it stops fetching new pages
+        snapshot_stats (SnapshotStats): Optional run-wide counters of page conversions
+        near_duplicates (NearDuplicateIndex): Optional job index used to reuse extractions of near-duplicate pages
+    """
+
+    def __init__(self, seed_urls, settings, output_folder, credentials=None, cookie_selectors=None, fingerprint_store=None, progress=None, snapshot_stats=None, near_duplicates=None):
+        self.settings = settings
+        self.snapshot_stats = snapshot_stats if snapshot_stats is not None else SnapshotStats()
+        self.progress = progress
+        self.credentials = credentials
+        self.cookie_selectors = cookie_selectors
+        self.fingerprint_store = fingerprint_store
+        self.near_duplicates = near_duplicates
+        self.max_pages = BATCH_SETTINGS['max_pages_per_seed'] if settings['use_pagination'] else 1
+
+        self.seeds = []
+        for i, url in enumerate(seed_urls, start=1):
+            seed_folder = os.path.join(output_folder, f"seed_{i}_{generate_unique_folder_name(url)}")
+            self.seeds.append(SeedCrawl(i, url, seed_folder))
+        if progress is not None:
+            progress.add_pages(len(self.seeds))
+
+        self.DynamicListingModel = create_dynamic_listing_model(settings['fields'])
+        self.DynamicListingsContainer = create_listings_container_model(self.DynamicListingModel)
+
+        # Seeds with a page ready to fetch, served round-robin among hosts that may be fetched now
+        self.ready = deque(self.seeds)
+        self.politeness = HostPoliteness()
+        # Seeds whose next pages depend on work still running (fetch or pagination detection)
+        self.in_flight = set()
+        self.condition = threading.Condition()
+        self.extractions = []
+        self.live_workers = 0
+        self.packer = None
+        if settings.get('use_request_packing'):
+            self.packer = PagePacker(settings['fields'], settings['model_selection'], fingerprint_store,
+                                     near_duplicates=near_duplicates)
+
+        # Worker threads need the session's script context for st.session_state lookups
+        script_ctx = get_script_run_ctx()
+        self._attach_ctx = lambda: add_script_run_ctx(threading.current_thread(), script_ctx)
+        self.llm_executor = ThreadPoolExecutor(
+            max_workers=BATCH_SETTINGS['llm_concurrency'],
+            initializer=self._attach_ctx
+        )
+
+    def _next_seed(self):
+        """
+        Block until a seed has a page to fetch whose host is within its crawl
+        delay and concurrency budget; None once the whole batch is fetched.
+        """
+        with self.condition:
+            while True:
+                if not self.ready and not self.in_flight:
+                    return None
+                if self.ready and self.progress is not None and self.progress.cancelled:
+                    return None
+                wait = None
+                for seed in self.ready:
+                    host = host_of(seed.pending[0])
+                    host_wait = self.politeness.wait_time(host)
+                    if host_wait == 0:
+                        self.ready.remove(seed)
+                        self.in_flight.add(seed)
+                        self.politeness.start(host)
+                        seed.fetch_host = host
+                        return seed
+                    if host_wait is not None:
+                        wait = host_wait if wait is None else min(wait, host_wait)
+                self.condition.wait(wait)
+
+    def _fetch_done(self, seed):
+        with self.condition:
+            if seed.fetch_host is not None:
+                self.politeness.finish(seed.fetch_host)
+                seed.fetch_host = None
+            self.condition.notify_all()
+
+    def _release_seed(self, seed):
+        """Put the seed back at the end of the queue if it still has pages to crawl."""
+        with self.condition:
+            self.in_flight.discard(seed)
+            if seed.pending and seed.page_num < self.max_pages and not seed.progress['error']:
+                self.ready.append(seed)
+            elif seed.progress['status'] != 'failed':
+                seed.progress['status'] = 'fetched'
+            self.condition.notify_all()
+
+    def _add_usage(self, seed, token_counts, cost):
+        with self.condition:
+            seed.progress['input_tokens'] += token_counts.get('input_tokens', 0)
+            seed.progress['cached_input_tokens'] += token_counts.get('cached_input_tokens', 0)
+            seed.progress['output_tokens'] += token_counts.get('output_tokens', 0)
+            seed.progress['cost'] += cost
+        if self.progress is not None:
+            self.progress.add_usage(token_counts, cost)
+
+    def _fail(self, seed, error):
+        print(f"Error crawling seed {seed.url}: {str(error)}")
+        with self.condition:
+            seed.progress['status'] = 'failed'
+            seed.progress['error'] = str(error)
+            seed.pending.clear()
+
+    def _launch_failed(self, error):
+        """
+        A worker couldn't start its browser. Its seeds are left to the other
+        workers; once no worker is left, every queued seed fails with the error.
+        """
+        print(f"Could not start a browser for the batch: {str(error)}")
+        with self.condition:
+            self.live_workers -= 1
+            if self.live_workers > 0:
+                return
+            for seed in self.ready:
+                seed.progress['status'] = 'failed'
+                seed.progress['error'] = f"No browser could be started: {str(error)}"
+                seed.pending.clear()
+            self.ready.clear()
+            self.condition.notify_all()
+
+    def _worker(self):
+        self._attach_ctx()
+        try:
+            driver = setup_selenium(
+                attended_mode=False,
+                capture_network=self.settings.get('use_api_capture', False),
+                profile=self.settings.get('launch_profile')
+            )
+        except Exception as e:
+            self._launch_failed(e)
+            return
+        logged_in = False
+        try:
+            while True:
+                seed = self._next_seed()
+                if seed is None:
+                    return
+                release_now = True
+                try:
+                    if self.credentials and not logged_in:
+                        logged_in = handle_login(driver, self.credentials)
+                    release_now = self._fetch_page(seed, driver)
+                except Exception as e:
+                    self._fail(seed, e)
+                finally:
+                    self._fetch_done(seed)
+                    if release_now:
+                        self._release_seed(seed)
+        finally:
+            driver.quit()
+
+    def _fetch_page(self, seed, driver):
+        """
+        Fetch and convert the seed's next page, then hand it to the extraction pool.
+
+        Returns False when the seed must stay in flight until pagination
+        detection on its first page has found the rest of its pages.
+        """
+        with self.condition:
+            url = seed.pending.popleft()
+            seed.page_num += 1
+            page_num = seed.page_num
+            seed.progress['status'] = 'crawling'
+
+        if page_num == 1:
+            if self.settings.get('use_api_capture') and self._try_api_capture(seed, driver):
+                return True
+            raw_html = fetch_html_selenium(url, driver=driver, cookie_selectors=self.cookie_selectors)
+        else:
+            driver.get(url)
+            adaptive_scroll(driver)
+            raw_html = driver.page_source
+
+        # Converted in the process pool while this worker fetches the next page;
+        # the extraction thread waits for the markdown
+        page = PageSnapshot(url, raw_html, page_num, self.snapshot_stats).start_conversion()
+
+        needs_pagination = page_num == 1 and self.max_pages > 1
+        if self.packer is not None and not needs_pagination:
+            future = self.llm_executor.submit(self._pack_page, seed, page)
+        else:
+            future = self.llm_executor.submit(self._extract_page, seed, page, needs_pagination)
+        with self.condition:
+            self.extractions.append(future)
+        return not needs_pagination
+
+    def _try_api_capture(self, seed, driver):
+        captured = scrape_with_api_capture(
+            seed.url,
+            self.settings['fields'],
+            seed.output_folder,
+            driver=driver,
+            cookie_selectors=self.cookie_selectors,
+            max_pages=min(self.max_pages, API_CAPTURE_MAX_PAGES)
+        )
+        if captured is None:
+            return False
+        data, totals = captured
+        seed.data.extend(data)
+        seed.pending.clear()
+        with self.condition:
+            seed.progress['pages_done'] = seed.progress['pages_found'] = totals['api_pages']
+        if self.progress is not None:
+            self.progress.add_pages(totals['api_pages'] - 1)
+            for formatted_data in data:
+                self.progress.page_done(formatted_data)
+        return True
+
+    def _extract_page(self, seed, page, needs_pagination):
+        model_selection = self.settings['model_selection']
+        url, page_num = page.url, page.page_num
+        try:
+            save_raw_data(page.markdown, seed.output_folder, f'rawData_{page_num}.md')
+            streamed = StreamedListingWriter(seed.output_folder, f'streamed_data_{page_num}.jsonl')
+            formatted_data, token_counts, diff = extract_or_reuse(
+                self.fingerprint_store, page, self.settings['fields'],
+                lambda: extract_or_reuse_similar(
+                    self.near_duplicates, page, self.settings['fields'],
+                    lambda text: format_data(text, self.DynamicListingsContainer, self.DynamicListingModel,
+                                             model_selection, streamed, url),
+                    model_selection
+                )
+            )
+            self._save_page(seed, page_num, formatted_data, token_counts, diff)
+
+            if needs_pagination:
+                pagination_data, p_token_counts, p_cost = page.pagination(
+                    self.settings['pagination_details'], model_selection
+                )
+                self._add_usage(seed, p_token_counts, p_cost)
+                with self.condition:
+                    for page_url in pagination_page_urls(pagination_data):
+                        if len(seed.seen) < self.max_pages and seed.seen.add(page_url):
+                            seed.pending.append(page_url)
+                    new_pages = len(seed.seen) - seed.progress['pages_found']
+                    seed.progress['pages_found'] = len(seed.seen)
+                if self.progress is not None:
+                    self.progress.add_pages(new_pages)
+        except Exception as e:
+            self._fail(seed, e)
+        finally:
+            if needs_pagination:
+                self._release_seed(seed)
+
+    def _save_page(self, seed, page_num, formatted_data, token_counts, diff):
+        if diff is not None:
+            save_raw_data(json.dumps(diff, indent=4), seed.output_folder, f'diff_data_{page_num}.json')
+        _, _, cost = calculate_price(token_counts, self.settings['model_selection'])
+        self._add_usage(seed, token_counts, cost)
+        save_formatted_data(formatted_data, seed.output_folder,
+                            f'sorted_data_{page_num}.json',
+                            f'sorted_data_{page_num}.xlsx')
+        with self.condition:
+            seed.data.append(formatted_data)
+            seed.progress['pages_done'] += 1
+        if self.progress is not None:
+            self.progress.page_done(formatted_data)
+
+    def _pack_page(self, seed, page):
+        """Hand the page to the packer; it is saved once its pack has been answered."""
+        def on_done(formatted_data, token_counts, diff):
+            self._save_page(seed, page.page_num, formatted_data, token_counts, diff)
+        try:
+            save_raw_data(page.markdown, seed.output_folder, f'rawData_{page.page_num}.md')
+            streamed = StreamedListingWriter(seed.output_folder, f'streamed_data_{page.page_num}.jsonl')
+            # A pack holds pages of other seeds too; each failure belongs to its own seed
+            self.packer.add(page, on_done, streamed, on_error=lambda e: self._fail(seed, e))
+        except Exception as e:
+            self._fail(seed, e)
+
+    def snapshot(self):
+        """Return a copy of every seed's progress, safe to render from another thread."""
+        with self.condition:
+            return [dict(seed.progress) for seed in self.seeds]
+
+    def run(self, progress_callback=None, poll_interval=1.0):
+        """
+        Crawl all seeds and block until done.
+
+        Args:
+            progress_callback (callable): Called with snapshot() every poll_interval
+                seconds from the calling thread
+            poll_interval (float): Seconds between progress callbacks
+
+        Returns:
+            tuple: (all_data, totals, seed_progress)
+        """
+        num_workers = max(1, min(BATCH_SETTINGS['drivers'], len(self.seeds)))
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(num_workers)]
+        self.live_workers = num_workers
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=poll_interval / num_workers)
+                if progress_callback:
+                    progress_callback(self.snapshot())
+            wait(self.extractions)
+            if self.packer is not None:
+                # The last pack, short of the budget
+                self.packer.flush()
+        finally:
+            self.llm_executor.shutdown(wait=True)
+            if self.packer is not None:
+                dropped = self.packer.drop()
+                if dropped:
+                    message = f"{len(dropped)} pages waiting to be packed were not extracted: {', '.join(dropped)}"
+                    if self.progress is not None:
+                        self.progress.message(message, 'warning')
+                    else:
+                        print(message)
+
+        seed_progress = self.snapshot()
+        for progress in seed_progress:
+            if progress['status'] == 'fetched':
+                progress['status'] = 'done'
+        for seed, progress in zip(self.seeds, seed_progress):
+            seed.progress = progress
+        if progress_callback:
+            progress_callback(seed_progress)
+
+        all_data = [formatted_data for seed in self.seeds for formatted_data in seed.data]
+        totals = {
+            'input_tokens': sum(p['input_tokens'] for p in seed_progress),
+            'cached_input_tokens': sum(p['cached_input_tokens'] for p in seed_progress),
+            'output_tokens': sum(p['output_tokens'] for p in seed_progress),
+            'total_cost': sum(p['cost'] for p in seed_progress),
+            'request_packing': dict(self.packer.stats) if self.packer is not None else None
+        }
+        return all_data, totals, seed_progress
+
@@ -0,0 +1,89 @@
+"""
+Benchmark browser cold start: time from asking for a driver to the end of its
+first navigation.
+
+Modes:
+- webdriver-manager: ChromeDriverManager().install() on every launch and a
+  blank profile, as setup_selenium used to do
+- cached-driver:     driver_cache.resolve_chromedriver() and a blank profile
+- profile-template:  cached driver plus a copy of the initialised profile
+  template, as setup_selenium does now
+
+The first launch of each mode is reported separately: for cached-driver it
+includes resolving the driver, and for profile-template building the
+template. Needs Chrome; the webdriver-manager mode also needs network access
+unless its own cache is warm.
+
+Usage:
+    python benchmarks/bench_driver_startup.py [--runs 5] [--skip-webdriver-manager]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from selenium_utils import chrome_options, ensure_profile_template
+from driver_cache import resolve_chromedriver, new_profile_dir, release_profile_dir
+from assets import DRIVER_CACHE_SETTINGS
+
+FIRST_PAGE = "data:text/html,<title>ready</title><p>ready</p>"
+
+
+def launch_webdriver_manager():
+    from webdriver_manager.chrome import ChromeDriverManager
+    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options()), None
+
+
+def launch_cached_driver():
+    return webdriver.Chrome(service=Service(resolve_chromedriver()), options=chrome_options()), None
+
+
+def launch_profile_template():
+    ensure_profile_template()
+    profile_dir = new_profile_dir()
+    options = chrome_options()
+    options.add_argument(f"--user-data-dir={profile_dir}")
+    for option in DRIVER_CACHE_SETTINGS['startup_args']:
+        options.add_argument(option)
+    return webdriver.Chrome(service=Service(resolve_chromedriver()), options=options), profile_dir
+
+
+def time_to_first_navigation(launch):
+    start = time.perf_counter()
+    driver, profile_dir = launch()
+    try:
+        driver.get(FIRST_PAGE)
+        return time.perf_counter() - start
+    finally:
+        driver.quit()
+        if profile_dir:
+            release_profile_dir(profile_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="warm launches per mode after the first one")
+    parser.add_argument('--skip-webdriver-manager', action='store_true', help="leave out the network-dependent mode")
+    args = parser.parse_args()
+
+    modes = [('webdriver-manager', launch_webdriver_manager),
+             ('cached-driver', launch_cached_driver),
+             ('profile-template', launch_profile_template)]
+    if args.skip_webdriver_manager:
+        modes = modes[1:]
+
+    print(f"{'mode':<18} {'first (s)':>10} {'median (s)':>11} {'min (s)':>8}")
+    for name, launch in modes:
+        first = time_to_first_navigation(launch)
+        timings = [time_to_first_navigation(launch) for _ in range(args.runs)]
+        print(f"{name:<18} {first:>10.2f} {statistics.median(timings):>11.2f} {min(timings):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark how many concurrent headless pages each launch profile sustains
+per CPU core and per GB of memory.
+
+For every profile in LAUNCH_PROFILES and every concurrency level, starts
+enough headless browsers to keep that many pages loading at once (TabPool
+tabs, --tabs-per-browser per browser), crawls the fixture pages, and
+reports pages/sec, the CPU cores the browser process trees used on average,
+their peak memory, and from those the concurrent pages per core and per GB.
+Pages that failed to load are counted too: a level a profile doesn't
+sustain shows up as failures before it shows up as throughput.
+
+Fixtures are recorded pages: --html-dir serves every .html file in a
+directory (e.g. page sources saved from earlier crawls). Without it the
+lazy-loading listing pages of bench_tab_pool.py are served instead.
+
+Browsers are launched with chrome_options() directly, outside the browser
+governor, so its cap doesn't limit the levels tried. Memory and CPU are read
+from /proc (Linux only). Needs Chrome and chromedriver like the scraper itself.
+
+Usage:
+    python benchmarks/bench_launch_profiles.py [--concurrency 4 8 16] [--pages 48] [--html-dir recorded/]
+"""
+
+import argparse
+import functools
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from selenium_utils import chrome_options, TabPool
+from driver_cache import resolve_chromedriver
+from browser_governor import tree_memory, process_tree, driver_pid
+from assets import LAUNCH_PROFILES
+from bench_tab_pool import serve
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def _cpu_seconds(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS  # utime + stime
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+class ResourceSampler:
+    """Peak memory and total CPU time of the browsers' process trees."""
+
+    def __init__(self, drivers, interval=0.5):
+        self.pids = [driver_pid(driver) for driver in drivers]
+        self.interval = interval
+        self.peak = 0
+        # Last CPU time seen per process, so renderers that exit still count
+        self.cpu = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        self.peak = max(self.peak, tree_memory(self.pids))
+        for pid in process_tree(self.pids):
+            self.cpu[pid] = max(self.cpu.get(pid, 0.0), _cpu_seconds(pid))
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self._sample()
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self._sample()
+        self.start_cpu = dict(self.cpu)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop_event.set()
+        self.thread.join()
+        self._sample()
+
+    def cpu_seconds(self):
+        return sum(total - self.start_cpu.get(pid, 0.0) for pid, total in self.cpu.items())
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_directory(html_dir):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=html_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fixture_urls(args):
+    if args.html_dir:
+        server = serve_directory(args.html_dir)
+        names = sorted(name for name in os.listdir(args.html_dir) if name.endswith('.html'))
+        if not names:
+            sys.exit(f"No .html files in {args.html_dir}")
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        urls = [f"{base}/{names[i % len(names)]}?copy={i}" for i in range(args.pages)]
+    else:
+        server = serve(args.batches)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        urls = [f"{base}/page/{i}" for i in range(args.pages)]
+    return server, urls
+
+
+def run_level(profile, urls, concurrency, tabs_per_browser):
+    browsers = math.ceil(concurrency / tabs_per_browser)
+    options = chrome_options(multi_tab=True, profile=profile, headless=True)
+    drivers = [webdriver.Chrome(service=Service(resolve_chromedriver()), options=options) for _ in range(browsers)]
+    try:
+        shares = [urls[i::browsers] for i in range(browsers)]
+        tabs = [min(tabs_per_browser, concurrency - i * tabs_per_browser) for i in range(browsers)]
+
+        def crawl(driver, share, tab_count):
+            with TabPool(driver, tabs=tab_count) as pool:
+                return [html is not None for _, _, html in pool.fetch_many(share)]
+
+        with ResourceSampler(drivers) as sampler:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=browsers) as executor:
+                outcomes = [ok for result in executor.map(crawl, drivers, shares, tabs) for ok in result]
+            elapsed = time.perf_counter() - start
+        return outcomes.count(True), outcomes.count(False), elapsed, sampler.cpu_seconds(), sampler.peak
+    finally:
+        for driver in drivers:
+            driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=list(LAUNCH_PROFILES), choices=list(LAUNCH_PROFILES))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 8, 16], help="pages loading at once")
+    parser.add_argument('--tabs-per-browser', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=48, help="pages crawled per level")
+    parser.add_argument('--html-dir', help="directory of recorded .html pages to serve as fixtures")
+    parser.add_argument('--batches', type=int, default=3, help="lazy-loaded item batches per generated page")
+    args = parser.parse_args()
+
+    server, urls = fixture_urls(args)
+    print(f"{len(urls)} pages per level on {os.cpu_count()} cores, {args.tabs_per_browser} tabs per browser\n")
+    print(f"{'profile':<12} {'at once':>7} {'ok':>5} {'failed':>7} {'pages/s':>8} {'cores':>6} "
+          f"{'peak GB':>8} {'pages/core':>11} {'pages/GB':>9}")
+    for profile in args.profiles:
+        for concurrency in args.concurrency:
+            ok, failed, elapsed, cpu, peak = run_level(profile, urls, concurrency, args.tabs_per_browser)
+            cores = cpu / elapsed
+            peak_gb = peak / 2 ** 30
+            per_core = concurrency / cores if cores else float('nan')
+            per_gb = concurrency / peak_gb if peak_gb else float('nan')
+            print(f"{profile:<12} {concurrency:>7} {ok:>5} {failed:>7} {ok / elapsed:>8.2f} {cores:>6.2f} "
+                  f"{peak_gb:>8.2f} {per_core:>11.1f} {per_gb:>9.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark rule_extractor.extract_with_rules against the regex fallback it replaced.
+
+Generates markdown shaped like clean_html output (title, status and price
+markers per product, surrounded by description noise) and times both
+extractors on growing inputs.
+
+Usage:
+    python benchmarks/bench_rule_extractor.py [--products 1000 10000 50000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rule_extractor import extract_with_rules
+
+
+def legacy_regex_fallback(data):
+    """The fallback previously inlined three times in handle_ollama."""
+    titles = re.findall(r'## PRODUCT_TITLE:\s*(.*?)(?=\n|$)', data)
+    prices = re.findall(r'PRODUCT_PRICE:\s*(\d+\s*\d+(?:,\d+)?)', data)
+    availability_pattern = r'Nouveauté en production ultra tendue\. (.*?)(?=\n|$)'
+    availabilities = re.findall(availability_pattern, data)
+
+    listings = []
+    for i in range(len(titles)):
+        price = prices[i].strip().replace(" ", "") if i < len(prices) else ""
+        listings.append({
+            "title": titles[i].strip(),
+            "price": price,
+            "status": availabilities[0].strip() if availabilities else "Prochaines dispos au printemps 2025"
+        })
+    return {"listings": listings}
+
+
+def make_markdown(products, seed=0):
+    rng = random.Random(seed)
+    words = "boitier objectif capteur hybride plein format stabilisation monture zoom".split()
+    parts = []
+    for i in range(products):
+        parts.append(f"## PRODUCT_TITLE: CANON EOS R{i} {' '.join(rng.sample(words, 3))}\n\n")
+        if rng.random() < 0.7:
+            parts.append("PRODUCT_STATUS: En Stock\n\n")
+        parts.append(f"PRODUCT_PRICE: {rng.randint(1, 9)} {rng.randint(100, 999)},{rng.randint(0, 99):02d}\n\n")
+        parts.append(" ".join(rng.choice(words) for _ in range(40)) + "\n\n")
+    return "".join(parts)
+
+
+def best_time(function, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, nargs='+', default=[1_000, 10_000, 50_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'products':>9} {'size MB':>8} {'legacy ms':>10} {'rules ms':>9} {'speedup':>8} {'rules MB/s':>11}")
+    for products in args.products:
+        markdown = make_markdown(products)
+        size_mb = len(markdown.encode('utf-8')) / 1_000_000
+        legacy_time, legacy = best_time(legacy_regex_fallback, markdown, args.repeat)
+        rules_time, rules = best_time(extract_with_rules, markdown, args.repeat)
+        assert len(rules['listings']) == len(legacy['listings']) == products
+        print(f"{products:>9} {size_mb:>8.1f} {legacy_time * 1000:>10.1f} {rules_time * 1000:>9.1f} "
+              f"{legacy_time / rules_time:>7.2f}x {size_mb / rules_time:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Benchmark listing-region segmentation: tokens sent to the model and listing recall.
+
+Builds fixture pages in several layouts (card grid split into rows, result
+list with varying cards, table rows, the PrestaShop-style h2 miniatures
+clean_html was written for, a grid with promoted cards carrying an extra
+class), each surrounded by navigation, filters, footer link columns and
+pagination, plus a product detail page whose only repeated blocks are a
+"Customers also bought" strip. That page must be left whole: its recall
+counts the main product's title and description. Every page is converted to markdown
+with segmentation off and on, and the benchmark reports the tokens of both,
+the share of known listing titles that survive segmentation (recall), how
+much page chrome is left, and whether the pagination link is kept.
+
+--html-dir adds recorded pages (any .html files); they have no known
+listings, so only their token reduction is reported.
+
+Usage:
+    python benchmarks/bench_segmentation.py [--items 24] [--html-dir recorded/]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import tiktoken
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import html_processing
+from assets import SEGMENTATION_SETTINGS
+
+WORDS = "boitier objectif capteur hybride plein format stabilisation monture zoom grand angle lumineux".split()
+
+
+def chrome(body, rng):
+    """Wrap listing markup in the menus, filters and footer of a shop page."""
+    menu = ''.join(
+        f'<li class="category"><a href="/c/{c}">CHROME_MENU {c}</a><ul class="sub-menu">'
+        + ''.join(f'<li><a href="/c/{c}/{i}">CHROME_MENU {" ".join(rng.sample(WORDS, 2))}</a></li>' for i in range(8))
+        + '</ul></li>'
+        for c in range(6)
+    )
+    facets = ''.join(
+        f'<li class="facet-item"><a href="?q={i}" rel="nofollow"><span class="facet-label">CHROME_FILTER '
+        f'{" ".join(rng.sample(WORDS, 2))}</span> <span class="count">({rng.randint(1, 90)})</span></a></li>'
+        for i in range(14)
+    )
+    reassurance = ''.join(
+        f'<div class="block-reassurance-item"><img src="/r/{i}.svg"><span>CHROME_INFO {description(rng)}</span></div>'
+        for i in range(3)
+    )
+    footer = ''.join(
+        '<div class="links col-md-3"><p class="h3">CHROME_FOOTER</p><ul>'
+        + ''.join(f'<li><a href="/p/{c}-{i}">CHROME_FOOTER link {c}-{i}</a></li>' for i in range(6))
+        + '</ul></div>'
+        for c in range(4)
+    )
+    return f"""<!doctype html><html><head><title>Catalogue</title>
+<style>.product-card {{ color: red }}</style><script>window.dataLayer = [];</script></head>
+<body><div id="header"><div class="top-menu"><ul class="menu">{menu}</ul></div>
+<div class="banner">CHROME_BANNER Free shipping on orders over 50 €, returns within 30 days.</div></div>
+<nav class="breadcrumb"><a href="/">CHROME_CRUMB Home</a> / <a href="/c/1">CHROME_CRUMB Cameras</a></nav>
+<div id="content"><h1>Cameras</h1><div id="left-column"><ul class="facets">{facets}</ul></div>
+{body}
+<nav class="pagination"><a href="?page=1">1</a><a href="?page=2" rel="next">2</a><a href="?page=3">3</a></nav>
+<div class="reassurance">{reassurance}</div></div>
+<div id="footer"><div class="newsletter">CHROME_NEWSLETTER Get our offers by email <input type="email"></div>
+<div class="row">{footer}</div><p>CHROME_FOOTER Copyright, terms and privacy.</p></div></body></html>"""
+
+
+def title(i):
+    return f"LISTING {i} {WORDS[i % len(WORDS)]} {WORDS[(i * 7 + 3) % len(WORDS)]}"
+
+
+def description(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 25)))
+
+
+def grid_page(items, rng):
+    cards = [
+        '<div class="col-3">'
+        f'<article class="product-card"><a href="/item/{i}"><img src="/img/{i}.jpg"></a>'
+        f'<h3 class="product-title"><a href="/item/{i}">{t}</a></h3>'
+        + (f'<span class="badge">-{rng.randint(5, 40)}%</span>' if rng.random() < 0.3 else '')
+        + f'<span class="price">{rng.randint(100, 3000)},00 €</span><p>{description(rng)}</p></article></div>'
+        for i, t in ((i, title(i)) for i in range(items))
+    ]
+    rows = ''.join(f'<div class="row">{"".join(cards[i:i + 4])}</div>' for i in range(0, len(cards), 4))
+    return f'<div class="products">{rows}</div>'
+
+
+def list_page(items, rng):
+    results = ''.join(
+        f'<li class="result-item"><h2><a href="/r/{i}">{title(i)}</a></h2>'
+        + (f'<div class="rating">{rng.randint(1, 5)} stars ({rng.randint(1, 300)} reviews)</div>' if rng.random() < 0.5 else '')
+        + f'<div class="meta"><span>{rng.randint(100, 3000)} €</span><span>Ships in {rng.randint(1, 9)} days</span></div></li>'
+        for i in range(items)
+    )
+    return f'<ul class="results">{results}</ul>'
+
+
+def table_page(items, rng):
+    rows = ''.join(
+        f'<tr><td><a href="/t/{i}">{title(i)}</a></td><td>{rng.randint(100, 3000)} €</td><td>En Stock</td></tr>'
+        for i in range(items)
+    )
+    return f'<table class="catalogue"><thead><tr><th>Name</th><th>Price</th><th>Status</th></tr></thead><tbody>{rows}</tbody></table>'
+
+
+def miniature_page(items, rng):
+    products = ''.join(
+        f'<div class="product-miniature js-product-miniature" data-id-product="{i}"><div class="thumbnail-container">'
+        f'<h2 class="h3 product-title"><a href="/shop/{i}">{title(i)}</a></h2>'
+        f'<div class="product-price-and-shipping"><span class="price">{rng.randint(1, 9)} {rng.randint(100, 999)},00 €</span></div>'
+        f'<p>En Stock</p></div></div>'
+        for i in range(items)
+    )
+    return f'<div id="js-product-list"><div class="products row">{products}</div></div>'
+
+
+def promo_grid_page(items, rng):
+    cards = ''.join(
+        f'<article class="{"product-card product-card--promo" if i % 6 == 2 else "product-card"}">'
+        f'<h3 class="product-title"><a href="/item/{i}">{title(i)}</a></h3>'
+        + (f'<span class="ribbon">Sponsored</span>' if i % 6 == 2 else '')
+        + f'<span class="price">{rng.randint(100, 3000)},00 €</span><p>{description(rng)}</p></article>'
+        for i in range(items)
+    )
+    return f'<div class="products-grid">{cards}</div>'
+
+
+def product_page(items, rng):
+    """A product detail page; the items are its recommendations, only four of them shown."""
+    recommendations = ''.join(
+        f'<div class="reco-card"><a href="/item/{i}"><img src="/img/{i}.jpg"></a>'
+        f'<a class="reco-title" href="/item/{i}">{title(i)}</a><span class="price">{rng.randint(100, 3000)},00 €</span></div>'
+        for i in range(4)
+    )
+    description_text = ' '.join(description(rng) for _ in range(12))
+    return (f'<div class="product-detail"><h2>MAIN_PRODUCT {title(items)}</h2><span class="price">1 499,00 €</span>'
+            f'<div class="product-description"><p>MAIN_DESCRIPTION {description_text}</p>'
+            f'<p>{" ".join(description(rng) for _ in range(8))}</p></div>'
+            f'<table class="specs"><tr><td>Capteur</td><td>24 Mpx</td></tr><tr><td>Monture</td><td>RF</td></tr></table></div>'
+            f'<section class="also-bought"><h2>Customers also bought</h2><div class="reco-list">{recommendations}</div></section>')
+
+
+LAYOUTS = {'grid': grid_page, 'list': list_page, 'table': table_page, 'miniature': miniature_page,
+           'promo-grid': promo_grid_page}
+
+
+def convert(html, segment):
+    enabled = SEGMENTATION_SETTINGS['enabled']
+    SEGMENTATION_SETTINGS['enabled'] = segment
+    try:
+        start = time.perf_counter()
+        markdown = html_processing.html_to_markdown_with_readability(html)
+        return markdown, time.perf_counter() - start
+    finally:
+        SEGMENTATION_SETTINGS['enabled'] = enabled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=24, help="listings per fixture page")
+    parser.add_argument('--html-dir', help="directory of recorded .html pages")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    encoder = tiktoken.get_encoding('cl100k_base')
+    rng = random.Random(args.seed)
+    pages = []
+    for name, layout in LAYOUTS.items():
+        html = chrome(layout(args.items, rng), rng)
+        pages.append((name, html, [title(i) for i in range(args.items)]))
+    pages.append(('product', chrome(product_page(args.items, rng), rng), [f'MAIN_PRODUCT {title(args.items)}', 'MAIN_DESCRIPTION']))
+    if args.html_dir:
+        for name in sorted(os.listdir(args.html_dir)):
+            if name.endswith('.html'):
+                with open(os.path.join(args.html_dir, name), 'r', encoding='utf-8', errors='replace') as f:
+                    pages.append((name, f.read(), None))
+
+    print(f"{'page':<16} {'tokens':>7} {'segmented':>10} {'saved':>6} {'recall':>7} {'chrome':>7} {'next':>5} {'ms':>6}")
+    for name, html, titles in pages:
+        full, _ = convert(html, False)
+        segmented, elapsed = convert(html, True)
+        full_tokens, segmented_tokens = len(encoder.encode(full)), len(encoder.encode(segmented))
+        saved = 1 - segmented_tokens / full_tokens if full_tokens else 0
+        recall = f"{sum(t in segmented for t in titles) / len(titles):.0%}" if titles else '-'
+        leftover = segmented.count('CHROME_') if titles else '-'
+        keeps_next = 'yes' if '?page=2' in segmented else 'no'
+        print(f"{name[:16]:<16} {full_tokens:>7} {segmented_tokens:>10} {saved:>6.0%} {recall:>7} {leftover:>7} "
+              f"{keeps_next:>5} {elapsed * 1000:>6.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark TabPool against one driver per concurrent page.
+
+Serves a local listing site whose pages load more items on scroll, then
+crawls the same pages twice with K pages in flight:
+
+- drivers: K browsers from setup_selenium, one page at a time each
+- tabs:    one browser from setup_selenium(multi_tab=True) with a K-tab TabPool
+
+and reports pages/sec and the peak memory of the browser process trees per
+concurrent page. Memory is read from /proc (Linux only) as PSS where the
+kernel provides it, so pages shared between Chrome processes are not counted
+twice; otherwise RSS.
+
+Needs Chrome and chromedriver like the scraper itself.
+
+Usage:
+    python benchmarks/bench_tab_pool.py [--pages 24] [--concurrency 4] [--batches 3]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from selenium_utils import setup_selenium, adaptive_scroll, TabPool
+from browser_governor import tree_memory, driver_pid
+
+PAGE_TEMPLATE = """<!doctype html>
+<html><head><title>Page {page}</title></head>
+<body>
+<div id="products"></div>
+<script>
+const batches = {batches};
+let loaded = 0;
+function addBatch() {{
+    const container = document.getElementById('products');
+    for (let i = 0; i < 20; i++) {{
+        const item = document.createElement('article');
+        item.className = 'product-miniature';
+        item.innerHTML = '<h2><a href="#">Product {page}-' + (loaded * 20 + i) + '</a></h2>'
+            + '<p>' + 'description '.repeat(30) + '</p><p>1 299,00 €</p>';
+        item.style.height = '200px';
+        container.appendChild(item);
+    }}
+    loaded++;
+}}
+addBatch();
+window.addEventListener('scroll', () => {{
+    if (loaded < batches && window.innerHeight + window.scrollY >= document.body.scrollHeight - 50) {{
+        setTimeout(addBatch, 150);  // lazy content arrives after a short network-like delay
+    }}
+}});
+</script>
+</body></html>
+"""
+
+
+def serve(batches):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = self.path.strip('/').split('/')[-1] or '0'
+            body = PAGE_TEMPLATE.format(page=page, batches=batches).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class MemorySampler:
+    """Samples the memory of the drivers' process trees and keeps the peak."""
+
+    def __init__(self, drivers, interval=0.5):
+        self.pids = [driver_pid(driver) for driver in drivers]
+        self.interval = interval
+        self.peak = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.peak = max(self.peak, tree_memory(self.pids))
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop_event.set()
+        self.thread.join()
+
+
+def run_drivers(urls, concurrency):
+    drivers = [setup_selenium(attended_mode=False) for _ in range(concurrency)]
+    try:
+        work = list(urls)
+        lock = threading.Lock()
+        fetched = []
+
+        def worker(driver):
+            while True:
+                with lock:
+                    if not work:
+                        return
+                    url = work.pop(0)
+                driver.get(url)
+                adaptive_scroll(driver)
+                fetched.append(len(driver.page_source))
+
+        with MemorySampler(drivers) as sampler:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(worker, drivers))
+            elapsed = time.perf_counter() - start
+        return len(fetched), elapsed, sampler.peak
+    finally:
+        for driver in drivers:
+            driver.quit()
+
+
+def run_tabs(urls, concurrency):
+    driver = setup_selenium(attended_mode=False, multi_tab=True)
+    try:
+        with MemorySampler([driver]) as sampler:
+            start = time.perf_counter()
+            with TabPool(driver, tabs=concurrency) as tabs:
+                fetched = [len(html) for _, _, html in tabs.fetch_many(urls) if html]
+            elapsed = time.perf_counter() - start
+        return len(fetched), elapsed, sampler.peak
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=24)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--batches', type=int, default=3, help="lazy-loaded item batches per page")
+    args = parser.parse_args()
+
+    server = serve(args.batches)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/page/{i}" for i in range(args.pages)]
+
+    print(f"{args.pages} pages, {args.concurrency} at a time, {args.batches} lazy batches per page\n")
+    print(f"{'mode':<8} {'pages':>6} {'seconds':>8} {'pages/s':>8} {'peak MB':>8} {'MB/page slot':>13}")
+    for mode, run in (('drivers', run_drivers), ('tabs', run_tabs)):
+        pages, elapsed, peak = run(urls, args.concurrency)
+        peak_mb = peak / 2 ** 20
+        print(f"{mode:<8} {pages:>6} {elapsed:>8.1f} {pages / elapsed:>8.2f} {peak_mb:>8.0f} {peak_mb / args.concurrency:>13.0f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+"""
+Process-wide limits on the Chrome browsers the scraper keeps running.
+
+Drivers are created per Streamlit session, per batch worker and per job, and
+nothing used to look at them together: an unattended run left its browser in
+st.session_state, and a closed browser tab left its session's Chrome running
+until the server stopped. setup_selenium registers every driver here instead.
+The governor caps how many browsers run at once, evicting the longest idle
+one when a new one is needed, and a reaper thread quits drivers that have
+been idle beyond a TTL, belong to a session Streamlit no longer knows, or
+whose process tree has grown past a memory ceiling. Drivers of a session
+that is running a scrape are never reaped. Nor are attended browsers while
+the user works in them by hand, which can take longer than any idle limit:
+they are registered pinned and only a closed session quits them until the
+scrape starts and unpins them.
+
+Memory is read from /proc (Linux only) as PSS where the kernel provides it,
+so pages shared between Chrome processes are not counted twice; otherwise
+RSS. Elsewhere it reads as 0 and the memory ceiling does nothing.
+"""
+
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from assets import GOVERNOR_SETTINGS
+
+
+def _children():
+    children = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(pid))
+    return children
+
+
+def _process_memory(pid):
+    """PSS of one process in bytes, or RSS if smaps_rollup is unavailable."""
+    for path, key in ((f'/proc/{pid}/smaps_rollup', 'Pss:'), (f'/proc/{pid}/status', 'VmRSS:')):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(key):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return 0
+
+
+def process_tree(root_pids):
+    """pids of the given processes and all their descendants."""
+    if not os.path.isdir('/proc'):
+        return []
+    children = _children()
+    pids = []
+    stack = list(root_pids)
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def tree_memory(root_pids):
+    """Memory in bytes of the given processes and all their descendants."""
+    return sum(_process_memory(pid) for pid in process_tree(root_pids))
+
+
+def driver_pid(driver):
+    """pid of the chromedriver process; Chrome and its renderers run below it."""
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+
+def current_session_id():
+    """id of the Streamlit session running this thread, or None outside Streamlit."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def _session_alive(session_id):
+    try:
+        from streamlit import runtime
+    except ImportError:
+        return True
+    if not runtime.exists():
+        return True
+    return runtime.get_instance().is_active_session(session_id)
+
+
+class _Entry:
+    def __init__(self, driver, owner, pinned=False):
+        self.driver = driver
+        self.owner = owner
+        self.pinned = pinned
+        self.pid = driver_pid(driver)
+        self.created = time.time()
+        self.last_used = self.created
+        self.memory = 0
+
+    def idle(self, now):
+        return now - self.last_used
+
+
+class BrowserGovernor:
+    """
+    Registry of every running driver with a cap on their number.
+
+    Args:
+        max_browsers (int): Browsers allowed at once across all sessions
+        idle_ttl (float): Seconds a driver may go unused before it is quit
+        memory_ceiling_mb (float): Process-tree memory above which an idle driver is recycled
+        recycle_idle (float): Seconds a driver must be unused before it may be recycled or evicted
+        reap_interval (float): Seconds between reaper passes
+    """
+
+    def __init__(self, max_browsers=None, idle_ttl=None, memory_ceiling_mb=None, recycle_idle=None, reap_interval=None):
+        self.max_browsers = max_browsers or GOVERNOR_SETTINGS['max_browsers']
+        self.idle_ttl = idle_ttl or GOVERNOR_SETTINGS['idle_ttl']
+        self.memory_ceiling = (memory_ceiling_mb or GOVERNOR_SETTINGS['memory_ceiling_mb']) * 2 ** 20
+        self.recycle_idle = recycle_idle if recycle_idle is not None else GOVERNOR_SETTINGS['recycle_idle']
+        self.reap_interval = reap_interval or GOVERNOR_SETTINGS['reap_interval']
+        self.condition = threading.Condition()
+        self.entries = {}
+        self.launching = 0
+        self.busy_sessions = {}
+        self.reaped = {'idle': 0, 'dead_session': 0, 'memory': 0, 'evicted': 0}
+        self.stop_event = threading.Event()
+        self.reaper = threading.Thread(target=self._reap_loop, name='browser-reaper', daemon=True)
+        self.reaper.start()
+
+    def _busy(self, entry):
+        return entry.owner is not None and self.busy_sessions.get(entry.owner, 0) > 0
+
+    def admit(self, timeout=None):
+        """
+        Reserve a slot for a new browser, evicting the longest idle driver if
+        all slots are taken. Follow with register(), or release_slot() if the
+        launch fails.
+
+        Raises:
+            RuntimeError: If no slot frees up within timeout seconds
+        """
+        deadline = time.time() + (timeout or GOVERNOR_SETTINGS['admit_timeout'])
+        while True:
+            victim = None
+            with self.condition:
+                if len(self.entries) + self.launching < self.max_browsers:
+                    self.launching += 1
+                    return
+                now = time.time()
+                candidates = [e for e in self.entries.values()
+                              if not self._busy(e) and not e.pinned and e.idle(now) >= self.recycle_idle]
+                if candidates:
+                    victim = max(candidates, key=lambda e: e.idle(now))
+                    self.reaped['evicted'] += 1
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise RuntimeError(
+                            f"All {self.max_browsers} browsers are in use; "
+                            f"raise GOVERNOR_SETTINGS['max_browsers'] or try again later."
+                        )
+                    self.condition.wait(min(remaining, self.reap_interval))
+            if victim is not None:
+                print(f"Browser limit reached, quitting the driver idle for {victim.idle(time.time()):.0f}s")  # Debug print
+                self._quit(victim)
+
+    def release_slot(self):
+        with self.condition:
+            self.launching -= 1
+            self.condition.notify_all()
+
+    def register(self, driver, owner=None, pinned=False):
+        """
+        Track a driver launched after admit(). Its quit() unregisters it, and
+        every WebDriver command counts as use.
+
+        Args:
+            owner (str): Streamlit session id; defaults to the calling thread's session
+            pinned (bool): Never evict or recycle it, only quit it with its session; see unpin()
+        """
+        entry = _Entry(driver, owner if owner is not None else current_session_id(), pinned)
+        with self.condition:
+            self.launching -= 1
+            self.entries[id(driver)] = entry
+
+        execute = driver.execute
+        def execute_and_touch(*args, **kwargs):
+            entry.last_used = time.time()
+            return execute(*args, **kwargs)
+        driver.execute = execute_and_touch
+
+        quit_driver = driver.quit
+        def quit_and_unregister():
+            try:
+                quit_driver()
+            finally:
+                self._forget(driver)
+        driver.quit = quit_and_unregister
+        return driver
+
+    def _forget(self, driver):
+        with self.condition:
+            if self.entries.pop(id(driver), None) is not None:
+                self.condition.notify_all()
+
+    def is_alive(self, driver):
+        """Whether the driver is still registered, i.e. not quit or reaped."""
+        with self.condition:
+            return id(driver) in self.entries
+
+    def unpin(self, driver):
+        """Let a pinned driver be evicted and reaped like any other from now on."""
+        with self.condition:
+            entry = self.entries.get(id(driver))
+            if entry is not None:
+                entry.pinned = False
+                entry.last_used = time.time()
+
+    def touch(self, driver):
+        """Count as use work done on the driver outside WebDriver, e.g. over CDP."""
+        entry = self.entries.get(id(driver))
+        if entry is not None:
+            entry.last_used = time.time()
+
+    @contextmanager
+    def session_busy(self, session_id=None):
+        """Keep the session's drivers from being reaped while the block runs."""
+        session_id = session_id if session_id is not None else current_session_id()
+        with self.condition:
+            self.busy_sessions[session_id] = self.busy_sessions.get(session_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.busy_sessions[session_id] -= 1
+                if not self.busy_sessions[session_id]:
+                    del self.busy_sessions[session_id]
+                # Time spent in the run doesn't count towards the idle TTL
+                for entry in self.entries.values():
+                    if entry.owner == session_id:
+                        entry.last_used = time.time()
+
+    def _quit(self, entry):
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            print(f"Error quitting driver: {str(e)}")  # Debug print
+        finally:
+            self._forget(entry.driver)
+
+    def reap(self):
+        """
+        Quit drivers idle beyond the TTL, owned by dead sessions, or over the
+        memory ceiling. Runs on the reaper thread; callable directly too.
+
+        Returns:
+            list: (reason, entry) for every driver quit
+        """
+        with self.condition:
+            entries = [e for e in self.entries.values() if not self._busy(e)]
+        now = time.time()
+        victims = []
+        for entry in entries:
+            if entry.pid is not None:
+                entry.memory = tree_memory([entry.pid])
+            if entry.owner is not None and not _session_alive(entry.owner):
+                victims.append(('dead_session', entry))
+            elif entry.pinned:
+                continue
+            elif entry.idle(now) > self.idle_ttl:
+                victims.append(('idle', entry))
+            elif entry.memory > self.memory_ceiling and entry.idle(now) >= self.recycle_idle:
+                victims.append(('memory', entry))
+        for reason, entry in victims:
+            print(f"Reaping driver ({reason}): idle {entry.idle(now):.0f}s, {entry.memory / 2 ** 20:.0f} MB")  # Debug print
+            with self.condition:
+                self.reaped[reason] += 1
+            self._quit(entry)
+        return victims
+
+    def _reap_loop(self):
+        while not self.stop_event.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Browser reaper error: {str(e)}")  # Debug print
+
+    def stats(self):
+        """Running browsers, their total memory and how many were reaped, by reason."""
+        with self.condition:
+            entries = list(self.entries.values())
+            reaped = dict(self.reaped)
+        return {
+            'browsers': len(entries),
+            'max_browsers': self.max_browsers,
+            'memory_mb': sum(e.memory for e in entries) / 2 ** 20,
+            'reaped': reaped
+        }
+
+    def shutdown(self):
+        """Stop the reaper and quit every driver still running."""
+        self.stop_event.set()
+        with self.condition:
+            entries = list(self.entries.values())
+        for entry in entries:
+            self._quit(entry)
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor():
+    """Return the process-wide governor, creating it on first use."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = BrowserGovernor()
+            atexit.register(_governor.shutdown)
+        return _governor
@@ -0,0 +1,265 @@
+"""
+Direct Chrome DevTools Protocol transport for page capture.
+
+Every WebDriver command travels client -> chromedriver (HTTP) -> Chrome (CDP)
+and back, and fetch_html_selenium issues many of them: a navigation, waits,
+an execute_script per scroll step and page_source. This module talks to the
+page's DevTools websocket directly instead. Lifecycle events replace the
+fixed post-navigation sleep, the whole adaptive scroll runs inside the page
+as a single awaited Runtime.evaluate, and independent commands are pipelined
+in one batch() call. chromedriver stays in charge of launching the browser,
+logins and cookie banners, and remains the fallback whenever CDP fails.
+"""
+
+import itertools
+import json
+import threading
+import time
+import urllib.request
+
+import websocket
+
+from assets import CDP_SETTINGS, SCROLL_SETTINGS, NUMBER_SCROLL, LISTING_NODE_SELECTOR, TIMEOUT_SETTINGS
+
+
+class CDPError(Exception):
+    """A DevTools command failed, timed out or the connection broke."""
+
+
+class CDPSession:
+    """
+    Websocket connection to one DevTools target.
+
+    A reader thread files command responses by id and keeps events, so
+    several commands can be in flight at once.
+
+    Args:
+        ws_url (str): webSocketDebuggerUrl of the target
+        timeout (float): Default seconds to wait for a response
+    """
+
+    def __init__(self, ws_url, timeout=None):
+        self.ws_url = ws_url
+        self.timeout = timeout or CDP_SETTINGS['command_timeout']
+        # Chrome rejects websocket clients sending an Origin it doesn't allow
+        self.ws = websocket.create_connection(ws_url, timeout=self.timeout, suppress_origin=True)
+        self.ws.settimeout(None)
+        self.ids = itertools.count(1)
+        self.send_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.responses = {}
+        self.events = []
+        self.closed = False
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        try:
+            while True:
+                message = json.loads(self.ws.recv())
+                with self.condition:
+                    if 'id' in message:
+                        self.responses[message['id']] = message
+                    else:
+                        self.events.append(message)
+                        del self.events[:-CDP_SETTINGS['max_events']]
+                    self.condition.notify_all()
+        except Exception:
+            with self.condition:
+                self.closed = True
+                self.condition.notify_all()
+
+    def batch(self, commands, timeout=None):
+        """
+        Send several commands without waiting in between, then wait for all of them.
+
+        Args:
+            commands (list): (method, params) pairs
+            timeout (float): Seconds to wait for the last response
+
+        Returns:
+            list: The result of each command, in order
+        """
+        ids = []
+        with self.send_lock:
+            for method, params in commands:
+                command_id = next(self.ids)
+                ids.append(command_id)
+                try:
+                    self.ws.send(json.dumps({'id': command_id, 'method': method, 'params': params or {}}))
+                except Exception as e:
+                    raise CDPError(f"Could not send {method}: {str(e)}")
+        deadline = time.time() + (timeout or self.timeout)
+        results = []
+        with self.condition:
+            for command_id, (method, _) in zip(ids, commands):
+                while command_id not in self.responses:
+                    remaining = deadline - time.time()
+                    if self.closed or remaining <= 0:
+                        raise CDPError(f"{method}: {'connection closed' if self.closed else 'timed out'}")
+                    self.condition.wait(remaining)
+                response = self.responses.pop(command_id)
+                if 'error' in response:
+                    raise CDPError(f"{method}: {response['error'].get('message')}")
+                results.append(response.get('result', {}))
+        return results
+
+    def send(self, method, params=None, timeout=None):
+        return self.batch([(method, params)], timeout)[0]
+
+    def clear_events(self):
+        with self.condition:
+            self.events.clear()
+
+    def wait_for_event(self, method, predicate=None, timeout=None):
+        """Return the params of the first matching event, or None on timeout."""
+        deadline = time.time() + (timeout or self.timeout)
+        with self.condition:
+            while True:
+                for i, event in enumerate(self.events):
+                    if event.get('method') == method and (predicate is None or predicate(event.get('params', {}))):
+                        del self.events[:i + 1]
+                        return event.get('params', {})
+                remaining = deadline - time.time()
+                if self.closed or remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def close(self):
+        self.closed = True
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+def session_for_driver(driver):
+    """
+    Return a CDPSession attached to the driver's current tab, reusing it per tab.
+
+    Returns:
+        CDPSession: or None when the browser exposes no DevTools endpoint
+    """
+    sessions = driver.__dict__.setdefault('_cdp_sessions', {})
+    handle = driver.current_window_handle
+    session = sessions.get(handle)
+    if session is not None and not session.closed:
+        return session
+
+    address = driver.capabilities.get('goog:chromeOptions', {}).get('debuggerAddress')
+    if not address:
+        return None
+    with urllib.request.urlopen(f"http://{address}/json/list", timeout=CDP_SETTINGS['command_timeout']) as response:
+        targets = [target for target in json.load(response) if target.get('type') == 'page']
+    # chromedriver names windows after their target id
+    target = next((t for t in targets if t['id'] == handle), None)
+    if target is None:
+        return None
+    session = CDPSession(target['webSocketDebuggerUrl'])
+    session.batch([
+        ('Page.enable', {}),
+        ('Page.setLifecycleEventsEnabled', {'enabled': True}),
+        ('DOM.enable', {}),
+    ])
+    sessions[handle] = session
+    return session
+
+
+def navigate(session, url, timeout=None):
+    """
+    Navigate and wait for CDP_SETTINGS['ready_event'] of the new document,
+    instead of a fixed sleep. A page that never gets there is used as it is.
+    """
+    session.clear_events()
+    result = session.send('Page.navigate', {'url': url})
+    if result.get('errorText'):
+        raise CDPError(f"Navigation to {url} failed: {result['errorText']}")
+    frame_id, loader_id = result.get('frameId'), result.get('loaderId')
+    event = session.wait_for_event(
+        'Page.lifecycleEvent',
+        lambda params: params.get('name') == CDP_SETTINGS['ready_event'] and params.get('frameId') == frame_id
+        and (loader_id is None or params.get('loaderId') == loader_id),
+        timeout or TIMEOUT_SETTINGS['page_load']
+    )
+    if event is None:
+        print(f"No '{CDP_SETTINGS['ready_event']}' event for {url}, capturing the page as it is")  # Debug print
+
+
+# The adaptive scroll of selenium_utils in one in-page async function: wait for
+# listing nodes, then scroll until neither the height nor the node count grows,
+# each step resolving once DOM mutations have been quiet for settleMs.
+_SCROLL_FUNCTION = """
+async (selector, waitMs, maxScrolls, maxItems, maxTimeMs, idleMs, settleMs, idleLimit) => {
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+    const snapshot = () => ({
+        height: document.body ? document.body.scrollHeight : 0,
+        items: document.querySelectorAll(selector).length
+    });
+    const step = () => new Promise(resolve => {
+        let timer = null;
+        const observer = new MutationObserver(() => {
+            clearTimeout(timer);
+            timer = setTimeout(finish, settleMs);
+        });
+        function finish() {
+            observer.disconnect();
+            resolve(snapshot());
+        }
+        observer.observe(document.body, {childList: true, subtree: true});
+        timer = setTimeout(finish, idleMs);
+        window.scrollTo(0, document.body.scrollHeight);
+    });
+    const start = Date.now();
+    while (!document.querySelector(selector) && Date.now() - start < waitMs) await sleep(100);
+    let previous = snapshot();
+    let idle = 0;
+    const report = [];
+    while (report.length < maxScrolls && idle < idleLimit) {
+        if (previous.items >= maxItems || Date.now() - start > maxTimeMs) break;
+        const current = await step();
+        const newItems = current.items - previous.items;
+        idle = (current.height > previous.height || newItems > 0) ? 0 : idle + 1;
+        report.push({height: current.height, items: current.items, new_items: newItems});
+        previous = current;
+    }
+    window.scrollTo(0, 0);
+    return report;
+}
+"""
+
+
+def capture_html(session, listing_selector=LISTING_NODE_SELECTOR):
+    """
+    Scroll the loaded page until it stops growing and return its HTML.
+
+    The scroll loop is one awaited evaluation, and the document and its outer
+    HTML are fetched right after it: three round trips for the whole capture.
+
+    Returns:
+        tuple: (html, scroll_report) with the report shaped like adaptive_scroll's
+    """
+    arguments = [
+        listing_selector,
+        CDP_SETTINGS['content_wait'] * 1000,
+        SCROLL_SETTINGS['max_scrolls'],
+        SCROLL_SETTINGS['max_items'],
+        SCROLL_SETTINGS['max_time'] * 1000,
+        SCROLL_SETTINGS['idle_ms'],
+        SCROLL_SETTINGS['settle_ms'],
+        NUMBER_SCROLL,
+    ]
+    expression = f"({_SCROLL_FUNCTION})(...{json.dumps(arguments)})"
+    evaluation = session.send('Runtime.evaluate', {
+        'expression': expression,
+        'awaitPromise': True,
+        'returnByValue': True
+    }, timeout=SCROLL_SETTINGS['max_time'] + CDP_SETTINGS['content_wait'] + TIMEOUT_SETTINGS['script'])
+    if 'exceptionDetails' in evaluation:
+        raise CDPError(f"Scroll script failed: {evaluation['exceptionDetails'].get('text')}")
+    report = evaluation.get('result', {}).get('value') or []
+
+    root = session.send('DOM.getDocument', {'depth': 0})['root']
+    html = session.send('DOM.getOuterHTML', {'nodeId': root['nodeId']})['outerHTML']
+    items = report[-1]['items'] if report else 0
+    print(f"CDP capture: {len(report)} scrolls, {items} listing nodes, {len(html)} characters")  # Debug print
+    return html, report
@@ -0,0 +1,244 @@
+"""
+Change detection for scheduled re-crawls.
+
+Every scraped URL gets a fingerprint made of a simhash of the normalised
+markdown and a digest of its numbers. The fingerprint is stored next to the
+listings extracted last time, so an unchanged page can reuse them instead of
+going through format_data again, and a changed page only reports what differs
+from the previous crawl.
+
+Only the content decides. By the time a page is fingerprinted it has already
+been fetched and converted, so an ETag/Last-Modified check would save nothing,
+and it would hide changes on pages rendered by JavaScript, whose HTML shell
+keeps the same validators while the listings change.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+from assets import FINGERPRINT_STORE_PATH, SIMHASH_MAX_DISTANCE
+from utils import extract_listings
+
+# Tokens that change on every request without the catalogue changing
+_VOLATILE_PATTERNS = [
+    re.compile(r'\b\d{4}-\d{2}-\d{2}(?:t[\d:.]+z?)?\b'),        # ISO dates/timestamps
+    re.compile(r'\b\d{1,2}:\d{2}(?::\d{2})?\b'),                # clock times
+    re.compile(r'[?&](?:sid|session\w*|token|csrf\w*)=[^\s)&]*'),  # session params in links
+]
+_WORD_RE = re.compile(r'\w+')
+_NUMBER_RE = re.compile(r'\d+(?:[.,\s]\d+)*')
+
+
+def normalise_text(markdown):
+    """Lower-case the markdown, drop volatile tokens and collapse whitespace."""
+    text = markdown.lower()
+    for pattern in _VOLATILE_PATTERNS:
+        text = pattern.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def simhash(text, bits=64):
+    """64-bit simhash over word 3-shingles of already normalised text."""
+    words = _WORD_RE.findall(text)
+    if not words:
+        return 0
+    shingles = Counter(' '.join(words[i:i + 3]) for i in range(max(1, len(words) - 2)))
+    weights = [0] * bits
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(bits):
+            weights[bit] += count if (value >> bit) & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def compute_fingerprint(markdown):
+    """
+    Build the fingerprint of a page from its markdown.
+
+    The numbers digest guards against simhash tolerance hiding a price change:
+    two pages only count as unchanged when every number on them is identical.
+    """
+    text = normalise_text(markdown)
+    numbers = ' '.join(_NUMBER_RE.findall(text))
+    return {
+        'simhash': simhash(text),
+        'numbers_digest': hashlib.sha1(numbers.encode('utf-8')).hexdigest()
+    }
+
+
+def fingerprints_match(previous, current):
+    """Compare two fingerprints: identical numbers and a near-identical simhash."""
+    if previous.get('numbers_digest') != current.get('numbers_digest'):
+        return False
+    return hamming_distance(previous.get('simhash', 0), current['simhash']) <= SIMHASH_MAX_DISTANCE
+
+
+def _price_fields(fields):
+    return [field for field in fields if 'price' in field.lower()]
+
+
+def _listing_key(listing, fields):
+    key_fields = [field for field in fields if field not in _price_fields(fields)] or fields
+    return tuple(str(listing.get(field, '')).strip().lower() for field in key_fields)
+
+
+def _group_by_key(listings, fields):
+    groups = {}
+    for listing in listings:
+        groups.setdefault(_listing_key(listing, fields), []).append(listing)
+    return groups
+
+
+def diff_listings(previous, current, fields):
+    """
+    Compare two listing lists and return only what changed.
+
+    Listings are matched on all their non-price fields. Listings sharing
+    those (variants, one product from several sellers) are kept apart:
+    identical ones pair up first, the rest in page order, and any left over
+    count as new or removed.
+    """
+    previous_by_key = _group_by_key(previous, fields)
+    current_by_key = _group_by_key(current, fields)
+
+    diff = {'new': [], 'removed': [], 'price_changed': []}
+    for key, listings in current_by_key.items():
+        old_listings = list(previous_by_key.get(key, []))
+        unmatched = []
+        for listing in listings:
+            if listing in old_listings:
+                old_listings.remove(listing)
+            else:
+                unmatched.append(listing)
+        for listing in unmatched:
+            if not old_listings:
+                diff['new'].append(listing)
+                continue
+            old = old_listings.pop(0)
+            changes = {field: {'old': old.get(field, ''), 'new': listing.get(field, '')}
+                       for field in _price_fields(fields) if old.get(field, '') != listing.get(field, '')}
+            if changes:
+                diff['price_changed'].append({'listing': listing, 'changes': changes})
+        diff['removed'].extend(old_listings)
+    for key, listings in previous_by_key.items():
+        if key not in current_by_key:
+            diff['removed'].extend(listings)
+    return diff
+
+
+class FingerprintStore:
+    """
+    Persistent per-URL fingerprints and last extracted listings.
+
+    Shared by the batch scraper's worker threads, so every method holds the lock.
+    """
+
+    def __init__(self, path=FINGERPRINT_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.checked = 0
+        self.unchanged = 0
+        self.diff_totals = {'new': 0, 'removed': 0, 'price_changed': 0}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Could not read fingerprint store {path}: {str(e)}")
+
+    @staticmethod
+    def _key(url, fields):
+        # Listings extracted for other fields can't be reused
+        return f"{url}#{'|'.join(fields)}"
+
+    def lookup(self, url, fields, fingerprint):
+        """Return the previous listings if the page is unchanged, otherwise None."""
+        with self.lock:
+            self.checked += 1
+            entry = self.entries.get(self._key(url, fields))
+            if entry is None or not fingerprints_match(entry['fingerprint'], fingerprint):
+                return None
+            self.unchanged += 1
+            return entry['listings']
+
+    def record(self, url, fields, fingerprint, listings):
+        """Store the new fingerprint and listings, returning the diff to the previous crawl."""
+        key = self._key(url, fields)
+        with self.lock:
+            previous = self.entries.get(key, {}).get('listings', [])
+            diff = diff_listings(previous, listings, fields)
+            for change, items in diff.items():
+                self.diff_totals[change] += len(items)
+            self.entries[key] = {'fingerprint': fingerprint, 'listings': listings}
+        return diff
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self.lock, open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+
+    def summary(self):
+        with self.lock:
+            return {
+                'pages_checked': self.checked,
+                'pages_unchanged': self.unchanged,
+                'hit_rate': self.unchanged / self.checked if self.checked else 0.0,
+                **self.diff_totals
+            }
+
+
+def reuse_unchanged(fingerprint_store, page, fields):
+    """
+    The last crawl's listings as a finished extraction if the page is unchanged.
+
+    Returns:
+        tuple: (formatted_data, token_counts, diff) like extract_or_reuse, or
+        None when the page has to be extracted
+    """
+    fingerprint = page.fingerprint()
+    previous_listings = fingerprint_store.lookup(page.url, fields, fingerprint)
+    if previous_listings is None:
+        return None
+    print(f"Page unchanged since last crawl, reusing {len(previous_listings)} listings: {page.url}")
+    no_changes = {'new': [], 'removed': [], 'price_changed': []}
+    return {'listings': previous_listings}, {'input_tokens': 0, 'output_tokens': 0}, no_changes
+
+
+def record_extraction(fingerprint_store, page, fields, formatted_data):
+    """Store a fresh extraction of the page and return its diff to the last crawl."""
+    return fingerprint_store.record(page.url, fields, page.fingerprint(), extract_listings(formatted_data))
+
+
+def extract_or_reuse(fingerprint_store, page, fields, extract):
+    """
+    Run extract() unless the page is unchanged since the last crawl.
+
+    Args:
+        fingerprint_store (FingerprintStore): Store to consult, or None to always extract
+        page (PageSnapshot): The page, whose memoised fingerprint is used
+        fields (list): Fields being extracted
+        extract (callable): Returns (formatted_data, token_counts) when called
+
+    Returns:
+        tuple: (formatted_data, token_counts, diff) where diff is None when the
+        store is disabled and empty lists when the page is unchanged
+    """
+    if fingerprint_store is None:
+        formatted_data, token_counts = extract()
+        return formatted_data, token_counts, None
+
+    reused = reuse_unchanged(fingerprint_store, page, fields)
+    if reused is not None:
+        return reused
+
+    formatted_data, token_counts = extract()
+    return formatted_data, token_counts, record_extraction(fingerprint_store, page, fields, formatted_data)
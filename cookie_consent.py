@@ -0,0 +1,112 @@
+"""
+Per-domain cookie consent memory.
+
+Remembers for every domain which consent selector worked (or that no banner
+showed up) and the cookies the click set, so later pages and fresh drivers
+can set the consent cookies up front and skip banner detection entirely.
+"""
+
+import json
+import os
+import time
+from urllib.parse import urlparse
+
+from assets import CONSENT_STORE_PATH, CONSENT_SETTINGS
+
+# Checks every candidate selector in one pass and clicks the first visible
+# match. If none is there yet, keeps checking on DOM mutations until timeoutMs
+# so banners injected after load are still caught. Resolves to the index of
+# the selector that was clicked, or null.
+FIND_AND_CLICK_SCRIPT = """
+const [selectors, timeoutMs, done] = arguments;
+const candidates = (selector) => {
+    switch (selector.type) {
+        case 'id': return [document.getElementById(selector.value)];
+        case 'class': return Array.from(document.getElementsByClassName(selector.value));
+        case 'css': return Array.from(document.querySelectorAll(selector.value));
+        case 'xpath': {
+            const result = document.evaluate(selector.value, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            return Array.from({length: result.snapshotLength}, (_, i) => result.snapshotItem(i));
+        }
+        default: return [];
+    }
+};
+const clickFirstVisible = () => {
+    for (let i = 0; i < selectors.length; i++) {
+        const element = candidates(selectors[i]).find(el => el && el.getClientRects().length > 0 && !el.disabled);
+        if (element) {
+            element.click();
+            return i;
+        }
+    }
+    return null;
+};
+const clicked = clickFirstVisible();
+if (clicked !== null) {
+    done(clicked);
+} else {
+    let timer = null;
+    const observer = new MutationObserver(() => {
+        const index = clickFirstVisible();
+        if (index !== null) finish(index);
+    });
+    const finish = (index) => {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(index);
+    };
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+    timer = setTimeout(() => finish(null), timeoutMs);
+}
+"""
+
+
+def domain_of(url):
+    return urlparse(url).netloc
+
+
+class ConsentMemory:
+    """Persistent per-domain record of how cookie consent was handled."""
+
+    def __init__(self, path=CONSENT_STORE_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Could not read consent store {path}: {str(e)}")
+
+    def get(self, domain):
+        """
+        Return the entry for a domain, or None if it needs probing.
+
+        A 'no banner' result expires after CONSENT_SETTINGS['no_banner_ttl'],
+        since the banner may only have been missing because consent was
+        already given in that browser.
+        """
+        entry = self.entries.get(domain)
+        if entry and entry['selector'] is None and time.time() - entry['checked_at'] > CONSENT_SETTINGS['no_banner_ttl']:
+            return None
+        return entry
+
+    def record(self, domain, selector, cookies=None):
+        self.entries[domain] = {
+            'selector': selector,
+            'cookies': cookies or [],
+            'checked_at': time.time()
+        }
+        self.save()
+
+    def forget(self, domain):
+        if self.entries.pop(domain, None) is not None:
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=4)
+
+
+consent_memory = ConsentMemory()
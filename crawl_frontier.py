@@ -0,0 +1,259 @@
+"""
+Crawl frontier: URL normalisation, compact seen-set and per-host politeness.
+
+URLs are normalised before deduplication, so the same page reached through a
+different query order, a fragment or tracking parameters is crawled once. The
+seen-set keeps 64-bit fingerprints in a sorted array, about 8 bytes per URL,
+and is saved to FRONTIER_SETTINGS['seen_path'] when one is set, so later runs
+skip pages crawled before. Fetches are scheduled per host within a crawl
+delay and a concurrency budget.
+"""
+
+import bisect
+import hashlib
+import heapq
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from assets import FRONTIER_SETTINGS
+
+
+def normalize_url(url):
+    """
+    Canonical form of a URL for deduplication.
+
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    parameters, sorts the query and gives an empty path a '/'.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+    tracking = FRONTIER_SETTINGS['tracking_params']
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in tracking and not name.lower().startswith(FRONTIER_SETTINGS['tracking_prefixes'])
+    )
+    fragment = '' if FRONTIER_SETTINGS['drop_fragments'] else parts.fragment
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), fragment))
+
+
+def host_of(url):
+    """Host a URL is fetched from, the unit of politeness and sharding."""
+    return (urlsplit(url).hostname or '').lower()
+
+
+def url_fingerprint(url):
+    """64-bit fingerprint of a normalised URL."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class SeenSet:
+    """
+    Set of normalised URLs stored as 64-bit fingerprints.
+
+    New fingerprints go into a small Python set and are merged into a sorted
+    array('Q') once it grows past merge_threshold, so memory stays near 8
+    bytes per URL and lookups are a set probe plus a binary search.
+
+    Args:
+        path (str): Optional file the fingerprints are loaded from and saved to
+        merge_threshold (int): Pending fingerprints kept before merging
+    """
+
+    def __init__(self, path=None, merge_threshold=None):
+        self.path = path
+        self.merge_threshold = merge_threshold or FRONTIER_SETTINGS['seen_merge_threshold']
+        self.sorted = array('Q')
+        self.pending = set()
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                self.sorted.frombytes(f.read())
+
+    def _contains(self, fingerprint):
+        if fingerprint in self.pending:
+            return True
+        i = bisect.bisect_left(self.sorted, fingerprint)
+        return i < len(self.sorted) and self.sorted[i] == fingerprint
+
+    def __contains__(self, url):
+        with self.lock:
+            return self._contains(url_fingerprint(normalize_url(url)))
+
+    def add(self, url):
+        """Add a URL; returns False if it (or an equivalent URL) was already seen."""
+        fingerprint = url_fingerprint(normalize_url(url))
+        with self.lock:
+            if self._contains(fingerprint):
+                return False
+            self.pending.add(fingerprint)
+            if len(self.pending) >= self.merge_threshold:
+                self._merge()
+            return True
+
+    def _merge(self):
+        if self.pending:
+            self.sorted = array('Q', heapq.merge(self.sorted, sorted(self.pending)))
+            self.pending.clear()
+
+    def __len__(self):
+        return len(self.sorted) + len(self.pending)
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            self._merge()
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'wb') as f:
+                self.sorted.tofile(f)
+
+
+class HostPoliteness:
+    """
+    Per-host crawl delay and concurrency budget.
+
+    Not locked itself; callers hold their own lock around it.
+    """
+
+    def __init__(self, crawl_delay=None, max_per_host=None, overrides=None):
+        self.crawl_delay = crawl_delay if crawl_delay is not None else FRONTIER_SETTINGS['crawl_delay']
+        self.max_per_host = max_per_host or FRONTIER_SETTINGS['max_per_host']
+        self.overrides = dict(FRONTIER_SETTINGS['crawl_delay_overrides'], **(overrides or {}))
+        self.next_allowed = {}
+        self.in_flight = {}
+
+    def delay_for(self, host):
+        return self.overrides.get(host, self.crawl_delay)
+
+    def set_crawl_delay(self, host, seconds):
+        """Use a host-specific delay, e.g. from its robots.txt Crawl-delay."""
+        self.overrides[host] = seconds
+
+    def wait_time(self, host, now=None):
+        """Seconds until a fetch from host may start; None while its concurrency budget is used up."""
+        if self.in_flight.get(host, 0) >= self.max_per_host:
+            return None
+        now = now if now is not None else time.monotonic()
+        return max(0.0, self.next_allowed.get(host, 0.0) - now)
+
+    def start(self, host):
+        self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        self.next_allowed[host] = time.monotonic() + self.delay_for(host)
+
+    def finish(self, host):
+        self.in_flight[host] = max(0, self.in_flight.get(host, 0) - 1)
+
+
+class CrawlFrontier:
+    """
+    URLs waiting to be crawled, served per host with politeness.
+
+    Args:
+        seen_path (str): Optional file to persist the seen-set to
+        politeness (HostPoliteness): Per-host crawl delay and concurrency budget
+    """
+
+    def __init__(self, seen_path=None, politeness=None):
+        self.seen = SeenSet(seen_path)
+        self.politeness = politeness or HostPoliteness()
+        self.host_queues = {}
+        self.ready_hosts = []  # heap of (ready_at, host)
+        self.scheduled = set()
+        self.condition = threading.Condition()
+
+    def add(self, url, force=False):
+        """
+        Queue a URL if it is new. The URL is fetched as given; only the
+        duplicate check uses its normalised form.
+
+        Args:
+            force (bool): Queue it even if it was seen, e.g. a seed URL the
+                persisted seen-set holds from an earlier run
+
+        Returns:
+            bool: True if queued, False if already seen
+        """
+        if not self.seen.add(url) and not force:
+            return False
+        host = host_of(url)
+        with self.condition:
+            self.host_queues.setdefault(host, deque()).append(url)
+            self._schedule(host)
+            self.condition.notify()
+        return True
+
+    def _schedule(self, host, ready_at=None):
+        if host not in self.scheduled and self.host_queues.get(host):
+            heapq.heappush(self.ready_hosts, (ready_at if ready_at is not None else time.monotonic(), host))
+            self.scheduled.add(host)
+
+    def next(self, timeout=FRONTIER_SETTINGS['next_timeout']):
+        """
+        Return the next URL whose host may be fetched now, waiting up to timeout.
+
+        The caller must call done(url) once the fetch has finished; a host at
+        its concurrency budget waits for that, so timeout=None can block for
+        good if it never comes.
+
+        Returns:
+            str: The URL, or None when nothing is queued or timeout ran out
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                wait = None
+                while self.ready_hosts and self.ready_hosts[0][0] <= now:
+                    _, host = heapq.heappop(self.ready_hosts)
+                    self.scheduled.discard(host)
+                    host_wait = self.politeness.wait_time(host, now)
+                    if host_wait is None:
+                        continue  # rescheduled by done() when a slot frees up
+                    if host_wait > 0:
+                        self._schedule(host, now + host_wait)
+                        continue
+                    url = self.host_queues[host].popleft()
+                    self.politeness.start(host)
+                    if self.host_queues[host]:
+                        self._schedule(host, now + self.politeness.delay_for(host))
+                    return url
+                if self.ready_hosts:
+                    wait = self.ready_hosts[0][0] - now
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                elif wait is None and not self.pending():
+                    return None
+                self.condition.wait(wait)
+
+    def done(self, url):
+        host = host_of(url)
+        with self.condition:
+            self.politeness.finish(host)
+            self._schedule(host, time.monotonic() + (self.politeness.wait_time(host) or 0.0))
+            self.condition.notify_all()
+
+    def pending(self):
+        """Number of queued URLs on this node."""
+        return sum(len(urls) for urls in self.host_queues.values())
+
+    def stats(self):
+        with self.condition:
+            return {
+                'seen': len(self.seen),
+                'queued': self.pending(),
+                'hosts': sum(1 for urls in self.host_queues.values() if urls)
+            }
+
+    def save(self):
+        self.seen.save()
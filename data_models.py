@@ -1,13 +1,23 @@
-from typing import List, Type
+from functools import lru_cache
+from typing import List, Tuple, Type
 from pydantic import BaseModel, create_model
 
+from assets import SCHEMA_CACHE_SIZE
+
 def create_dynamic_listing_model(field_names: List[str]) -> Type[BaseModel]:
-    field_definitions = {field: (str, ...) for field in field_names}
-    return create_model('DynamicListingModel', **field_definitions)
+    return get_listing_schema(field_names).listing_model
 
+@lru_cache(maxsize=SCHEMA_CACHE_SIZE)
 def create_listings_container_model(listing_model: Type[BaseModel]) -> Type[BaseModel]:
     return create_model('DynamicListingsContainer', listings=(List[listing_model], ...))
 
+@lru_cache(maxsize=SCHEMA_CACHE_SIZE)
+def create_packed_container_model(listing_model: Type[BaseModel]) -> Type[BaseModel]:
+    """Answer to a packed request: the listings of every page, under its page id."""
+    page_model = create_model('PageListings', page_id=(str, ...), listings=(List[listing_model], ...))
+    return create_model('PackedListingsContainer', pages=(List[page_model], ...))
+
+@lru_cache(maxsize=SCHEMA_CACHE_SIZE)
 def generate_system_message(listing_model: BaseModel) -> str:
     schema_info = listing_model.model_json_schema()
     field_descriptions = []
@@ -46,3 +56,31 @@ Example of correct response format:
 }}"""
 
     return system_message
+
+class ListingSchema:
+    """
+    Models, JSON schema, response format and system prompt for one ordered field list.
+
+    Built once per field tuple and shared by every page, so prompts stay
+    byte-identical between requests and provider-side prompt caching can hit.
+    """
+
+    def __init__(self, fields: Tuple[str, ...]):
+        self.fields = fields
+        self.listing_model = create_model('DynamicListingModel', **{field: (str, ...) for field in fields})
+        self.container_model = create_listings_container_model(self.listing_model)
+        self.json_schema = self.container_model.model_json_schema()
+        self.system_message = generate_system_message(self.listing_model)
+        # Structured output for raw OpenAI-compatible chat completions (Batch API)
+        self.response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": "DynamicListingsContainer", "schema": self.json_schema}
+        }
+
+@lru_cache(maxsize=SCHEMA_CACHE_SIZE)
+def _schema_for_fields(fields: Tuple[str, ...]) -> ListingSchema:
+    return ListingSchema(fields)
+
+def get_listing_schema(field_names: List[str]) -> ListingSchema:
+    """Return the cached ListingSchema for these fields, in the given order."""
+    return _schema_for_fields(tuple(field_names))
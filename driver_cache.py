@@ -0,0 +1,183 @@
+"""
+Offline chromedriver resolution and reusable Chrome profiles.
+
+ChromeDriverManager().install() looks up versions, and may download, every
+time a driver is created. resolve_chromedriver() does it once per process: it
+takes an explicit or CHROME_DRIVER path, then the driver recorded for the
+installed Chrome's major version in a local manifest, then a chromedriver on
+PATH with a matching version. Only if all of those fail and offline mode is
+off does it download through webdriver-manager, and it records the result so
+the next process doesn't have to. Windows .exe drivers, like the
+chromedriver-win64 folder, are skipped on other platforms.
+
+Every browser also gets its own copy of a profile template that Chrome has
+already initialised once, so first-run work is not redone on each cold start.
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from functools import lru_cache
+
+from assets import DRIVER_CACHE_SETTINGS
+
+_VERSION_RE = re.compile(r'\d+\.\d+\.\d+\.\d+')
+_CHROME_NAMES = ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome']
+_CHROME_PATHS = [
+    '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+    r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+    r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe',
+]
+
+_resolved_driver = None
+_resolve_lock = threading.Lock()
+
+
+def _usable(path):
+    if not path or not os.path.isfile(path) or not os.access(path, os.X_OK):
+        return False
+    return os.name == 'nt' or not path.lower().endswith('.exe')
+
+
+def binary_version(path):
+    """Version reported by `path --version`, e.g. '126.0.6478.126', or None."""
+    try:
+        output = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=15).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = _VERSION_RE.search(output)
+    return match.group(0) if match else None
+
+
+def find_chrome():
+    """Path of the installed Chrome or Chromium binary, or None."""
+    candidates = [DRIVER_CACHE_SETTINGS['chrome_binary'], os.environ.get('CHROME_BIN')]
+    candidates += [shutil.which(name) for name in _CHROME_NAMES] + _CHROME_PATHS
+    for path in candidates:
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+@lru_cache(maxsize=1)
+def chrome_version():
+    """Version of the installed Chrome, looked up once per process."""
+    chrome = find_chrome()
+    return binary_version(chrome) if chrome else None
+
+
+def _load_manifest():
+    try:
+        with open(DRIVER_CACHE_SETTINGS['manifest_path'], 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _record(major, path, version):
+    manifest = _load_manifest()
+    manifest[major or 'any'] = {'path': os.path.abspath(path), 'version': version}
+    os.makedirs(os.path.dirname(DRIVER_CACHE_SETTINGS['manifest_path']) or '.', exist_ok=True)
+    with open(DRIVER_CACHE_SETTINGS['manifest_path'], 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+
+
+def _matches(version, major, pinned):
+    if pinned:
+        return version == pinned
+    return major is None or (version or '').split('.')[0] == major
+
+
+def resolve_chromedriver():
+    """
+    Path of a chromedriver for the installed Chrome, resolved once per process.
+
+    Raises:
+        RuntimeError: In offline mode when no cached or local driver fits
+    """
+    global _resolved_driver
+    with _resolve_lock:
+        if _usable(_resolved_driver):
+            return _resolved_driver
+
+        pinned = DRIVER_CACHE_SETTINGS['pinned_version']
+        installed = chrome_version()
+        major = pinned.split('.')[0] if pinned else (installed.split('.')[0] if installed else None)
+
+        path = None
+        for explicit in (DRIVER_CACHE_SETTINGS['driver_path'], os.environ.get('CHROME_DRIVER')):
+            if _usable(explicit):
+                path = explicit
+                break
+        if path is None:
+            entry = _load_manifest().get(major or 'any')
+            if entry and _usable(entry['path']) and _matches(entry['version'], major, pinned):
+                path = entry['path']
+        if path is None:
+            on_path = shutil.which('chromedriver')
+            if _usable(on_path):
+                version = binary_version(on_path)
+                if _matches(version, major, pinned):
+                    _record(major, on_path, version)
+                    path = on_path
+        if path is None:
+            if DRIVER_CACHE_SETTINGS['offline']:
+                raise RuntimeError(
+                    f"No cached chromedriver for Chrome {installed or 'unknown'} and offline mode is on. "
+                    f"Set DRIVER_CACHE_SETTINGS['driver_path'] or put a matching chromedriver on PATH."
+                )
+            from webdriver_manager.chrome import ChromeDriverManager
+            path = ChromeDriverManager(driver_version=pinned).install() if pinned else ChromeDriverManager().install()
+            _record(major, path, binary_version(path))
+
+        print(f"Using chromedriver {path} for Chrome {installed or 'unknown'}")  # Debug print
+        _resolved_driver = path
+        return path
+
+
+def profile_template_ready():
+    """Whether the template exists and was made by the Chrome installed now."""
+    marker = os.path.join(DRIVER_CACHE_SETTINGS['profile_template'], DRIVER_CACHE_SETTINGS['template_marker'])
+    try:
+        with open(marker, 'r', encoding='utf-8') as f:
+            return f.read().strip() == (chrome_version() or '')
+    except OSError:
+        return False
+
+
+def finish_profile_template():
+    """Strip per-run state from the freshly initialised template and mark it ready."""
+    template = DRIVER_CACHE_SETTINGS['profile_template']
+    for name in DRIVER_CACHE_SETTINGS['profile_skip']:
+        path = os.path.join(template, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path):
+            os.remove(path)
+    with open(os.path.join(template, DRIVER_CACHE_SETTINGS['template_marker']), 'w', encoding='utf-8') as f:
+        f.write(chrome_version() or '')
+
+
+def new_profile_dir():
+    """
+    A fresh user-data-dir for one browser, copied from the template if it is ready.
+
+    Returns:
+        str: Directory to pass as --user-data-dir; remove it with release_profile_dir
+    """
+    os.makedirs(DRIVER_CACHE_SETTINGS['profile_root'], exist_ok=True)
+    path = tempfile.mkdtemp(prefix='profile_', dir=DRIVER_CACHE_SETTINGS['profile_root'])
+    if profile_template_ready():
+        shutil.copytree(
+            DRIVER_CACHE_SETTINGS['profile_template'], path, dirs_exist_ok=True,
+            ignore=shutil.ignore_patterns(*DRIVER_CACHE_SETTINGS['profile_skip'])
+        )
+    return os.path.abspath(path)
+
+
+def release_profile_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
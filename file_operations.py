@@ -45,3 +45,28 @@ def save_formatted_data(formatted_data, output_folder: str, json_file_name: str,
     except Exception as e:
         print(f"Error creating DataFrame or saving Excel: {str(e)}")
         return None
+
+class StreamedListingWriter:
+    """
+    Append listings to a JSON Lines file as the model streams them.
+
+    Pass an instance as format_data's on_listing callback. Every listing is
+    on disk as soon as it arrives, so a timed-out answer still leaves its
+    completed listings behind.
+    """
+
+    def __init__(self, output_folder: str, file_name: str):
+        os.makedirs(output_folder, exist_ok=True)
+        self.path = os.path.join(output_folder, file_name)
+        self.count = 0
+
+    def __call__(self, listing):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(listing) + "\n")
+        self.count += 1
+
+    def reset(self):
+        """Discard what was written so far, when the answer is thrown away and retried."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.count = 0
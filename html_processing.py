@@ -1,6 +1,14 @@
 import re
+import os
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from bs4 import BeautifulSoup
 import html2text
+from assets import MARKDOWN_POOL_SETTINGS, SEGMENTATION_SETTINGS
+from listing_segmentation import segment_listings
 
 def clean_html(html_content):
     soup = BeautifulSoup(html_content, 'html.parser')
@@ -59,8 +67,85 @@ def clean_html(html_content):
     return str(soup)
 
 def html_to_markdown_with_readability(html_content):
+    if SEGMENTATION_SETTINGS["enabled"]:
+        # Only the repeated listing blocks go on to the converter and the model
+        html_content = segment_listings(html_content)
     cleaned_html = clean_html(html_content)  
     markdown_converter = html2text.HTML2Text()
     markdown_converter.ignore_links = False
     markdown_content = markdown_converter.handle(cleaned_html)
     return markdown_content
+
+class MarkdownConversionPool:
+    """
+    Runs html_to_markdown_with_readability in worker processes.
+
+    BeautifulSoup and html2text are pure Python and hold the GIL, so converting
+    inline stalls page fetches and other Streamlit sessions. Inputs and outputs
+    are plain strings, and at most max_pending conversions are queued at once:
+    submit() blocks once that many are in flight, which keeps memory bounded
+    when pages are fetched faster than they can be converted.
+
+    The pool only pays off when the caller has other work to do while a page
+    converts (see PageSnapshot.start_conversion); a caller that would wait for
+    the result straight away converts inline instead and saves the pickling
+    and process hop.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or MARKDOWN_POOL_SETTINGS["max_workers"] or os.cpu_count() or 1
+        self.max_pending = max_pending or MARKDOWN_POOL_SETTINGS["max_pending"]
+        # Spawned workers don't inherit Streamlit's or Selenium's threads
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.broken = False
+
+    def submit(self, html_content):
+        """
+        Queue a conversion and return a Future resolving to the markdown.
+
+        Raises:
+            BrokenProcessPool: If a worker has died; get_conversion_pool() then starts a new pool
+        """
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(html_to_markdown_with_readability, html_content)
+        except BrokenProcessPool:
+            self.slots.release()
+            self.broken = True
+            raise
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def result(self, future, html_content):
+        """Wait for a submitted conversion, converting inline if the pool died meanwhile."""
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            print("Markdown conversion pool is broken, converting inline")
+            self.broken = True
+            return html_to_markdown_with_readability(html_content)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+_conversion_pool = None
+_conversion_pool_lock = threading.Lock()
+
+def get_conversion_pool():
+    """Return the process-wide conversion pool, creating it on first use."""
+    global _conversion_pool
+    with _conversion_pool_lock:
+        if _conversion_pool is not None and _conversion_pool.broken:
+            _conversion_pool.shutdown()
+            _conversion_pool = None
+        if _conversion_pool is None:
+            _conversion_pool = MarkdownConversionPool()
+            atexit.register(_conversion_pool.shutdown)
+        return _conversion_pool
@@ -0,0 +1,263 @@
+"""
+Listing-region segmentation by structural similarity.
+
+clean_html recognises products only as an <h2> holding a link, which fits
+one shop, and the rest of the page still reaches the model. This finds the
+listing cards of any page from their structure instead. Every element gets
+a signature (its tag and class tokens with digits stripped) and a shape (the
+set of tag/class paths below it, SEGMENTATION_SETTINGS['depth'] levels
+deep). Elements with the same signature under the same kind of parent form
+a group, and sibling groups of one container whose common shapes are alike
+are merged, so a promoted card with an extra class stays with the others.
+Members whose shape overlaps the group's common shape by at least the
+similarity threshold are the repeated blocks. Groups score by their
+text outside links weighted by its share of their text, the richness of
+their common shape and how many blocks link to another page (too few and
+the group is no listing), so menus, footer link columns and filter lists
+lose to product cards; the best group's own
+repeated children replace it when they hold nearly all of its text, so a
+grid yields its cards rather than its rows. The region must also hold most
+of the page's text, not counting links outside it; otherwise it is a side strip, such as the
+recommendations on a product page, and the page is left whole.
+
+segment_listings() keeps only those blocks, each preceded by an ITEM_ID line
+derived from its link (or its text) so the id is stable across crawls, plus
+the page title and pagination controls so pagination detection still works.
+Pages without a region are returned unchanged.
+"""
+
+import hashlib
+import math
+import re
+
+from bs4 import BeautifulSoup
+
+from assets import SEGMENTATION_SETTINGS
+
+_DIGITS = re.compile(r'\d+')
+_NOISE_TAGS = ['script', 'style', 'noscript', 'template', 'svg', 'iframe']
+
+
+def _signature(tag):
+    classes = sorted({_DIGITS.sub('', c) for c in tag.get('class', [])} - {''})
+    return tag.name + ''.join('.' + c for c in classes)
+
+
+def _shape(tag, depth):
+    """Tag/class paths below tag, down to depth levels."""
+    paths = set()
+    level = [(tag, '')]
+    for _ in range(depth):
+        next_level = []
+        for parent, prefix in level:
+            for child in parent.find_all(True, recursive=False):
+                path = prefix + '/' + _signature(child)
+                paths.add(path)
+                next_level.append((child, path))
+        level = next_level
+    return paths
+
+
+def _similarity(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _text_length(tag):
+    return len(tag.get_text(' ', strip=True))
+
+
+def _plain_text_length(tag, text_length):
+    """
+    Text outside links. A link wrapping a whole structured card counts as
+    plain text; a bare menu link does not.
+    """
+    plain = text_length
+    for link in ([tag] if tag.name == 'a' else tag.find_all('a')):
+        link_length = _text_length(link)
+        if link_length < 0.8 * text_length or link.find(True) is None:
+            plain -= link_length
+    return max(plain, 0)
+
+
+def _item_link(tag):
+    """
+    The first link to another page: in-page anchors, query-only links and
+    nofollow links are how filters and sort options link, not listings.
+    """
+    for link in ([tag] if tag.name == 'a' else tag.find_all('a', href=True)):
+        href = link.get('href', '')
+        if href and not href.startswith(('#', '?', 'javascript:')) and 'nofollow' not in link.get('rel', []):
+            return link
+    return None
+
+
+def _common_shape(shapes):
+    """Paths most of the shapes have: what a typical block looks like."""
+    counts = {}
+    for shape in shapes:
+        for path in shape:
+            counts[path] = counts.get(path, 0) + 1
+    return {path for path, count in counts.items() if count * 2 >= len(shapes)}
+
+
+def _merge_sibling_groups(groups, settings):
+    """
+    Merge groups of one container whose blocks share a tag and look alike,
+    e.g. "card" and "card card--promo". Members keep document order.
+    """
+    by_container = {}
+    for key, members in groups.items():
+        by_container.setdefault((key[0], key[1], members[0].name), []).append(members)
+    merged = []
+    for siblings in by_container.values():
+        siblings.sort(key=len, reverse=True)
+        clusters = []
+        for members in siblings:
+            common = _common_shape([_shape(member, settings['depth']) for member in members])
+            for cluster in clusters:
+                if _similarity(common, cluster[0]) >= settings['similarity']:
+                    cluster[1].extend(members)
+                    break
+            else:
+                clusters.append((common, list(members)))
+        merged.extend(cluster[1] for cluster in clusters)
+    return merged
+
+
+def _page_share(soup, items, text):
+    """
+    The items' text (text being its length) against it plus the page's text
+    outside the items and outside links, which menus and footers are made of.
+    """
+    item_ids = {id(item) for item in items}
+    outside = 0
+    for string in soup.find_all(string=True):
+        length = len(string.strip())
+        if not length or string.parent is None or string.parent.name in _NOISE_TAGS:
+            continue
+        ancestors = list(string.parents)
+        if any(id(ancestor) in item_ids for ancestor in ancestors):
+            continue
+        if not any(ancestor.name == 'a' for ancestor in ancestors):
+            outside += length
+    return text / (text + outside) if text + outside else 0.0
+
+
+def find_listing_items(soup, settings=None):
+    """
+    The repeated blocks of the page's dominant listing region.
+
+    Args:
+        soup (BeautifulSoup): Parsed page; script and style tags are ignored
+        settings (dict): Overrides for SEGMENTATION_SETTINGS
+
+    Returns:
+        list: Item tags in document order, empty when no region qualifies
+    """
+    settings = {**SEGMENTATION_SETTINGS, **(settings or {})}
+    groups = {}
+    for tag in soup.find_all(True):
+        parent = tag.parent
+        if parent is None or tag.name in _NOISE_TAGS:
+            continue
+        # Cards split over several rows of one grid share the grid as grandparent
+        key = (id(parent.parent), _signature(parent), _signature(tag))
+        groups.setdefault(key, []).append(tag)
+
+    order = {id(tag): i for i, tag in enumerate(soup.find_all(True))}
+    candidates = []
+    for members in _merge_sibling_groups(groups, settings):
+        if len(members) < settings['min_items']:
+            continue
+        members.sort(key=lambda member: order[id(member)])
+        shapes = [_shape(member, settings['depth']) for member in members]
+        common = _common_shape(shapes)
+        items = [member for member, shape in zip(members, shapes)
+                 if _similarity(shape, common) >= settings['similarity']
+                 and _text_length(member) >= settings['min_text']]
+        if len(items) >= settings['min_items']:
+            lengths = [_text_length(item) for item in items]
+            text = sum(lengths)
+            plain = sum(_plain_text_length(item, length) for item, length in zip(items, lengths))
+            linked = sum(1 for item in items if _item_link(item) is not None) / len(items)
+            if linked < settings['min_linked']:
+                continue
+            # Listings have text besides their links and some structure;
+            # menus, link columns and filter lists are mostly link text
+            score = plain * (plain / text) * math.log2(2 + len(common)) * linked
+            candidates.append((score, text, items))
+
+    if not candidates:
+        return []
+    _, best_text, best = max(candidates, key=lambda candidate: candidate[0])
+    # Blocks that hold little of the page's own text are a side strip, not the page's listing
+    share = _page_share(soup, best, best_text)
+    if share < settings['min_page_share']:
+        print(f"Repeated blocks hold only {share:.0%} of the page text, not segmenting")  # Debug print
+        return []
+    # A grid's rows outscore its cards while holding the same text; the cards are the items
+    best_ids = {id(item) for item in best}
+    for _, text, items in sorted(candidates, key=lambda candidate: -len(candidate[2])):
+        if len(items) <= len(best) or text < settings['coverage'] * best_text:
+            continue
+        if all(any(id(ancestor) in best_ids for ancestor in item.parents) for item in items):
+            return items
+    return best
+
+
+def item_id(tag):
+    """Stable id of a listing block: a hash of its first link, or of its text."""
+    link = _item_link(tag)
+    key = link['href'].split('#')[0] if link is not None else tag.get_text(' ', strip=True)
+    # Six hex digits keep the marker cheap in tokens; clashes on a page get a suffix
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=3).hexdigest()
+
+
+def segment_listings(html_content, settings=None):
+    """
+    Reduce a page to its listing blocks, tagged with item ids.
+
+    Returns:
+        str: HTML holding the title, the listing blocks and pagination
+        controls, or html_content unchanged if no listing region was found
+    """
+    settings = {**SEGMENTATION_SETTINGS, **(settings or {})}
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for tag in soup.find_all(_NOISE_TAGS):
+        tag.decompose()
+    items = find_listing_items(soup, settings)
+    if not items:
+        return html_content
+
+    output = BeautifulSoup('<html><head></head><body></body></html>', 'html.parser')
+    if soup.title is not None:
+        output.head.append(output.new_tag('title'))
+        output.title.string = soup.title.get_text(strip=True)
+    seen = {}
+    for item in items:
+        identifier = item_id(item)
+        seen[identifier] = seen.get(identifier, 0) + 1
+        if seen[identifier] > 1:
+            identifier = f"{identifier}-{seen[identifier]}"
+        marker = output.new_tag('p')
+        marker.string = f"ITEM_ID: {identifier}"
+        block = output.new_tag('div', attrs={'data-item-id': identifier})
+        block.append(item.extract())
+        output.body.append(marker)
+        output.body.append(block)
+
+    # The page heading, unless it belonged to an item
+    heading = soup.find('h1')
+    if heading is not None:
+        output.body.insert(0, heading.extract())
+
+    # Pagination controls left on the page (those inside items went with them)
+    kept = []
+    for control in soup.select(settings['keep_selector']):
+        if not any(ancestor is control_kept for control_kept in kept for ancestor in control.parents):
+            kept.append(control)
+    for control in kept:
+        output.body.append(control.extract())
+    return str(output)
@@ -1,17 +1,26 @@
+import json
 from typing import List
 from selenium_utils import fetch_html_selenium
-from html_processing import html_to_markdown_with_readability
 from data_models import create_dynamic_listing_model, create_listings_container_model
 from api_handlers import format_data
-from file_operations import save_raw_data, save_formatted_data
+from file_operations import save_raw_data, save_formatted_data, StreamedListingWriter
 from utils import generate_unique_folder_name, calculate_price
+from change_detection import FingerprintStore, extract_or_reuse
+from page_snapshot import PageSnapshot
 
-def scrape_url(url: str, fields: List[str], selected_model: str, output_folder: str, file_number: int, markdown: str):
+def scrape_url(url: str, fields: List[str], selected_model: str, output_folder: str, file_number: int, page: PageSnapshot, fingerprint_store: FingerprintStore = None):
     try:
+        markdown = page.markdown
         save_raw_data(markdown, output_folder, f'rawData_{file_number}.md')
         DynamicListingModel = create_dynamic_listing_model(fields)
         DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
-        formatted_data, token_counts = format_data(markdown, DynamicListingsContainer, DynamicListingModel, selected_model)
+        formatted_data, token_counts, diff = extract_or_reuse(
+            fingerprint_store, page, fields,
+            lambda: format_data(markdown, DynamicListingsContainer, DynamicListingModel, selected_model,
+                                StreamedListingWriter(output_folder, f'streamed_data_{file_number}.jsonl'), url)
+        )
+        if diff is not None:
+            save_raw_data(json.dumps(diff, indent=4), output_folder, f'diff_data_{file_number}.json')
         save_formatted_data(formatted_data, output_folder, f'sorted_data_{file_number}.json', f'sorted_data_{file_number}.xlsx')
         input_tokens, output_tokens, total_cost = calculate_price(token_counts, selected_model)
         return input_tokens, output_tokens, total_cost, formatted_data
@@ -22,13 +31,18 @@ def scrape_url(url: str, fields: List[str], selected_model: str, output_folder:
 def main(url: str, fields: List[str], selected_model: str):
     output_folder = generate_unique_folder_name(url)
     html_content = fetch_html_selenium(url)
-    markdown = html_to_markdown_with_readability(html_content)
-    input_tokens, output_tokens, total_cost, formatted_data = scrape_url(url, fields, selected_model, output_folder, 1, markdown)
+    page = PageSnapshot(url, html_content)
+    fingerprint_store = FingerprintStore()
+    input_tokens, output_tokens, total_cost, formatted_data = scrape_url(url, fields, selected_model, output_folder, 1, page, fingerprint_store)
+    fingerprint_store.save()
+    change_detection = fingerprint_store.summary()
     
     print(f"Scraping completed for {url}")
     print(f"Input tokens: {input_tokens}")
     print(f"Output tokens: {output_tokens}")
     print(f"Total cost: ${total_cost:.6f}")
+    print(f"Unchanged pages: {change_detection['pages_unchanged']}/{change_detection['pages_checked']} "
+          f"({change_detection['hit_rate']:.0%} hit rate)")
     
     return formatted_data
 
@@ -0,0 +1,258 @@
+"""
+Cost- and latency-aware model routing.
+
+With the "Auto" model a ModelRouter picks the model per page. Cheap and local
+models are tried first; a page is escalated to the next model up the ladder
+only when the extraction fails validation. Models are skipped when the page
+is too large for them, when they have done badly on the page's domain
+before, when their provider is slow or failing, or when they would exceed the
+job's cost budget. Health and domain history only rank models: when they rule
+out every model, the ones that fit are tried anyway. A page too large for
+every model within the remaining budget fails with an error instead of going
+to a model that can't take it. Provider and per-domain statistics persist
+between runs.
+"""
+
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from api_handlers import format_data
+from utils import calculate_price, extract_listings
+from assets import PRICING, ROUTER_SETTINGS, ROUTER_STATS_PATH
+
+
+def _is_empty_answer(formatted_data):
+    """True for a parsed answer whose listings array is present and empty."""
+    if isinstance(formatted_data, str):
+        try:
+            formatted_data = json.loads(formatted_data)
+        except json.JSONDecodeError:
+            return False
+    if isinstance(formatted_data, dict):
+        return formatted_data.get('listings') == []
+    return hasattr(formatted_data, 'listings') and len(formatted_data.listings) == 0
+
+
+def validate_extraction(formatted_data, listing_model, min_fill_ratio=ROUTER_SETTINGS['min_fill_ratio']):
+    """
+    Check an extraction result against the listing model.
+
+    A result fails when it has no listings, a listing isn't an object, or too
+    few of the requested fields are filled in across all listings. A
+    well-formed answer with an empty listings array passes: the page has
+    nothing to extract, and a larger model would only say so at a higher price.
+
+    Returns:
+        tuple: (ok, reason) where reason explains a failure
+    """
+    listings = extract_listings(formatted_data)
+    if not listings:
+        if _is_empty_answer(formatted_data):
+            return True, None
+        return False, "no listings"
+    fields = list(listing_model.model_fields)
+    filled = 0
+    for listing in listings:
+        if not isinstance(listing, dict):
+            return False, "listing is not an object"
+        filled += sum(1 for field in fields if str(listing.get(field) or '').strip())
+    fill_ratio = filled / (len(listings) * len(fields)) if fields else 1.0
+    if fill_ratio < min_fill_ratio:
+        return False, f"only {fill_ratio:.0%} of fields filled"
+    return True, None
+
+
+class ModelRouter:
+    """
+    Picks and escalates models per page within a cost budget.
+
+    Passed in place of a model name as model_selection: format_data,
+    calculate_price and detect_pagination_elements all accept it.
+
+    Args:
+        budget (float): Maximum spend in dollars for the job, or None for no limit
+        ladder (list): Models from cheapest to most capable
+        stats_path (str): Where provider and domain statistics are kept
+    """
+
+    def __init__(self, budget=None, ladder=None, stats_path=ROUTER_STATS_PATH):
+        self.budget = budget
+        self.ladder = ladder or ROUTER_SETTINGS['ladder']
+        self.stats_path = stats_path
+        self.pagination_model = ROUTER_SETTINGS['pagination_model']
+        self.lock = threading.Lock()
+        self.stats = {'models': {}, 'domains': {}}
+        if os.path.exists(stats_path):
+            try:
+                with open(stats_path, 'r', encoding='utf-8') as f:
+                    self.stats = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Could not read router stats {stats_path}: {str(e)}")
+        self.spent = 0.0
+        self.pages = []
+
+    def __str__(self):
+        return "Auto"
+
+    def _model_stats(self, model):
+        return self.stats['models'].setdefault(model, {'calls': 0, 'latency': None, 'error_rate': 0.0})
+
+    def _domain_stats(self, domain, model):
+        return self.stats['domains'].setdefault(domain, {}).setdefault(model, {'ok': 0, 'failed': 0})
+
+    def estimate_cost(self, model, page_tokens):
+        output_tokens = page_tokens * ROUTER_SETTINGS['expected_output_ratio']
+        return page_tokens * PRICING[model]['input'] + output_tokens * PRICING[model]['output']
+
+    def choose(self, url, markdown):
+        """Return the models worth trying for a page, cheapest first."""
+        page_tokens = len(markdown) / ROUTER_SETTINGS['chars_per_token']
+        domain = urlparse(url).netloc if url else None
+        candidates = []
+        fitting = []  # models the page fits and the budget allows, whatever their track record
+        with self.lock:
+            for model in self.ladder:
+                stats = self._model_stats(model)
+                # Provider health only counts for a while, so a recovered provider gets tried again
+                recent = time.time() - stats.get('last_call', 0) < ROUTER_SETTINGS['provider_cooldown']
+                reason = None
+                if page_tokens > ROUTER_SETTINGS['context_limits'].get(model, float('inf')):
+                    print(f"Router: skipping {model}: page of ~{int(page_tokens)} tokens exceeds its context")
+                    continue
+                if self._over_budget(model, page_tokens):
+                    print(f"Router: skipping {model}: would exceed the cost budget")
+                    continue
+                fitting.append(model)
+                if recent and stats['calls'] >= ROUTER_SETTINGS['min_samples'] and stats['error_rate'] > ROUTER_SETTINGS['max_error_rate']:
+                    reason = f"error rate {stats['error_rate']:.0%}"
+                elif recent and stats['latency'] is not None and stats['latency'] > ROUTER_SETTINGS['max_latency']:
+                    reason = f"latency {stats['latency']:.1f}s"
+                elif domain:
+                    history = self._domain_stats(domain, model)
+                    attempts = history['ok'] + history['failed']
+                    if attempts >= ROUTER_SETTINGS['min_samples'] and history['ok'] / attempts < ROUTER_SETTINGS['min_domain_accuracy']:
+                        reason = f"{history['ok']}/{attempts} valid extractions on {domain}"
+                if reason:
+                    print(f"Router: skipping {model}: {reason}")
+                else:
+                    candidates.append(model)
+        if candidates:
+            return candidates
+        if fitting:
+            # Only their track record rules them out; better to try them than not extract
+            return fitting
+        raise RuntimeError(f"No model can take this page of ~{int(page_tokens)} tokens "
+                           f"within its context and the remaining budget")
+
+    def _over_budget(self, model, page_tokens):
+        # Free models estimate at $0, so they stay available once the budget is spent
+        return self.budget is not None and self.spent + self.estimate_cost(model, page_tokens) > self.budget
+
+    def _record(self, model, domain, latency, error=False, valid=False):
+        alpha = ROUTER_SETTINGS['ewma_alpha']
+        with self.lock:
+            stats = self._model_stats(model)
+            stats['calls'] += 1
+            stats['last_call'] = time.time()
+            stats['error_rate'] = (1 - alpha) * stats['error_rate'] + alpha * (1.0 if error else 0.0)
+            if not error:
+                stats['latency'] = latency if stats['latency'] is None else (1 - alpha) * stats['latency'] + alpha * latency
+            if domain:
+                self._domain_stats(domain, model)['ok' if valid else 'failed'] += 1
+
+    def extract(self, data, DynamicListingsContainer, DynamicListingModel, on_listing=None, url=None):
+        """
+        Extract one page, escalating up the ladder until the result validates.
+
+        Returns:
+            tuple: (formatted_data, token_counts) like format_data; token_counts
+            holds the summed tokens plus an 'attempts' list used for pricing
+        """
+        domain = urlparse(url).netloc if url else None
+        attempts = []
+        result = None
+        last_error = None
+        started = time.time()
+        for i, model in enumerate(self.choose(url, data)):
+            if i:
+                # Earlier attempts have been paid for since choose() checked the budget
+                with self.lock:
+                    over_budget = self._over_budget(model, len(data) / ROUTER_SETTINGS['chars_per_token'])
+                if over_budget:
+                    print(f"Router: not escalating to {model}: would exceed the cost budget")
+                    continue
+            if i and hasattr(on_listing, 'reset'):
+                on_listing.reset()  # Drop listings streamed by the rejected attempt
+            attempt_start = time.time()
+            try:
+                formatted_data, token_counts = format_data(data, DynamicListingsContainer, DynamicListingModel, model, on_listing)
+            except Exception as e:
+                print(f"Router: {model} failed: {str(e)}")
+                self._record(model, domain, time.time() - attempt_start, error=True)
+                last_error = e
+                continue
+            latency = time.time() - attempt_start
+            attempts.append({'model': model, 'token_counts': token_counts})
+            cost = calculate_price(token_counts, model)[2]
+            with self.lock:
+                self.spent += cost
+            valid, reason = validate_extraction(formatted_data, DynamicListingModel)
+            self._record(model, domain, latency, valid=valid)
+            result = (formatted_data, model, token_counts)
+            if valid:
+                break
+            print(f"Router: {model} output rejected ({reason}), escalating")
+
+        if result is None:
+            raise last_error or RuntimeError("No model available for this page")
+
+        formatted_data, model, final_counts = result
+        token_counts = {
+            'input_tokens': sum(a['token_counts'].get('input_tokens', 0) for a in attempts),
+            'output_tokens': sum(a['token_counts'].get('output_tokens', 0) for a in attempts),
+            'cached_input_tokens': sum(a['token_counts'].get('cached_input_tokens', 0) for a in attempts),
+            'model': model,
+            'attempts': attempts
+        }
+        with self.lock:
+            self.pages.append({
+                'model': model,
+                'attempts': len(attempts),
+                'cost': sum(calculate_price(a['token_counts'], a['model'])[2] for a in attempts),
+                'baseline_cost': calculate_price(final_counts, self.ladder[-1])[2],
+                'latency': time.time() - started
+            })
+        return formatted_data, token_counts
+
+    def report(self):
+        """Spend and latency of the routed pages against sending every page to the top model."""
+        with self.lock:
+            pages = list(self.pages)
+            baseline_latency = self._model_stats(self.ladder[-1])['latency']
+        by_model = {}
+        for page in pages:
+            by_model[page['model']] = by_model.get(page['model'], 0) + 1
+        spend = sum(page['cost'] for page in pages)
+        baseline_spend = sum(page['baseline_cost'] for page in pages)
+        latency = sum(page['latency'] for page in pages)
+        return {
+            'pages': len(pages),
+            'by_model': by_model,
+            'escalations': sum(page['attempts'] - 1 for page in pages),
+            'budget': self.budget,
+            'spend': spend,
+            'baseline_model': self.ladder[-1],
+            'baseline_spend': baseline_spend,
+            'savings': baseline_spend - spend,
+            'latency': latency,
+            'baseline_latency': baseline_latency * len(pages) if baseline_latency is not None else None
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.stats_path) or '.', exist_ok=True)
+        with self.lock:
+            with open(self.stats_path, 'w', encoding='utf-8') as f:
+                json.dump(self.stats, f, indent=4)
@@ -0,0 +1,365 @@
+"""
+Near-duplicate pages across URLs.
+
+Catalogues show the same listings under other sort orders, filter
+permutations and tracking parameters. Change detection only compares a URL
+with its own last crawl, so every variant went through format_data at full
+price. NearDuplicateIndex keeps a MinHash signature of each extracted page
+(word shingles of the normalised markdown) in an LSH table, and a new page
+is compared only with the pages that share a band with it.
+
+A page that closely matches an earlier one reuses its extraction:
+- When both pages were segmented into ITEM_ID blocks (listing_segmentation),
+  each block is matched with the listings extracted from it. Listings of
+  blocks whose text hasn't changed are reused, and only the new or changed
+  blocks are sent to the model. The listings are merged back in page order.
+- Otherwise the earlier listings are reused as a whole, but only when both
+  pages hold exactly the same numbers (in any order). A sort variant
+  qualifies; a page with a changed price or a different subset does not.
+
+The index lives for one job; with NEAR_DUPLICATE_SETTINGS['persist'] it is
+saved to NEAR_DUPLICATE_STORE_PATH and also matches pages of earlier runs.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+
+from assets import NEAR_DUPLICATE_SETTINGS
+from change_detection import normalise_text
+from utils import extract_listings, count_tokens
+
+_WORD_RE = re.compile(r'\w+')
+_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)*')
+_ITEM_MARKER = re.compile(r'^ITEM_ID: (\S+)\s*$', re.MULTILINE)
+_MARKDOWN_LINK = re.compile(r'\]\(<?([^)\s>]+)')
+# Mersenne prime for the universal hash functions standing in for permutations
+_PRIME = (1 << 61) - 1
+
+
+def _permutations(count, seed=1):
+    rng = random.Random(seed)
+    return [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(count)]
+
+
+def shingles(text, size):
+    """Hashes of the word size-shingles of already normalised text."""
+    words = _WORD_RE.findall(text)
+    grams = {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return {int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'big') for gram in grams}
+
+
+def minhash(shingle_hashes, permutations):
+    """MinHash signature: the smallest permuted hash per permutation."""
+    if not shingle_hashes:
+        return [0] * len(permutations)
+    return [min((a * value + b) % _PRIME for value in shingle_hashes) for a, b in permutations]
+
+
+def estimated_similarity(first, second):
+    """Jaccard similarity of two pages estimated from their signatures."""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def _numbers_digest(text):
+    # Sorted, so a sort variant of a page has the same digest
+    numbers = sorted(_NUMBER_RE.findall(text))
+    return hashlib.sha1(' '.join(numbers).encode('utf-8')).hexdigest()
+
+
+def split_items(markdown):
+    """
+    Cut segmented markdown into its ITEM_ID blocks.
+
+    Returns:
+        tuple: (header, [(item_id, block_markdown)]); no blocks if the page
+        was not segmented
+    """
+    markers = list(_ITEM_MARKER.finditer(markdown))
+    if not markers:
+        return markdown, []
+    blocks = []
+    for marker, next_marker in zip(markers, markers[1:] + [None]):
+        end = next_marker.start() if next_marker is not None else len(markdown)
+        blocks.append((marker.group(1), markdown[marker.start():end]))
+    return markdown[:markers[0].start()], blocks
+
+
+def _block_digest(block):
+    return hashlib.sha1(normalise_text(block).encode('utf-8')).hexdigest()
+
+
+def _links_to(value, links):
+    value = value.split('#')[0]
+    return any(value == link or (len(link) > 1 and value.endswith(link)) for link in links)
+
+
+def _find_block(listing, fields, blocks):
+    """item_id of the one block the listing was extracted from, or None if that's unclear."""
+    values = [str(listing.get(field) or '').strip() for field in fields]
+    # A link identifies the block, as it does for item ids
+    urls = [value for value in values if value.startswith(('http://', 'https://', '/'))]
+    if urls:
+        linked = [item_id for item_id, _, links in blocks if any(_links_to(url, links) for url in urls)]
+        if len(linked) == 1:
+            return linked[0]
+    # Otherwise all values together: one a whole category shares (brand, "In stock") can't tell blocks apart
+    values = [normalise_text(value) for value in values]
+    values = [value for value in values if len(value) > 2]
+    if not values:
+        return None
+    scores = [(sum(1 for value in values if value in text), item_id) for item_id, text, _ in blocks]
+    best = max(score for score, _ in scores)
+    best_blocks = [item_id for score, item_id in scores if score == best]
+    return best_blocks[0] if best and len(best_blocks) == 1 else None
+
+
+def assign_listings(blocks, listings, fields):
+    """
+    Match listings to the item blocks they were extracted from.
+
+    A listing belongs to the block its link points to, or else to the one
+    block holding more of its field values than any other.
+
+    Returns:
+        tuple: ({item_id: [listings]}, [listings no single block holds])
+    """
+    texts = [(item_id, normalise_text(block), {link.split('#')[0] for link in _MARKDOWN_LINK.findall(block)})
+             for item_id, block in blocks]
+    assigned, unassigned = {}, []
+    for listing in listings:
+        item = _find_block(listing, fields, texts)
+        if item is None:
+            unassigned.append(listing)
+        else:
+            assigned.setdefault(item, []).append(listing)
+    return assigned, unassigned
+
+
+def reliable_assignment(blocks, assigned, unassigned):
+    """
+    Whether an assignment can be stored per block: every listing has its
+    block, and no block holds several listings while another holds none,
+    which is how matching on the wrong values looks.
+    """
+    if unassigned:
+        return False
+    crowded = any(len(listings) > 1 for listings in assigned.values())
+    return not (crowded and len(assigned) < len(blocks))
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of the pages extracted in a job.
+
+    Args:
+        path (str): File to load and save the index, None to keep it in memory
+        settings (dict): Overrides for NEAR_DUPLICATE_SETTINGS
+    """
+
+    def __init__(self, path=None, settings=None):
+        self.settings = {**NEAR_DUPLICATE_SETTINGS, **(settings or {})}
+        self.path = path
+        self.permutations = _permutations(self.settings['num_perm'])
+        self.rows = self.settings['num_perm'] // self.settings['bands']
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.buckets = {}
+        self.stats = {'pages_checked': 0, 'reused': 0, 'partial': 0, 'tokens_saved': 0}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for key, entry in json.load(f).items():
+                        self._insert(key, entry)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Could not read near-duplicate index {path}: {str(e)}")
+
+    @staticmethod
+    def _key(url, fields):
+        return f"{url}#{'|'.join(fields)}"
+
+    def _band_keys(self, signature, fields):
+        # Fields are part of the key: listings extracted for other fields can't be reused
+        scope = '|'.join(fields)
+        return [f"{scope}:{band}:{hash(tuple(signature[band * self.rows:(band + 1) * self.rows]))}"
+                for band in range(self.settings['bands'])]
+
+    def _insert(self, key, entry):
+        self._remove(key)
+        self.entries[key] = entry
+        for band_key in self._band_keys(entry['signature'], entry['fields']):
+            self.buckets.setdefault(band_key, set()).add(key)
+        while len(self.entries) > self.settings['max_entries']:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in self._band_keys(entry['signature'], entry['fields']):
+            members = self.buckets.get(band_key)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self.buckets[band_key]
+
+    def signature(self, markdown):
+        return minhash(shingles(normalise_text(markdown), self.settings['shingle_size']), self.permutations)
+
+    def match(self, url, fields, signature):
+        """
+        The most similar earlier page of another URL above the threshold.
+
+        Returns:
+            tuple: (entry, similarity), or None
+        """
+        with self.lock:
+            self.stats['pages_checked'] += 1
+            candidates = set()
+            for band_key in self._band_keys(signature, fields):
+                candidates |= self.buckets.get(band_key, set())
+            candidates.discard(self._key(url, fields))
+            scored = [(estimated_similarity(signature, self.entries[key]['signature']), self.entries[key])
+                      for key in candidates]
+        scored = [(similarity, entry) for similarity, entry in scored if similarity >= self.settings['threshold']]
+        if not scored:
+            return None
+        similarity, entry = max(scored, key=lambda pair: pair[0])
+        return entry, similarity
+
+    def add(self, url, fields, markdown, formatted_data, signature=None, items=None):
+        """
+        Index an extracted page.
+
+        Args:
+            items (dict): {item_id: {'digest', 'listings'}} if already known,
+                otherwise worked out from the markdown's ITEM_ID blocks
+        """
+        listings = extract_listings(formatted_data)
+        if items is None:
+            _, blocks = split_items(markdown)
+            if blocks:
+                assigned, unassigned = assign_listings(blocks, listings, fields)
+                # Listings filed under the wrong block would be lost or repeated when blocks are reused
+                if reliable_assignment(blocks, assigned, unassigned):
+                    items = {item_id: {'digest': _block_digest(block), 'listings': assigned.get(item_id, [])}
+                             for item_id, block in blocks}
+        entry = {
+            'url': url,
+            'fields': list(fields),
+            'signature': signature if signature is not None else self.signature(markdown),
+            'numbers': _numbers_digest(normalise_text(markdown)),
+            'listings': listings,
+            'items': items
+        }
+        with self.lock:
+            self._insert(self._key(url, fields), entry)
+
+    def record_saving(self, kind, tokens):
+        with self.lock:
+            self.stats[kind] += 1
+            self.stats['tokens_saved'] += tokens
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self.lock:
+            entries = dict(self.entries)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+
+    def summary(self):
+        with self.lock:
+            return dict(self.stats)
+
+
+def _reuse_items(index, page, fields, extract, model, entry, similarity):
+    """Reuse unchanged item blocks of entry, extracting only the others. None if it doesn't apply."""
+    header, blocks = split_items(page.markdown)
+    if not blocks or not entry.get('items'):
+        return None
+    digests = {item_id: _block_digest(block) for item_id, block in blocks}
+    changed = [(item_id, block) for item_id, block in blocks
+               if entry['items'].get(item_id, {}).get('digest') != digests[item_id]]
+    if len(changed) > index.settings['max_changed_share'] * len(blocks):
+        return None
+
+    page_tokens = count_tokens(page.markdown, model)
+    token_counts = {'input_tokens': 0, 'output_tokens': 0}
+    assigned = {}
+    if changed:
+        partial = header + ''.join(block for _, block in changed)
+        print(f"Near-duplicate of {entry['url']} ({similarity:.0%}), extracting {len(changed)}/{len(blocks)} "
+              f"changed listing blocks of {page.url}")  # Debug print
+        formatted_data, token_counts = extract(partial)
+        assigned, unassigned = assign_listings(changed, extract_listings(formatted_data), fields)
+        reliable = reliable_assignment(changed, assigned, unassigned)
+        if unassigned:
+            # Can't tell which blocks they came from; keep them with the last changed one
+            assigned.setdefault(changed[-1][0], []).extend(unassigned)
+        index.record_saving('partial', max(page_tokens - count_tokens(partial, model), 0))
+    else:
+        reliable = True
+        print(f"Near-duplicate of {entry['url']} ({similarity:.0%}), reusing its listings for {page.url}")  # Debug print
+        index.record_saving('reused', page_tokens)
+
+    items = {}
+    listings = []
+    for item_id, _ in blocks:
+        item_listings = assigned[item_id] if item_id in assigned else entry['items'].get(item_id, {}).get('listings', [])
+        items[item_id] = {'digest': digests[item_id], 'listings': item_listings}
+        listings.extend(item_listings)
+    # None: index.add() works the blocks out again from the whole page
+    return {'listings': listings}, token_counts, items if reliable else None
+
+
+def extract_or_reuse_similar(index, page, fields, extract, model=None):
+    """
+    Run extract() on the page unless a near-duplicate page was extracted before.
+
+    Args:
+        index (NearDuplicateIndex): Job index, or None to always extract
+        page (PageSnapshot): The page
+        fields (list): Fields to extract
+        extract (callable): Takes markdown and returns (formatted_data, token_counts) like format_data
+        model (str): Model name, for counting the tokens saved
+
+    Returns:
+        tuple: (formatted_data, token_counts)
+    """
+    if index is None or not page.url:
+        return extract(page.markdown)
+    signature = index.signature(page.markdown)
+    return extract_similar(index, page, fields, extract, model, signature, index.match(page.url, fields, signature))
+
+
+def extract_similar(index, page, fields, extract, model, signature, matched):
+    """
+    extract_or_reuse_similar for a page already looked up in the index.
+
+    Args:
+        signature (list): The page's MinHash signature
+        matched (tuple): index.match() result for the page, or None
+    """
+    model = model if isinstance(model, str) else 'gpt-4o-mini'
+    if matched is not None:
+        entry, similarity = matched
+        reused = _reuse_items(index, page, fields, extract, model, entry, similarity)
+        if reused is not None:
+            formatted_data, token_counts, items = reused
+            index.add(page.url, fields, page.markdown, formatted_data, signature, items)
+            return formatted_data, token_counts
+        if entry['numbers'] == _numbers_digest(normalise_text(page.markdown)):
+            print(f"Near-duplicate of {entry['url']} ({similarity:.0%}), reusing its listings for {page.url}")  # Debug print
+            index.record_saving('reused', count_tokens(page.markdown, model))
+            formatted_data = {'listings': entry['listings']}
+            index.add(page.url, fields, page.markdown, formatted_data, signature)
+            return formatted_data, {'input_tokens': 0, 'output_tokens': 0}
+
+    formatted_data, token_counts = extract(page.markdown)
+    index.add(page.url, fields, page.markdown, formatted_data, signature)
+    return formatted_data, token_counts
@@ -0,0 +1,289 @@
+"""
+XHR/JSON API capture.
+
+Many shops render their listings from JSON the page fetches itself. Instead of
+turning the rendered DOM into markdown for an LLM, this module records the
+page's fetch/XHR responses through the Chrome DevTools Protocol, finds the JSON
+payload holding the listing array, maps its keys to the requested fields and
+then paginates the endpoint directly over plain HTTP.
+"""
+
+import json
+import os
+import random
+import re
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+import requests
+
+from assets import API_MAPPING_STORE_PATH, API_PAGE_PARAMS, API_OFFSET_PARAMS, FIELD_SYNONYMS, USER_AGENTS
+
+# Request headers that must not be replayed verbatim
+_SKIPPED_HEADERS = {'content-length', 'host', 'cookie', 'accept-encoding'}
+
+
+def enable_network_capture(options):
+    """Turn on Chrome performance logging so network events can be read back."""
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def capture_json_responses(driver):
+    """
+    Collect the fetch/XHR JSON responses logged since the last call.
+
+    Returns:
+        list: dicts with the original 'request' (url, method, headers, postData)
+        and the decoded 'payload'
+    """
+    sent_requests = {}
+    json_request_ids = []
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        params = message.get('params', {})
+        if message.get('method') == 'Network.requestWillBeSent':
+            sent_requests[params['requestId']] = params['request']
+        elif message.get('method') == 'Network.responseReceived':
+            if params.get('type') in ('XHR', 'Fetch') and 'json' in params['response'].get('mimeType', ''):
+                json_request_ids.append(params['requestId'])
+
+    captured = []
+    for request_id in json_request_ids:
+        try:
+            body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            payload = json.loads(body['body'])
+        except Exception as e:
+            # Body already evicted from the buffer or not valid JSON
+            print(f"Skipping captured response {request_id}: {str(e)}")
+            continue
+        if request_id in sent_requests:
+            captured.append({'request': sent_requests[request_id], 'payload': payload})
+    return captured
+
+
+def find_listing_array(payload, path=()):
+    """
+    Find the most listing-like array in a JSON payload.
+
+    A listing array is a list of at least two objects; larger arrays whose
+    objects share more keys win.
+
+    Returns:
+        tuple: (path, items) or (None, []) if the payload has no listing array
+    """
+    best_path, best_items, best_score = None, [], 0
+    if isinstance(payload, dict):
+        children = payload.items()
+    elif isinstance(payload, list):
+        dicts = [item for item in payload if isinstance(item, dict)]
+        if len(dicts) >= 2 and len(dicts) == len(payload):
+            shared_keys = set.intersection(*(set(item) for item in dicts))
+            best_path, best_items, best_score = path, dicts, len(dicts) * len(shared_keys)
+        children = enumerate(payload[:1])  # Nested arrays inside the first item only
+    else:
+        return None, []
+
+    for key, value in children:
+        child_path, child_items = find_listing_array(value, path + (key,))
+        if child_items:
+            shared_keys = set.intersection(*(set(item) for item in child_items))
+            score = len(child_items) * len(shared_keys)
+            if score > best_score:
+                best_path, best_items, best_score = child_path, child_items, score
+    return best_path, best_items
+
+
+def resolve_path(payload, path):
+    for key in path:
+        try:
+            payload = payload[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return payload
+
+
+def _flatten(item, prefix=(), depth=3):
+    """Map every scalar leaf of a listing object (up to depth) to its key path."""
+    leaves = {}
+    if depth == 0:
+        return leaves
+    for key, value in item.items():
+        if isinstance(value, dict):
+            leaves.update(_flatten(value, prefix + (key,), depth - 1))
+        elif not isinstance(value, list) and value is not None:
+            leaves[prefix + (key,)] = value
+    return leaves
+
+
+def _normalise_key(key):
+    return re.sub(r'[^a-z0-9]', '', str(key).lower())
+
+
+def learn_field_mapping(items, fields):
+    """
+    Map each requested field to the key path inside a listing object.
+
+    Leaf keys are scored against the field name and its synonyms: an exact key
+    match beats a match further up the path, which beats a substring match.
+    Leaves that are empty in most items are ignored.
+
+    Returns:
+        dict: field -> key path (list), or None when nothing matched
+    """
+    leaves = [_flatten(item) for item in items]
+    filled = {}
+    for item_leaves in leaves:
+        for path, value in item_leaves.items():
+            if str(value).strip():
+                filled[path] = filled.get(path, 0) + 1
+
+    mapping = {}
+    for field in fields:
+        candidates = [_normalise_key(name) for name in [field] + FIELD_SYNONYMS.get(field.lower(), [])]
+        best_path, best_score = None, 0
+        for path, count in filled.items():
+            if count * 2 < len(items):
+                continue
+            last_key = _normalise_key(path[-1])
+            joined = _normalise_key(''.join(str(key) for key in path))
+            if last_key in candidates:
+                score = 3
+            elif any(candidate in joined for candidate in candidates):
+                score = 2
+            elif any(last_key and last_key in candidate for candidate in candidates):
+                score = 1
+            else:
+                continue
+            # Prefer shallow paths on ties
+            if score > best_score or (score == best_score and len(path) < len(best_path)):
+                best_path, best_score = path, score
+        mapping[field] = list(best_path) if best_path else None
+    return mapping
+
+
+def map_items(items, mapping):
+    listings = []
+    for item in items:
+        listings.append({
+            field: '' if path is None or resolve_path(item, path) is None else str(resolve_path(item, path))
+            for field, path in mapping.items()
+        })
+    return listings
+
+
+def select_listing_endpoint(captured, fields, mapping_store=None):
+    """
+    Pick the captured response that best matches the requested fields.
+
+    Returns:
+        dict: 'request', 'array_path', 'mapping' and 'items' of the chosen
+        response, or None if no captured payload contains a listing array
+    """
+    best, best_score = None, 0
+    for response in captured:
+        request_url = response['request']['url']
+        learned = mapping_store.get(request_url, fields) if mapping_store else None
+        if learned:
+            array_path = learned['array_path']
+            items = resolve_path(response['payload'], array_path)
+            if not isinstance(items, list) or not items:
+                continue
+            mapping = learned['mapping']
+        else:
+            array_path, items = find_listing_array(response['payload'])
+            if not items:
+                continue
+            mapping = learn_field_mapping(items, fields)
+
+        matched_fields = sum(1 for path in mapping.values() if path)
+        score = matched_fields * 1000 + len(items)
+        if matched_fields and score > best_score:
+            best_score = score
+            best = {'request': response['request'], 'array_path': list(array_path), 'mapping': mapping, 'items': items}
+    return best
+
+
+def next_page_request(request, page_size, page_index):
+    """
+    Build the request for the given page index (0-based) of an API endpoint.
+
+    Looks for a page or offset parameter in the query string, then in a JSON
+    request body. Returns None if the endpoint has no recognisable paging.
+    """
+    parsed = urlparse(request['url'])
+    query = parse_qsl(parsed.query, keep_blank_values=True)
+
+    def paged_value(name, value):
+        if name.lower() in API_OFFSET_PARAMS:
+            return page_index * page_size
+        # Page numbers usually start at 1, but keep a 0-based API 0-based
+        return page_index if value == '0' else page_index + 1
+
+    for i, (name, value) in enumerate(query):
+        if name.lower() in API_PAGE_PARAMS + API_OFFSET_PARAMS:
+            query[i] = (name, str(paged_value(name, value)))
+            return dict(request, url=urlunparse(parsed._replace(query=urlencode(query))))
+
+    if request.get('postData'):
+        try:
+            body = json.loads(request['postData'])
+        except json.JSONDecodeError:
+            return None
+        if isinstance(body, dict):
+            for name, value in body.items():
+                if name.lower() in API_PAGE_PARAMS + API_OFFSET_PARAMS and isinstance(value, int):
+                    body[name] = paged_value(name, str(value))
+                    return dict(request, postData=json.dumps(body))
+    return None
+
+
+def fetch_api_page(request, cookies=None, timeout=15, session=None):
+    """
+    Replay a captured API request over plain HTTP and return the decoded JSON.
+
+    session, if given, is a requests.Session (e.g. SessionStore.requests_session)
+    whose cookies are sent along with cookies.
+    """
+    headers = {name: value for name, value in request.get('headers', {}).items()
+               if name.lower() not in _SKIPPED_HEADERS}
+    headers.setdefault('User-Agent', random.choice(USER_AGENTS))
+    response = (session or requests).request(
+        request.get('method', 'GET'),
+        request['url'],
+        headers=headers,
+        data=request.get('postData'),
+        cookies=cookies,
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+class ApiMappingStore:
+    """Persistent array paths and field mappings learned per API endpoint."""
+
+    def __init__(self, path=API_MAPPING_STORE_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Could not read API mapping store {path}: {str(e)}")
+
+    @staticmethod
+    def _key(request_url, fields):
+        # Endpoint without its query string, so every page shares one mapping
+        parsed = urlparse(request_url)
+        return f"{parsed.netloc}{parsed.path}#{'|'.join(fields)}"
+
+    def get(self, request_url, fields):
+        return self.entries.get(self._key(request_url, fields))
+
+    def record(self, request_url, fields, array_path, mapping):
+        self.entries[self._key(request_url, fields)] = {'array_path': array_path, 'mapping': mapping}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=4)
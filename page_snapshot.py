@@ -0,0 +1,135 @@
+"""
+One fetched page and the forms derived from it.
+
+A PageSnapshot holds the raw HTML captured once from the browser. Cleaned
+HTML, markdown, token counts, the change-detection fingerprint and the
+pagination result are computed the first time a stage asks for them and then
+kept on the snapshot, so later stages never re-read driver.page_source,
+re-convert the page or ask the model for pagination again. SnapshotStats
+counts how many of those derivations were computed and how many were served
+from a snapshot instead.
+"""
+
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+from html_processing import clean_html, html_to_markdown_with_readability, get_conversion_pool
+from change_detection import compute_fingerprint
+from pagination_detector import detect_pagination_elements
+from utils import count_tokens
+
+
+def pagination_page_urls(pagination_data):
+    """Page URLs from a detect_pagination_elements result of any shape."""
+    if hasattr(pagination_data, 'page_urls'):
+        return pagination_data.page_urls
+    if isinstance(pagination_data, dict):
+        return pagination_data.get('page_urls', [])
+    return []
+
+
+class SnapshotStats:
+    """Computed and reused derivations across the snapshots of one run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.computed = {}
+        self.reused = {}
+
+    def record(self, kind, reused):
+        with self.lock:
+            counts = self.reused if reused else self.computed
+            counts[kind] = counts.get(kind, 0) + 1
+
+    def summary(self):
+        with self.lock:
+            return {
+                'computed': sum(self.computed.values()),
+                'avoided': sum(self.reused.values()),
+                'avoided_by_kind': dict(self.reused)
+            }
+
+
+class PageSnapshot:
+    """
+    Raw HTML of one page with lazily memoised derived forms.
+
+    Args:
+        url (str): URL the page was fetched from
+        raw_html (str): Page source captured from the driver
+        page_num (int): Position of the page in its crawl
+        stats (SnapshotStats): Optional run-wide counters
+    """
+
+    def __init__(self, url, raw_html, page_num=1, stats=None):
+        self.url = url
+        self.raw_html = raw_html
+        self.page_num = page_num
+        self.stats = stats
+        self._memo = {}
+        self._conversion = None
+        self.lock = threading.Lock()
+
+    def _get(self, key, compute):
+        with self.lock:
+            if key in self._memo:
+                if self.stats is not None:
+                    self.stats.record(key[0], reused=True)
+                return self._memo[key]
+        value = compute()
+        with self.lock:
+            if key in self._memo:
+                return self._memo[key]
+            self._memo[key] = value
+        if self.stats is not None:
+            self.stats.record(key[0], reused=False)
+        return value
+
+    @property
+    def cleaned_html(self):
+        return self._get(('cleaned_html',), lambda: clean_html(self.raw_html))
+
+    def start_conversion(self):
+        """
+        Start converting to markdown in the conversion pool without waiting for it.
+        Pages whose markdown is needed right away are converted inline instead.
+        """
+        with self.lock:
+            if self._conversion is None and ('markdown',) not in self._memo:
+                pool = get_conversion_pool()
+                try:
+                    self._conversion = (pool, pool.submit(self.raw_html))
+                except BrokenProcessPool:
+                    print("Markdown conversion pool is broken, the page will be converted inline")
+        return self
+
+    def _convert(self):
+        if self._conversion is not None:
+            pool, future = self._conversion
+            return pool.result(future, self.raw_html)
+        return html_to_markdown_with_readability(self.raw_html)
+
+    @property
+    def markdown(self):
+        return self._get(('markdown',), self._convert)
+
+    def token_count(self, model='gpt-4o-mini'):
+        """Tokens in the page's markdown for model's tokenizer (cl100k_base if unknown)."""
+        return self._get(('token_count', str(model)), lambda: count_tokens(self.markdown, model))
+
+    def fingerprint(self):
+        return self._get(('fingerprint',), lambda: compute_fingerprint(self.markdown))
+
+    def pagination(self, pagination_details, model_selection):
+        """
+        Detect the page's pagination once per details/model pair.
+
+        Returns:
+            tuple: (pagination_data, token_counts, cost) like detect_pagination_elements.
+            A reused result has already been paid for, so callers only add its
+            usage the first time.
+        """
+        key = ('pagination', pagination_details, str(model_selection))
+        return self._get(key, lambda: detect_pagination_elements(
+            self.url, pagination_details, model_selection, self.markdown
+        ))
@@ -14,7 +14,8 @@ from groq import Groq
 
 
 from api_management import get_api_key
-from assets import PROMPT_PAGINATION, PRICING, LLAMA_MODEL_FULLNAME, GROQ_LLAMA_MODEL_FULLNAME
+from utils import calculate_price
+from assets import PROMPT_PAGINATION, LLAMA_MODEL_FULLNAME, GROQ_LLAMA_MODEL_FULLNAME
 
 load_dotenv()
 import logging
@@ -33,13 +34,8 @@ def calculate_pagination_price(token_counts: Dict[str, int], model: str) -> floa
     Returns:
     float: The total price for the pagination operation.
     """
-    input_tokens = token_counts['input_tokens']
-    output_tokens = token_counts['output_tokens']
-    
-    input_price = input_tokens * PRICING[model]['input']
-    output_price = output_tokens * PRICING[model]['output']
-    
-    return input_price + output_price
+    # Same pricing as extraction calls, including the cached-input discount
+    return calculate_price(token_counts, model)[2]
 
 def detect_pagination_elements(url: str, indications: str, selected_model: str, markdown_content: str) -> Tuple[Union[PaginationData, Dict, str], Dict, float]:
     try:
@@ -59,6 +55,9 @@ def detect_pagination_elements(url: str, indications: str, selected_model: str,
         else:
             prompt_pagination +=PROMPT_PAGINATION+"\n There are no user indications in this case just apply the logic described. \n\n below are the markdowns of the website: \n\n"
 
+        # A ModelRouter leaves pagination to one fixed model
+        selected_model = getattr(selected_model, 'pagination_model', selected_model)
+
         if selected_model in ["gpt-4o-mini", "gpt-4o-2024-08-06"]:
             # Use OpenAI API
             client = OpenAI(api_key=get_api_key('OPENAI_API_KEY'))
@@ -178,7 +177,8 @@ def detect_pagination_elements(url: str, indications: str, selected_model: str,
             # Token counts
             token_counts = {
                 "input_tokens": response.usage.prompt_tokens,
-                "output_tokens": response.usage.completion_tokens
+                "output_tokens": response.usage.completion_tokens,
+                "cached_input_tokens": getattr(getattr(response.usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
             }
             # Calculate the price
             pagination_price = calculate_pagination_price(token_counts, selected_model)
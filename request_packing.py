@@ -0,0 +1,296 @@
+"""
+Several small pages in one extraction request.
+
+Every page that reaches format_data pays for a request of its own, and with
+it the system message and instructions again; for result pages of one or two
+thousand tokens that overhead is a large part of the bill. A PagePacker
+collects such pages and sends them together, each under a delimiter line
+with its page id, until PACKING_SETTINGS['budget'] tokens are reached. The
+model answers with a packed container ({"pages": [{"page_id", "listings"}]})
+and every page gets its own listings back, saved to its own sorted_data file
+as if it had been extracted alone.
+
+Pages stay on the single-page path when packing can't help or can't be
+trusted: pages over max_page_tokens, unchanged pages reused from the last
+crawl, near-duplicates of pages already extracted, pages the rule extractor
+covers, models without schema-constrained output and the Auto router. A packed answer that doesn't parse, or leaves
+out a page, sends the pages concerned through format_data one by one.
+
+BatchScraper packs the pages of all its seeds, except a seed's first page
+when pagination detection has to wait for it. A single-URL run has nothing
+to pack.
+"""
+
+import json
+import threading
+
+from api_handlers import format_data, handle_openai, handle_gemini
+from assets import PACKING_SETTINGS, PACKED_USER_MESSAGE, RULE_EXTRACTOR_SETTINGS
+from change_detection import reuse_unchanged, record_extraction
+from near_duplicates import extract_similar
+from data_models import create_dynamic_listing_model, create_listings_container_model, create_packed_container_model
+from rule_extractor import first_pass
+from utils import extract_listings
+
+
+def split_token_counts(token_counts, weights):
+    """
+    Share one request's token counts among its pages in proportion to weights.
+
+    Every count is split so that the shares add up to the request's total,
+    which keeps calculate_price (linear in the counts) summing to the real bill.
+    """
+    total_weight = sum(weights) or len(weights)
+    shares = [{} for _ in weights]
+    for key, value in token_counts.items():
+        if not isinstance(value, int):
+            continue
+        assigned = 0
+        for i, weight in enumerate(weights):
+            if i == len(weights) - 1:
+                share = value - assigned
+            else:
+                share = round(value * (weight or 1) / total_weight)
+            shares[i][key] = share
+            assigned += share
+    return shares
+
+
+def add_token_counts(first, second):
+    """Sum of two token count dicts; non-numeric entries of first are kept."""
+    total = dict(first)
+    for key, value in second.items():
+        if isinstance(value, int):
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def _packed_pages(answer):
+    """{page_id: listings} from a packed answer, whatever form the handler returned."""
+    if isinstance(answer, str):
+        answer = json.loads(answer)
+    elif hasattr(answer, 'model_dump'):
+        answer = answer.model_dump()
+    pages = {}
+    for page in answer['pages']:
+        pages[str(page['page_id'])] = extract_listings(page)
+    return pages
+
+
+class _Pending:
+    def __init__(self, page, tokens, on_done, on_listing, signature=None, page_id=None, on_error=None):
+        self.page = page
+        self.tokens = tokens
+        self.on_done = on_done
+        self.on_listing = on_listing
+        self.on_error = on_error
+        self.signature = signature  # MinHash signature, when near-duplicates are indexed
+        # Id of the page within its pack; page numbers repeat across seeds
+        self.page_id = page_id
+
+
+class PagePacker:
+    """
+    Buffer small pages and extract them in packed requests.
+
+    add() calls on_done(formatted_data, token_counts, diff) for each page,
+    either right away or when its pack is sent; call flush() once all pages
+    are added so the last pack is sent too, or drop() if the run failed.
+    add() and flush() may be called from several threads; a pack is sent by
+    the thread whose page filled it.
+
+    Args:
+        fields (list): Fields to extract
+        model_selection (str): Model name, or a ModelRouter (never packed)
+        fingerprint_store (FingerprintStore): Optional store used to skip unchanged pages
+        budget (int): Page tokens per packed request, PACKING_SETTINGS['budget'] by default
+        near_duplicates (NearDuplicateIndex): Optional job index used to reuse extractions of near-duplicate pages
+    """
+
+    def __init__(self, fields, model_selection, fingerprint_store=None, budget=None, near_duplicates=None):
+        self.fields = fields
+        self.model_selection = model_selection
+        self.fingerprint_store = fingerprint_store
+        self.near_duplicates = near_duplicates
+        self.budget = budget or PACKING_SETTINGS['budget']
+        self.listing_model = create_dynamic_listing_model(fields)
+        self.container = create_listings_container_model(self.listing_model)
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.stats = {'packed_requests': 0, 'packed_pages': 0, 'fallback_pages': 0}
+
+    def _packable(self):
+        return not hasattr(self.model_selection, 'extract') and self.model_selection in PACKING_SETTINGS['models']
+
+    def _buffered_tokens(self):
+        return sum(pending.tokens for pending in self.buffer)
+
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def add(self, page, on_done, on_listing=None, on_error=None):
+        """
+        Extract a PageSnapshot now or queue it for the next packed request.
+
+        Args:
+            page (PageSnapshot): The page; its page_num is its id in the pack
+            on_done (callable): Called with (formatted_data, token_counts, diff)
+            on_listing (callable): Optional sink for each listing, as in format_data
+            on_error (callable): Called with the exception if the page's extraction
+                fails once it is in a pack; without it the exception propagates
+                to whichever caller sent the pack
+        """
+        if self.fingerprint_store is not None and page.url:
+            reused = reuse_unchanged(self.fingerprint_store, page, self.fields)
+            if reused is not None:
+                on_done(*reused)
+                return
+
+        signature = None
+        if self.near_duplicates is not None and page.url:
+            signature = self.near_duplicates.signature(page.markdown)
+            matched = self.near_duplicates.match(page.url, self.fields, signature)
+            if matched is not None:
+                # Reused, or only its changed listing blocks extracted; too small to pack
+                formatted_data, token_counts = extract_similar(
+                    self.near_duplicates, page, self.fields,
+                    lambda text: format_data(text, self.container, self.listing_model, self.model_selection,
+                                             on_listing, page.url),
+                    self.model_selection, signature, matched
+                )
+                self._finish(_Pending(page, 0, on_done, on_listing), formatted_data, token_counts)
+                return
+
+        tokens = page.token_count(self.model_selection)
+        pending = _Pending(page, tokens, on_done, on_listing, signature, on_error=on_error)
+        if not self._packable() or tokens > PACKING_SETTINGS['max_page_tokens']:
+            self._extract_single(pending)
+            return
+
+        if RULE_EXTRACTOR_SETTINGS['first_pass']:
+            rule_result = first_pass(page.markdown, self.fields)
+            if rule_result is not None:
+                print(f"Extracted {len(rule_result['listings'])} listings with rules, skipping the model")
+                if on_listing is not None:
+                    for listing in rule_result['listings']:
+                        on_listing(listing)
+                self._finish(pending, rule_result, {"input_tokens": 0, "output_tokens": 0})
+                return
+
+        packs = []
+        with self.lock:
+            self.next_id += 1
+            pending.page_id = str(self.next_id)
+            if self.buffer and self._buffered_tokens() + tokens > self.budget:
+                packs.append(self.buffer)
+                self.buffer = []
+            self.buffer.append(pending)
+            if len(self.buffer) >= PACKING_SETTINGS['max_pages']:
+                packs.append(self.buffer)
+                self.buffer = []
+        # Sent outside the lock, so other threads keep adding pages meanwhile
+        for pages in packs:
+            self._send(pages)
+
+    def _finish(self, pending, formatted_data, token_counts):
+        if pending.signature is not None:
+            self.near_duplicates.add(pending.page.url, self.fields, pending.page.markdown, formatted_data, pending.signature)
+        diff = None
+        if self.fingerprint_store is not None and pending.page.url:
+            diff = record_extraction(self.fingerprint_store, pending.page, self.fields, formatted_data)
+        pending.on_done(formatted_data, token_counts, diff)
+
+    def _extract_single(self, pending):
+        formatted_data, token_counts = format_data(
+            pending.page.markdown, self.container, self.listing_model, self.model_selection,
+            pending.on_listing, pending.page.url
+        )
+        self._finish(pending, formatted_data, token_counts)
+
+    def _settle(self, pending, work):
+        # One page failing mustn't take the rest of its pack with it
+        try:
+            work()
+        except Exception as e:
+            if pending.on_error is None:
+                raise
+            pending.on_error(e)
+
+    def _packed_data(self, pages):
+        delimiter = PACKING_SETTINGS['page_delimiter']
+        return "\n\n".join(f"{delimiter.format(page_id=pending.page_id)}\n{pending.page.markdown}" for pending in pages)
+
+    def _request(self, data):
+        packed_container = create_packed_container_model(self.listing_model)
+        if self.model_selection == "gemini-1.5-flash":
+            return handle_gemini(data, packed_container, PACKED_USER_MESSAGE)
+        return handle_openai(data, packed_container, self.model_selection, user_message=PACKED_USER_MESSAGE)
+
+    def flush(self):
+        """Send the buffered pages, packed if there is more than one."""
+        with self.lock:
+            pages, self.buffer = self.buffer, []
+        self._send(pages)
+
+    def drop(self):
+        """
+        Forget the buffered pages without extracting them, e.g. when the run failed.
+
+        Returns:
+            list: URLs of the dropped pages
+        """
+        with self.lock:
+            pages, self.buffer = self.buffer, []
+        return [pending.page.url for pending in pages]
+
+    def _send(self, pages):
+        if not pages:
+            return
+        if len(pages) == 1:
+            self._settle(pages[0], lambda: self._extract_single(pages[0]))
+            return
+
+        try:
+            answer, token_counts = self._request(self._packed_data(pages))
+        except Exception as e:
+            print(f"Packed request for {len(pages)} pages failed, extracting them one by one: {str(e)}")  # Debug print
+            self._count('fallback_pages', len(pages))
+            for pending in pages:
+                self._settle(pending, lambda: self._extract_single(pending))
+            return
+        try:
+            listings_by_page = _packed_pages(answer)
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Could not parse the packed answer for {len(pages)} pages: {str(e)}")  # Debug print
+            listings_by_page = {}
+
+        answered = [pending for pending in pages if pending.page_id in listings_by_page]
+        if answered:
+            self._count('packed_requests')
+            self._count('packed_pages', len(answered))
+            print(f"Packed {len(pages)} pages ({sum(p.tokens for p in pages)} tokens) into one request")  # Debug print
+
+        # Pages the packed answer doesn't cover still paid for their share of it
+        shares = split_token_counts(token_counts, [pending.tokens for pending in pages])
+        for pending, share in zip(pages, shares):
+            if pending in answered:
+                self._settle(pending, lambda: self._finish_packed(pending, listings_by_page[pending.page_id], share))
+                continue
+            print(f"Page {pending.page_id} missing from the packed answer, extracting it alone")  # Debug print
+            self._count('fallback_pages')
+            self._settle(pending, lambda: self._extract_missing(pending, share))
+
+    def _finish_packed(self, pending, listings, share):
+        if pending.on_listing is not None:
+            for listing in listings:
+                pending.on_listing(listing)
+        self._finish(pending, {'listings': listings}, share)
+
+    def _extract_missing(self, pending, share):
+        formatted_data, single_counts = format_data(
+            pending.page.markdown, self.container, self.listing_model, self.model_selection,
+            pending.on_listing, pending.page.url
+        )
+        self._finish(pending, formatted_data, add_token_counts(single_counts, share))
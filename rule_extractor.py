@@ -0,0 +1,122 @@
+"""
+Rule-based listing extraction from clean_html markers.
+
+clean_html tags every product it recognises with PRODUCT_TITLE, PRODUCT_STATUS
+and PRODUCT_PRICE lines right after its title. A single scan with one
+precompiled pattern finds all markers in document order: each title starts a
+new listing and the markers after it belong to that listing. format_data uses
+this as a zero-cost first pass before any model (off by default), and the
+Ollama handler uses it as its fallback.
+
+The markers only cover the products clean_html recognised. Before the model
+is skipped, the listings found are compared with the prices on the whole
+page: a page where most priced lines belong to no marked listing (other
+card layouts, a product page with a few marked recommendations) still goes
+to the model.
+"""
+
+import re
+
+from assets import FIELD_SYNONYMS, RULE_EXTRACTOR_SETTINGS
+
+# The pattern skips the blanks and emphasis before a value; trailing ones are stripped
+MARKER_PATTERN = re.compile(r'PRODUCT_(TITLE|PRICE|STATUS):[ \t*_]*([^\n]*)')
+_TRAILING = ' \t\r*_'
+PRICE_PATTERN = re.compile(r'(?:[€$£]\s?\d[\d\s.,]*\d|\d[\d\s.,]*\d\s?(?:€|\$|£|EUR|USD))')
+_NON_DIGITS = re.compile(r'\D')
+
+# Marker name -> field it fills
+MARKER_FIELDS = {'TITLE': 'title', 'PRICE': 'price', 'STATUS': 'status'}
+
+
+def extract_with_rules(markdown):
+    """
+    Pair up the clean_html markers of a page into listings.
+
+    Returns:
+        dict: {"listings": [{"title", "price", "status"}, ...]}, empty if the
+        page has no markers
+    """
+    listings = []
+    current = None
+    for marker, value in MARKER_PATTERN.findall(markdown):
+        if marker == 'TITLE':
+            current = {'title': value.rstrip(_TRAILING), 'price': '', 'status': ''}
+            listings.append(current)
+        elif current is None:
+            continue
+        elif marker == 'PRICE':
+            if not current['price']:
+                # "3 999,00 €" -> "3999,00"
+                current['price'] = ''.join(value.split()).rstrip('*_€')
+        elif not current['status']:
+            current['status'] = value.rstrip(_TRAILING)
+    return {'listings': listings}
+
+
+def map_rule_fields(fields):
+    """
+    Map requested fields onto marker fields, using FIELD_SYNONYMS.
+
+    Returns:
+        dict: requested field -> marker field, or None if a field has no marker
+    """
+    mapping = {}
+    for field in fields:
+        name = field.lower()
+        for marker_field in MARKER_FIELDS.values():
+            if name == marker_field or name in FIELD_SYNONYMS.get(marker_field, []) or marker_field in FIELD_SYNONYMS.get(name, []):
+                mapping[field] = marker_field
+                break
+        else:
+            return None
+    return mapping
+
+
+def page_coverage(markdown, listings):
+    """
+    Share of the page's priced lines accounted for by the marked listings.
+
+    A line outside the markers whose price is none of the marked prices is
+    counted as a listing the markers missed.
+
+    Returns:
+        float: Marked listings / (marked listings + unaccounted priced lines)
+    """
+    marked_prices = {_NON_DIGITS.sub('', listing['price']) for listing in listings if listing['price']}
+    missed = 0
+    for line in markdown.splitlines():
+        if 'PRODUCT_' in line:
+            continue
+        prices = PRICE_PATTERN.findall(line)
+        if prices and not any(_NON_DIGITS.sub('', price) in marked_prices for price in prices):
+            missed += 1
+    return len(listings) / (len(listings) + missed) if listings else 0.0
+
+
+def first_pass(markdown, fields, min_fill_ratio=RULE_EXTRACTOR_SETTINGS['min_fill_ratio']):
+    """
+    Extract the requested fields with rules alone, when that is good enough.
+
+    Returns:
+        dict: {"listings": [...]} keyed by the requested field names, or None
+        when a field has no marker, the page has no markers, too few values
+        were found, or the markers cover too little of the page
+    """
+    if 'PRODUCT_TITLE:' not in markdown:
+        return None
+    mapping = map_rule_fields(fields)
+    if not mapping:
+        return None
+    listings = extract_with_rules(markdown)['listings']
+    if len(listings) < RULE_EXTRACTOR_SETTINGS['min_listings']:
+        return None
+    rows = [{field: listing[marker_field] for field, marker_field in mapping.items()} for listing in listings]
+    filled = sum(1 for row in rows for value in row.values() if value)
+    if filled < min_fill_ratio * len(rows) * len(mapping):
+        return None
+    coverage = page_coverage(markdown, listings)
+    if coverage < RULE_EXTRACTOR_SETTINGS['min_page_coverage']:
+        print(f"Rule markers cover {coverage:.0%} of the priced lines on the page, using the model")  # Debug print
+        return None
+    return {'listings': rows}
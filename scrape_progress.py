@@ -0,0 +1,94 @@
+"""
+Progress reporting and cancellation for scrape runs.
+
+A ScrapeProgress is handed down to the scraping functions, which publish pages
+done, listings, tokens and cost as they go and stop at the next page boundary
+once cancel() has been called. Readers such as the Streamlit UI poll
+snapshot() from another thread.
+"""
+
+import threading
+import time
+from collections import deque
+
+from utils import extract_listings
+
+
+class ScrapeProgress:
+    """Thread-safe counters, recent listings and messages of one scrape run."""
+
+    def __init__(self, max_recent_listings=100, max_messages=50):
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.start_time = time.time()
+        self.pages_total = 0
+        self.pages_done = 0
+        self.listings = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.recent_listings = deque(maxlen=max_recent_listings)
+        self.messages = deque(maxlen=max_messages)
+        self.seed_progress = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def add_pages(self, count=1):
+        """Announce pages that are going to be scraped."""
+        with self.lock:
+            self.pages_total += count
+
+    def add_usage(self, token_counts, cost):
+        with self.lock:
+            self.input_tokens += token_counts.get('input_tokens', 0)
+            self.cached_input_tokens += token_counts.get('cached_input_tokens', 0)
+            self.output_tokens += token_counts.get('output_tokens', 0)
+            self.cost += cost
+
+    def page_done(self, formatted_data, token_counts=None, cost=0.0):
+        """Record a finished page with its extracted data and what it cost."""
+        listings = extract_listings(formatted_data)
+        with self.lock:
+            self.pages_done += 1
+            self.pages_total = max(self.pages_total, self.pages_done)
+            self.listings += len(listings)
+            self.recent_listings.extend(listings)
+        if token_counts:
+            self.add_usage(token_counts, cost)
+
+    def message(self, text, level='info'):
+        print(text)
+        with self.lock:
+            self.messages.append((level, text))
+
+    def eta(self):
+        """Seconds left, extrapolated from the average time per finished page."""
+        if not self.pages_done:
+            return None
+        elapsed = time.time() - self.start_time
+        return elapsed / self.pages_done * max(self.pages_total - self.pages_done, 0)
+
+    def snapshot(self):
+        """Return a copy of the current state, safe to render from another thread."""
+        with self.lock:
+            return {
+                'pages_done': self.pages_done,
+                'pages_total': self.pages_total,
+                'listings': self.listings,
+                'input_tokens': self.input_tokens,
+                'cached_input_tokens': self.cached_input_tokens,
+                'output_tokens': self.output_tokens,
+                'cost': self.cost,
+                'elapsed': time.time() - self.start_time,
+                'eta': self.eta() if self.pages_done else None,
+                'recent_listings': list(self.recent_listings),
+                'messages': list(self.messages),
+                'seed_progress': self.seed_progress,
+                'cancelled': self.cancelled
+            }
@@ -1,12 +1,23 @@
-from selenium_utils import fetch_html_selenium, setup_selenium
-from html_processing import html_to_markdown_with_readability
-from file_operations import save_raw_data, save_formatted_data
+from selenium_utils import fetch_html_selenium, setup_selenium, adaptive_scroll, TabPool
+from html_processing import html_to_markdown_with_readability, get_conversion_pool
+from file_operations import save_raw_data, save_formatted_data, StreamedListingWriter
 from api_handlers import format_data
 from utils import calculate_price, generate_unique_folder_name
 from data_models import create_dynamic_listing_model, create_listings_container_model
-from pagination_detector import detect_pagination_elements
+from change_detection import extract_or_reuse
+from near_duplicates import extract_or_reuse_similar
+from network_capture import (
+    ApiMappingStore, capture_json_responses, select_listing_endpoint,
+    next_page_request, fetch_api_page, resolve_path, map_items
+)
+from batch_extraction import BatchExtractionJob
+from session_store import SessionStore
+from crawl_frontier import CrawlFrontier
+from page_snapshot import PageSnapshot, SnapshotStats, pagination_page_urls
+from assets import API_CAPTURE_MAX_PAGES, BATCH_SETTINGS, FRONTIER_SETTINGS
 import os
-import time
+import json
+import requests
 
 def scrape_url(url, attended_mode=False, driver=None):
     """
@@ -16,7 +27,7 @@ def scrape_url(url, attended_mode=False, driver=None):
     raw_html = fetch_html_selenium(url, attended_mode=attended_mode, driver=driver)
     return html_to_markdown_with_readability(raw_html)
 
-def scrape_with_pagination(initial_url, model_selection, fields, output_folder, pagination_details="", driver=None, credentials=None, cookie_selectors=None):
+def scrape_with_pagination(initial_url, model_selection, fields, output_folder, pagination_details="", driver=None, credentials=None, cookie_selectors=None, fingerprint_store=None, progress=None, snapshot_stats=None, near_duplicates=None):
     """
     Scrape multiple pages starting from the initial URL, maintaining browser session.
     
@@ -29,16 +40,26 @@ def scrape_with_pagination(initial_url, model_selection, fields, output_folder,
         driver (selenium.webdriver): Optional existing browser session
         credentials (dict): Optional login credentials
         cookie_selectors (list): Optional cookie consent selectors
+        fingerprint_store (FingerprintStore): Optional store used to skip unchanged pages
+        progress (ScrapeProgress): Optional progress sink; cancelling it stops before the next page
+        snapshot_stats (SnapshotStats): Optional run-wide counters of page conversions
+        near_duplicates (NearDuplicateIndex): Optional job index used to reuse extractions of near-duplicate pages
     
     Returns:
-        tuple: (all_data, total_tokens, total_cost)
+        tuple: (all_data, totals); totals['first_page'] is the PageSnapshot of the
+        initial page, whose pagination result is memoised for the caller
     """
     # Initialize counters and data containers
     all_data = []
+    first_page = None
+    if snapshot_stats is None:
+        snapshot_stats = SnapshotStats()
     total_input_tokens = 0
+    total_cached_input_tokens = 0
     total_output_tokens = 0
     total_cost = 0
-    processed_urls = set()
+    # Deduplicates normalised page URLs and keeps the crawl delay between pages
+    frontier = CrawlFrontier(seen_path=FRONTIER_SETTINGS['seen_path'])
     
     # Create dynamic models
     DynamicListingModel = create_dynamic_listing_model(fields)
@@ -52,14 +73,18 @@ def scrape_with_pagination(initial_url, model_selection, fields, output_folder,
     
     try:
         # Process initial page
-        current_url = initial_url
+        frontier.add(initial_url, force=True)
+        current_url = frontier.next()
         page_num = 1
+        if progress is not None:
+            progress.add_pages(1)
         
-        while current_url and current_url not in processed_urls:
+        while current_url:
+            if progress is not None and progress.cancelled:
+                print("Scraping cancelled")
+                frontier.done(current_url)
+                break
             try:
-                # Mark URL as processed
-                processed_urls.add(current_url)
-                
                 # Navigate to the URL using the same driver
                 if page_num == 1:
                     # First page: handle login and cookies
@@ -70,20 +95,33 @@ def scrape_with_pagination(initial_url, model_selection, fields, output_folder,
                         credentials=credentials
                     )
                 else:
-                    # Subsequent pages: just navigate and get content
+                    # Subsequent pages: just navigate, load lazy content and get it
                     driver.get(current_url)
-                    time.sleep(2)  # Wait for page load
+                    adaptive_scroll(driver)
                     raw_html = driver.page_source
                 
-                markdown = html_to_markdown_with_readability(raw_html)
+                page = PageSnapshot(current_url, raw_html, page_num, snapshot_stats)
+                if first_page is None:
+                    first_page = page
+                markdown = page.markdown
                 save_raw_data(markdown, output_folder, f'rawData_{page_num}.md')
                 
-                # Format and save data
-                formatted_data, token_counts = format_data(
-                    markdown, DynamicListingsContainer, DynamicListingModel, model_selection
+                # Format and save data, reusing the last crawl's listings if the page is unchanged
+                streamed = StreamedListingWriter(output_folder, f'streamed_data_{page_num}.jsonl')
+                formatted_data, token_counts, diff = extract_or_reuse(
+                    fingerprint_store, page, fields,
+                    lambda: extract_or_reuse_similar(
+                        near_duplicates, page, fields,
+                        lambda text: format_data(text, DynamicListingsContainer, DynamicListingModel, model_selection,
+                                                 streamed, current_url),
+                        model_selection
+                    )
                 )
+                if diff is not None:
+                    save_raw_data(json.dumps(diff, indent=4), output_folder, f'diff_data_{page_num}.json')
                 input_tokens, output_tokens, cost = calculate_price(token_counts, model_selection)
                 total_input_tokens += input_tokens
+                total_cached_input_tokens += token_counts.get('cached_input_tokens', 0)
                 total_output_tokens += output_tokens
                 total_cost += cost
                 
@@ -92,54 +130,269 @@ def scrape_with_pagination(initial_url, model_selection, fields, output_folder,
                                  f'sorted_data_{page_num}.json', 
                                  f'sorted_data_{page_num}.xlsx')
                 all_data.append(formatted_data)
+                if progress is not None:
+                    progress.page_done(formatted_data, token_counts, cost)
                 
                 # Get next page URL if this is the first page
                 if page_num == 1:
-                    pagination_data, p_token_counts, p_cost = detect_pagination_elements(
-                        current_url, pagination_details, model_selection, markdown
-                    )
+                    pagination_data, p_token_counts, p_cost = page.pagination(pagination_details, model_selection)
                     
                     # Update totals with pagination detection costs
                     total_input_tokens += p_token_counts['input_tokens']
+                    total_cached_input_tokens += p_token_counts.get('cached_input_tokens', 0)
                     total_output_tokens += p_token_counts['output_tokens']
                     total_cost += p_cost
+                    if progress is not None:
+                        progress.add_usage(p_token_counts, p_cost)
                     
-                    # Get list of pages to process
-                    if hasattr(pagination_data, 'page_urls'):
-                        next_urls = pagination_data.page_urls
-                    elif isinstance(pagination_data, dict):
-                        next_urls = pagination_data.get('page_urls', [])
-                    else:
-                        next_urls = []
-                    
-                    # Filter out already processed URLs
-                    next_urls = [url for url in next_urls if url not in processed_urls]
-                    
-                    if next_urls:
-                        current_url = next_urls[0]  # Get the next URL to process
-                    else:
-                        current_url = None  # No more pages to process
-                else:
-                    current_url = None  # Stop after processing additional pages
+                    # Queue the next page unless it is the same page under another URL
+                    for url in pagination_page_urls(pagination_data):
+                        if frontier.add(url):
+                            if progress is not None:
+                                progress.add_pages(1)
+                            break
                 
+                frontier.done(current_url)
+                # Only the first page's pagination is followed, so stop after the page it found
+                current_url = frontier.next() if page_num == 1 else None
                 page_num += 1
-                time.sleep(2)  # Small delay between pages
                 
             except Exception as e:
                 print(f"Error processing page {current_url}: {str(e)}")
+                frontier.done(current_url)
                 current_url = None  # Stop on error
                 
     finally:
         # Only quit the driver if we created it
         if should_quit_driver and driver:
             driver.quit()
+        if fingerprint_store is not None:
+            fingerprint_store.save()
+        frontier.save()
     
-    return all_data, {
+    totals = {
         'input_tokens': total_input_tokens,
+        'cached_input_tokens': total_cached_input_tokens,
         'output_tokens': total_output_tokens,
-        'total_cost': total_cost
+        'total_cost': total_cost,
+        'first_page': first_page,
+        'snapshots': snapshot_stats.summary()
+    }
+    if fingerprint_store is not None:
+        totals['change_detection'] = fingerprint_store.summary()
+    return all_data, totals
+
+def scrape_with_api_capture(initial_url, fields, output_folder, driver=None, credentials=None, cookie_selectors=None, max_pages=API_CAPTURE_MAX_PAGES, progress=None):
+    """
+    Extract listings from the JSON API a page calls instead of from its DOM.
+    
+    The browser loads the first page once while its fetch/XHR responses are
+    recorded. The response holding the listing array is mapped onto the
+    requested fields, then further pages are requested straight from the API
+    endpoint over plain HTTP, with no LLM involved.
+    
+    Args:
+        initial_url (str): The starting URL to scrape
+        fields (list): Fields to extract from each listing
+        output_folder (str): Where to save the results
+        driver (selenium.webdriver): Optional browser session created with capture_network=True
+        credentials (dict): Optional login credentials
+        cookie_selectors (list): Optional cookie consent selectors
+        max_pages (int): Maximum number of API pages to request
+        progress (ScrapeProgress): Optional progress sink; cancelling it stops before the next page
+    
+    Returns:
+        tuple: (all_data, totals) like scrape_with_pagination, or None if the
+        page doesn't load its listings from a JSON API
+    """
+    should_quit_driver = False
+    if driver is None:
+        driver = setup_selenium(attended_mode=False, capture_network=True)
+        should_quit_driver = True
+    
+    mapping_store = ApiMappingStore()
+    try:
+        try:
+            driver.get_log('performance')  # Drop events from earlier navigations
+        except Exception as e:
+            print(f"Network capture not enabled on this driver: {str(e)}")
+            return None
+        
+        fetch_html_selenium(initial_url, driver=driver, cookie_selectors=cookie_selectors, credentials=credentials)
+        endpoint = select_listing_endpoint(capture_json_responses(driver), fields, mapping_store)
+        if endpoint is None:
+            print(f"No JSON listing endpoint found for {initial_url}")
+            return None
+        
+        request = endpoint['request']
+        print(f"Using API endpoint {request['url']} with mapping {endpoint['mapping']}")
+        mapping_store.record(request['url'], fields, endpoint['array_path'], endpoint['mapping'])
+        mapping_store.save()
+        
+        # The stored login session, topped up with whatever the browser holds now
+        http_session = SessionStore().requests_session(credentials) if credentials else requests.Session()
+        for cookie in driver.get_cookies():
+            http_session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+    finally:
+        if should_quit_driver and driver:
+            driver.quit()
+    
+    all_data = []
+    items = endpoint['items']
+    page_size = len(items)
+    seen_pages = set()
+    for page_num in range(1, max_pages + 1):
+        if progress is not None and progress.cancelled:
+            print("Scraping cancelled")
+            break
+        if page_num > 1:
+            page_request = next_page_request(request, page_size, page_num - 1)
+            if page_request is None:
+                break
+            try:
+                payload = fetch_api_page(page_request, session=http_session)
+            except Exception as e:
+                print(f"Error fetching API page {page_num}: {str(e)}")
+                break
+            items = resolve_path(payload, endpoint['array_path'])
+            if not isinstance(items, list) or not items:
+                break
+        
+        # Stop when the API ignores the page parameter and repeats itself
+        page_key = json.dumps(items, sort_keys=True, default=str)
+        if page_key in seen_pages:
+            break
+        seen_pages.add(page_key)
+        
+        save_raw_data(json.dumps(items, indent=4, default=str), output_folder, f'rawData_{page_num}.json')
+        formatted_data = {'listings': map_items(items, endpoint['mapping'])}
+        save_formatted_data(formatted_data, output_folder,
+                            f'sorted_data_{page_num}.json',
+                            f'sorted_data_{page_num}.xlsx')
+        all_data.append(formatted_data)
+        if progress is not None:
+            progress.add_pages(1)
+            progress.page_done(formatted_data)
+    
+    return all_data, {
+        'input_tokens': 0,
+        'cached_input_tokens': 0,
+        'output_tokens': 0,
+        'total_cost': 0,
+        'api_endpoint': request['url'],
+        'api_pages': len(all_data)
     }
 
+def scrape_with_batch_api(urls, model_selection, fields, output_folder, pagination_details="", use_pagination=False, driver=None, credentials=None, cookie_selectors=None, client=None, progress=None):
+    """
+    Fetch every page first, then extract them all in one OpenAI Batch API job.
+    
+    With pagination enabled, the pages found on each URL are fetched as well
+    (up to BATCH_SETTINGS['max_pages_per_seed'] per URL). Pagination detection
+    still runs synchronously since it decides what to fetch.
+    
+    Args:
+        urls (list): URLs to scrape
+        model_selection (str): OpenAI model with a BATCH_PRICING entry
+        fields (list): Fields to extract from each listing
+        output_folder (str): Where to save the results and the batch job state
+        pagination_details (str): Optional pagination hints for the model
+        use_pagination (bool): Whether to follow the pages found on each URL
+        driver (selenium.webdriver): Optional existing browser session
+        credentials (dict): Optional login credentials
+        cookie_selectors (list): Optional cookie consent selectors
+        client: Batch client, OpenAIBatchClient by default or LocalBatchClient for testing
+        progress (ScrapeProgress): Optional progress sink; cancelling it cancels the batch
+    
+    Returns:
+        tuple: (all_data, totals) like scrape_with_pagination, with the
+        'batch_id' and final 'batch_status' in totals
+    """
+    job = BatchExtractionJob(fields, model_selection, output_folder, client)
+    pagination_totals = {'input_tokens': 0, 'cached_input_tokens': 0, 'output_tokens': 0, 'total_cost': 0}
+    
+    should_quit_driver = False
+    if driver is None:
+        driver = setup_selenium(attended_mode=False, multi_tab=True)
+        should_quit_driver = True
+    
+    page_num = 0
+    
+    def add_page(page_url, raw_html, number):
+        if progress is not None:
+            progress.add_pages(1)
+        page = PageSnapshot(page_url, raw_html, number)
+        save_raw_data(page.markdown, output_folder, f'rawData_{number}.md')
+        job.add_page(number, page_url, page.markdown)
+        return page
+    
+    try:
+        for url in urls:
+            if progress is not None and progress.cancelled:
+                break
+            next_urls = []
+            try:
+                # Seed page: cookie consent, plus login on the very first page
+                raw_html = fetch_html_selenium(url, driver=driver, cookie_selectors=cookie_selectors,
+                                               credentials=credentials if page_num == 0 else None)
+                page_num += 1
+                page = add_page(url, raw_html, page_num)
+                
+                if use_pagination:
+                    pagination_data, p_token_counts, p_cost = page.pagination(pagination_details, model_selection)
+                    pagination_totals['input_tokens'] += p_token_counts['input_tokens']
+                    pagination_totals['cached_input_tokens'] += p_token_counts.get('cached_input_tokens', 0)
+                    pagination_totals['output_tokens'] += p_token_counts['output_tokens']
+                    pagination_totals['total_cost'] += p_cost
+                    if progress is not None:
+                        progress.add_usage(p_token_counts, p_cost)
+                    seen = {url}
+                    for next_url in pagination_page_urls(pagination_data):
+                        if next_url not in seen and len(seen) < BATCH_SETTINGS['max_pages_per_seed']:
+                            seen.add(next_url)
+                            next_urls.append(next_url)
+            except Exception as e:
+                print(f"Error fetching page {url}: {str(e)}")
+                continue
+            
+            if not next_urls:
+                continue
+            # The seed's other pages load side by side in tabs sharing its cookies. They
+            # finish in any order, so each is numbered by its place in the pagination
+            first_num = page_num + 1
+            page_num += len(next_urls)
+            with TabPool(driver) as tabs:
+                for index, page_url, raw_html in tabs.fetch_many(next_urls):
+                    if progress is not None and progress.cancelled:
+                        break
+                    if raw_html is None:
+                        continue
+                    try:
+                        add_page(page_url, raw_html, first_num + index)
+                    except Exception as e:
+                        print(f"Error fetching page {page_url}: {str(e)}")
+    finally:
+        if should_quit_driver and driver:
+            driver.quit()
+    
+    if not job.pages or (progress is not None and progress.cancelled):
+        return [], dict(pagination_totals, batch_id=None, batch_status='cancelled' if job.pages else 'empty')
+    
+    job.submit()
+    if progress is not None:
+        progress.message(f"Submitted {len(job.pages)} pages as batch {job.batch_id}. Job state is saved in {output_folder}.")
+    status = job.wait(progress)
+    if status != 'completed':
+        if progress is not None:
+            progress.message(f"Batch {job.batch_id} ended as '{status}'. Collect it later with BatchExtractionJob.resume('{output_folder}').", 'warning')
+        return [], dict(pagination_totals, batch_id=job.batch_id, batch_status=status)
+    
+    all_data, totals = job.collect(progress)
+    for key, value in pagination_totals.items():
+        totals[key] += value
+    totals['batch_status'] = status
+    return all_data, totals
+
 # Re-export all the functions that streamlit_app.py expects from scraper.py
 __all__ = [
     'fetch_html_selenium',
@@ -148,10 +401,13 @@ __all__ = [
     'save_formatted_data',
     'calculate_price',
     'html_to_markdown_with_readability',
+    'get_conversion_pool',
     'create_dynamic_listing_model',
     'create_listings_container_model',
     'setup_selenium',
     'generate_unique_folder_name',
     'scrape_url',
-    'scrape_with_pagination'
+    'scrape_with_pagination',
+    'scrape_with_api_capture',
+    'scrape_with_batch_api'
 ]
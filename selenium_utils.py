@@ -1,5 +1,7 @@
-import random
+import os
 import time
+import threading
+from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
@@ -7,8 +9,13 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
-from assets import HEADLESS_OPTIONS, HEADLESS_OPTIONS_DOCKER
+from assets import HEADLESS_OPTIONS, HEADLESS_OPTIONS_DOCKER, NUMBER_SCROLL, SCROLL_SETTINGS, LISTING_NODE_SELECTOR, TIMEOUT_SETTINGS, CONSENT_SETTINGS, TAB_POOL_SETTINGS, CDP_SETTINGS, DRIVER_CACHE_SETTINGS, LAUNCH_PROFILES, DEFAULT_LAUNCH_PROFILE
+from network_capture import enable_network_capture
+from session_store import SessionStore, login_url
+from cookie_consent import consent_memory, domain_of, FIND_AND_CLICK_SCRIPT
+from cdp_transport import CDPError, session_for_driver, navigate as cdp_navigate, capture_html as cdp_capture_html
+from driver_cache import resolve_chromedriver, profile_template_ready, finish_profile_template, new_profile_dir, release_profile_dir
+from browser_governor import get_governor
 
 def is_running_in_docker():
     try:
@@ -17,15 +24,35 @@ def is_running_in_docker():
     except Exception:
         return False
 
-def setup_selenium(attended_mode=False):
-    print(f"Setting up Selenium with attended_mode={attended_mode}")  # Debug print
+_template_lock = threading.Lock()
+
+def chrome_options(capture_network=False, multi_tab=False, profile=None, headless=None):
+    """
+    Chrome options shared by every browser the scraper launches.
+
+    Args:
+        profile (str): Name in LAUNCH_PROFILES, DEFAULT_LAUNCH_PROFILE if None
+        headless (bool): Overrides the profile's headless setting; attended runs need a window
+    """
     options = Options()
-    service = Service(ChromeDriverManager().install())
+    launch = LAUNCH_PROFILES[profile or DEFAULT_LAUNCH_PROFILE]
+    headless = launch['headless'] if headless is None else headless
+
+    if capture_network:
+        # Record fetch/XHR traffic so listings can be read from API responses
+        enable_network_capture(options)
+
+    if multi_tab:
+        # Keep pages in background tabs loading at full speed for TabPool
+        for option in TAB_POOL_SETTINGS['browser_args']:
+            options.add_argument(option)
 
     if is_running_in_docker():
         for option in HEADLESS_OPTIONS_DOCKER:
             options.add_argument(option)
     else:
+        if headless:
+            options.add_argument('--headless=new')
         for option in HEADLESS_OPTIONS:
             options.add_argument(option)
         
@@ -35,7 +62,71 @@ def setup_selenium(attended_mode=False):
         options.add_experimental_option("excludeSwitches", ["enable-automation"])
         options.add_experimental_option('useAutomationExtension', False)
 
-    driver = webdriver.Chrome(service=service, options=options)
+    for option in launch['args']:
+        if option not in options.arguments:
+            options.add_argument(option)
+
+    return options
+
+def ensure_profile_template():
+    """Launch Chrome once on the profile template so later browsers start from an initialised profile."""
+    with _template_lock:
+        if profile_template_ready():
+            return
+        print("Creating Chrome profile template")  # Debug print
+        template = DRIVER_CACHE_SETTINGS['profile_template']
+        release_profile_dir(template)
+        options = chrome_options()
+        options.add_argument(f"--user-data-dir={os.path.abspath(template)}")
+        for option in DRIVER_CACHE_SETTINGS['startup_args']:
+            options.add_argument(option)
+        driver = webdriver.Chrome(service=Service(resolve_chromedriver()), options=options)
+        try:
+            driver.get('about:blank')
+            time.sleep(DRIVER_CACHE_SETTINGS['template_settle'])  # Let first-run tasks finish writing the profile
+        finally:
+            driver.quit()
+        finish_profile_template()
+
+def setup_selenium(attended_mode=False, capture_network=False, multi_tab=False, profile=None):
+    print(f"Setting up Selenium with attended_mode={attended_mode}, capture_network={capture_network}, multi_tab={multi_tab}, profile={profile or DEFAULT_LAUNCH_PROFILE}")  # Debug print
+    service = Service(resolve_chromedriver())
+    # The user works in the browser window during attended runs
+    options = chrome_options(capture_network, multi_tab, profile, headless=False if attended_mode else None)
+
+    profile_dir = None
+    if DRIVER_CACHE_SETTINGS['use_profile_template']:
+        try:
+            ensure_profile_template()
+        except Exception as e:
+            print(f"Could not create the profile template, starting with a blank profile: {str(e)}")  # Debug print
+        profile_dir = new_profile_dir()
+        options.add_argument(f"--user-data-dir={profile_dir}")
+        for option in DRIVER_CACHE_SETTINGS['startup_args']:
+            options.add_argument(option)
+
+    # Wait for, or make room for, a browser slot under the process-wide cap
+    governor = get_governor()
+    governor.admit()
+    try:
+        driver = webdriver.Chrome(service=service, options=options)
+    except Exception:
+        governor.release_slot()
+        if profile_dir:
+            release_profile_dir(profile_dir)
+        raise
+
+    if profile_dir:
+        # The profile copy belongs to this browser alone; remove it once the browser is gone
+        quit_driver = driver.quit
+        def quit_and_release():
+            try:
+                quit_driver()
+            finally:
+                release_profile_dir(profile_dir)
+        driver.quit = quit_and_release
+    # An attended browser waits on the user, however long that takes
+    governor.register(driver, pinned=attended_mode)
     
     # Set window size for better rendering
     driver.set_window_size(1920, 1080)
@@ -83,9 +174,100 @@ def wait_for_content_load(driver, timeout=10):
         print("Timeout waiting for content to load")  # Debug print
         return False
 
+# Scrolls to the bottom, then resolves once the DOM has been quiet for settle_ms
+# after the last mutation, or after idle_ms if nothing changes at all.
+_SCROLL_STEP_SCRIPT = """
+const [selector, idleMs, settleMs, done] = arguments;
+const snapshot = () => ({
+    height: document.body.scrollHeight,
+    items: document.querySelectorAll(selector).length
+});
+let timer = null;
+const observer = new MutationObserver(() => {
+    clearTimeout(timer);
+    timer = setTimeout(finish, settleMs);
+});
+function finish() {
+    observer.disconnect();
+    done(snapshot());
+}
+observer.observe(document.body, {childList: true, subtree: true});
+timer = setTimeout(finish, idleMs);
+window.scrollTo(0, document.body.scrollHeight);
+"""
+
+def adaptive_scroll(driver, max_scrolls=None, max_items=None, max_time=None, listing_selector=LISTING_NODE_SELECTOR):
+    """
+    Scroll until the page stops growing, waiting on DOM mutations instead of fixed sleeps.
+    
+    Stops once neither scrollHeight nor the listing-node count has grown for
+    NUMBER_SCROLL scrolls in a row, or when one of the max-scrolls, max-items
+    or max-time limits is reached.
+    
+    Returns:
+        list: one dict per scroll with the page 'height', total 'items' and 'new_items' it loaded
+    """
+    max_scrolls = max_scrolls or SCROLL_SETTINGS["max_scrolls"]
+    max_items = max_items or SCROLL_SETTINGS["max_items"]
+    max_time = max_time or SCROLL_SETTINGS["max_time"]
+    driver.set_script_timeout(TIMEOUT_SETTINGS["script"])
+    
+    start_time = time.time()
+    previous = driver.execute_script(
+        "return {height: document.body.scrollHeight, items: document.querySelectorAll(arguments[0]).length};",
+        listing_selector
+    )
+    report = []
+    idle_scrolls = 0
+    while len(report) < max_scrolls and idle_scrolls < NUMBER_SCROLL:
+        if previous["items"] >= max_items or time.time() - start_time > max_time:
+            break
+        try:
+            current = driver.execute_async_script(
+                _SCROLL_STEP_SCRIPT, listing_selector, SCROLL_SETTINGS["idle_ms"], SCROLL_SETTINGS["settle_ms"]
+            )
+        except TimeoutException:
+            # The page kept mutating for the whole script timeout, e.g. a carousel
+            current = driver.execute_script(
+                "return {height: document.body.scrollHeight, items: document.querySelectorAll(arguments[0]).length};",
+                listing_selector
+            )
+        new_items = current["items"] - previous["items"]
+        grew = current["height"] > previous["height"] or new_items > 0
+        idle_scrolls = 0 if grew else idle_scrolls + 1
+        report.append({"height": current["height"], "items": current["items"], "new_items": new_items})
+        print(f"Scroll {len(report)}: {new_items} new items ({current['items']} total, height {current['height']})")  # Debug print
+        previous = current
+    
+    print(f"Adaptive scroll finished after {len(report)} scrolls in {time.time() - start_time:.1f}s")  # Debug print
+    return report
+
+def _cookie_key(cookie):
+    return cookie['name'], cookie.get('domain', ''), cookie.get('path', '/')
+
+def _cookie_for_host(cookie, host):
+    """Whether the browser would send the cookie to host."""
+    cookie_domain = cookie.get('domain', '').lstrip('.').lower()
+    return bool(cookie_domain) and (host == cookie_domain or host.endswith('.' + cookie_domain))
+
+def apply_consent_cookies(driver, url):
+    """
+    Set the consent cookies remembered for the URL's domain before navigating,
+    so the banner never shows up. Returns True if cookies were set.
+    """
+    entry = consent_memory.get(domain_of(url))
+    if not entry or not entry['cookies']:
+        return False
+    driver.execute_cdp_cmd('Network.setCookies', {'cookies': entry['cookies']})
+    return True
+
 def handle_cookies(driver, cookie_selectors=None):
     """
     Try to close cookie popups using provided selectors or default ones.
+    All selectors are checked in a single JS pass. The outcome is remembered
+    per domain: a domain without a banner is skipped (unless cookie_selectors
+    are given, which are always tried), and one whose consent cookies are
+    already set in the browser needs no click.
     """
     print("Handling cookies...")  # Debug print
     # Default cookie consent selectors for common patterns
@@ -99,37 +281,51 @@ def handle_cookies(driver, cookie_selectors=None):
         {"type": "class", "value": "accept-cookies"}
     ]
 
+    domain = domain_of(driver.current_url)
+    entry = consent_memory.get(domain)
+    if entry is not None:
+        if entry['selector'] is None and not cookie_selectors:
+            print(f"No cookie banner expected on {domain}")  # Debug print
+            return False
+        browser_cookies = {cookie['name'] for cookie in driver.get_cookies()}
+        if entry['cookies'] and all(cookie['name'] in browser_cookies for cookie in entry['cookies']):
+            print(f"Cookie consent already given on {domain}")  # Debug print
+            return True
+
     selectors_to_try = cookie_selectors if cookie_selectors else default_selectors
+    if entry is not None and entry['selector'] is not None:
+        # Try the selector that worked last time first
+        selectors_to_try = [entry['selector']] + [s for s in selectors_to_try if s != entry['selector']]
     print(f"Using cookie selectors: {selectors_to_try}")  # Debug print
 
-    for selector in selectors_to_try:
-        try:
-            if selector["type"] == "id":
-                element = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.ID, selector["value"]))
-                )
-                print(f"Found cookie button by ID: {selector['value']}")  # Debug print
-            elif selector["type"] == "class":
-                element = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.CLASS_NAME, selector["value"]))
-                )
-                print(f"Found cookie button by class: {selector['value']}")  # Debug print
-            elif selector["type"] == "xpath":
-                element = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.XPATH, selector["value"]))
-                )
-                print(f"Found cookie button by XPath: {selector['value']}")  # Debug print
-            
-            print("Clicking cookie button...")  # Debug print
-            driver.execute_script("arguments[0].click();", element)
-            time.sleep(1)  # Wait for popup to close
-            return True
-        except (TimeoutException, NoSuchElementException):
-            print(f"Cookie button not found with selector: {selector}")  # Debug print
-            continue
-    
-    print("No cookie buttons found")  # Debug print
-    return False
+    cookies_before = {_cookie_key(cookie) for cookie in driver.execute_cdp_cmd('Network.getAllCookies', {})['cookies']}
+    driver.set_script_timeout(TIMEOUT_SETTINGS["script"])
+    try:
+        clicked = driver.execute_async_script(
+            FIND_AND_CLICK_SCRIPT, selectors_to_try, CONSENT_SETTINGS['banner_timeout_ms']
+        )
+    except TimeoutException:
+        clicked = None
+
+    if clicked is None:
+        print("No cookie buttons found")  # Debug print
+        if entry is None and not cookie_selectors:
+            # Keep a learned selector: its banner may just be dismissed in this browser already.
+            # Explicit selectors that found nothing prove nothing: the banner may come later
+            consent_memory.record(domain, None)
+        return False
+
+    selector = selectors_to_try[clicked]
+    print(f"Clicked cookie button: {selector}")  # Debug print
+    time.sleep(CONSENT_SETTINGS['cookie_wait'])  # Let the consent script write its cookies
+    # Only what the click set for this site: analytics and other domains' cookies aren't consent
+    host = urlparse(driver.current_url).hostname or ''
+    consent_cookies = [
+        cookie for cookie in driver.execute_cdp_cmd('Network.getAllCookies', {})['cookies']
+        if _cookie_key(cookie) not in cookies_before and _cookie_for_host(cookie, host)
+    ]
+    consent_memory.record(domain, selector, consent_cookies)
+    return True
 
 def verify_login_success(driver, timeout=10):
     """Verify that login was successful by checking for common indicators."""
@@ -157,16 +353,23 @@ def verify_login_success(driver, timeout=10):
 def handle_login(driver, credentials):
     """
     Try to log in using provided credentials.
+    A session saved by an earlier login is restored first; the login form is
+    only filled in when there is no stored session or it is no longer valid.
     """
     if not credentials:
         print("No credentials provided")  # Debug print
         return False
 
+    target_url = "https://weboutilmag.sigest.services/shop-product-prices/management"
+    session_store = SessionStore()
+    if session_store.restore(driver, credentials, probe_url=target_url):
+        return True
+
     try:
         # Go to login page first
-        login_url = credentials.get('login_url', 'https://sigest.services/login')
-        print(f"Navigating to login page: {login_url}")  # Debug print
-        driver.get(login_url)
+        url = login_url(credentials)
+        print(f"Navigating to login page: {url}")  # Debug print
+        driver.get(url)
         time.sleep(3)  # Wait for page load
         
         # Debug print current page source
@@ -240,10 +443,10 @@ def handle_login(driver, credentials):
         if verify_login_success(driver):
             print("Login verification successful")  # Debug print
             # After successful login, navigate to the target URL
-            target_url = "https://weboutilmag.sigest.services/shop-product-prices/management"
             print(f"Navigating to target URL: {target_url}")  # Debug print
             driver.get(target_url)
             time.sleep(3)  # Additional wait after navigation
+            session_store.save(driver, credentials)
             return True
         else:
             print("Login verification failed")  # Debug print
@@ -253,12 +456,34 @@ def handle_login(driver, credentials):
         print(f"Login failed with error: {str(e)}")  # Debug print
         return False
 
+def _cdp_session(driver):
+    """The driver's DevTools session when the CDP transport is on, else None."""
+    if CDP_SETTINGS['transport'] != 'cdp':
+        return None
+    try:
+        return session_for_driver(driver)
+    except Exception as e:
+        print(f"CDP transport unavailable, using WebDriver: {str(e)}")  # Debug print
+        return None
+
+def _navigate(driver, url, cdp):
+    """Navigate with CDP lifecycle events if possible, else driver.get and a fixed wait."""
+    if cdp is not None:
+        try:
+            cdp_navigate(cdp, url)
+            return
+        except CDPError as e:
+            print(f"CDP navigation failed, using WebDriver: {str(e)}")  # Debug print
+    driver.get(url)
+    time.sleep(3)  # Wait for page load
+
 def fetch_html_selenium(url, attended_mode=False, driver=None, cookie_selectors=None, credentials=None):
     print(f"fetch_html_selenium called with attended_mode={attended_mode}, credentials present={bool(credentials)}")  # Debug print
     
     if driver is None:
         driver = setup_selenium(attended_mode)
         should_quit = True
+        cdp = None if attended_mode else _cdp_session(driver)
         
         if not attended_mode:
             # Handle login first if credentials provided
@@ -270,42 +495,42 @@ def fetch_html_selenium(url, attended_mode=False, driver=None, cookie_selectors=
                     if should_quit:
                         driver.quit()
                     return None
-                print("Login successful, waiting before proceeding...")  # Debug print
-                time.sleep(3)  # Wait after login
+                print("Login successful")  # Debug print
             else:
                 # If no credentials, just navigate to the URL
                 print(f"No credentials provided, navigating directly to: {url}")  # Debug print
-                driver.get(url)
-                time.sleep(3)  # Wait for page load
+                apply_consent_cookies(driver, url)
+                _navigate(driver, url, cdp)
             
             # Handle cookies
             handle_cookies(driver, cookie_selectors)
     else:
         should_quit = False
+        cdp = None if attended_mode else _cdp_session(driver)
         if not attended_mode:
             print(f"Using existing driver to navigate to: {url}")  # Debug print
-            driver.get(url)
-            time.sleep(3)  # Wait for page load
+            apply_consent_cookies(driver, url)
+            _navigate(driver, url, cdp)
             handle_cookies(driver, cookie_selectors)
 
     try:
         if not attended_mode:
+            if cdp is not None:
+                # Wait, scroll and capture in a few direct DevTools round trips
+                try:
+                    html, _ = cdp_capture_html(cdp)
+                    return html
+                except CDPError as e:
+                    print(f"CDP capture failed, using WebDriver: {str(e)}")  # Debug print
+            
             # Wait for dynamic content to load
             wait_for_content_load(driver)
             
-            # Scroll behavior for better content loading
-            total_height = int(driver.execute_script("return document.body.scrollHeight"))
-            for i in range(3):
-                height = total_height * (i + 1) / 3
-                driver.execute_script(f"window.scrollTo(0, {height});")
-                time.sleep(random.uniform(1.5, 2.0))
+            # Scroll until infinite-scroll content stops loading
+            adaptive_scroll(driver)
             
             # Scroll back to top
             driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(1)
-            
-            # Additional wait for any lazy-loaded content
-            time.sleep(2)
         
         html = driver.page_source
         return html
@@ -313,3 +538,187 @@ def fetch_html_selenium(url, attended_mode=False, driver=None, cookie_selectors=
         if should_quit:
             print("Quitting driver")  # Debug print
             driver.quit()
+
+# One poll of a multiplexed tab: readiness and size, plus a scroll once loaded.
+# window.__tabPoolStale is set on the previous document before navigating, so
+# a readyState of 'complete' from the old page isn't mistaken for the new one.
+_TAB_POLL_SCRIPT = """
+const [selector, scroll] = arguments;
+const body = document.body;
+const state = {
+    stale: window.__tabPoolStale === true,
+    ready: document.readyState === 'complete',
+    height: body ? body.scrollHeight : 0,
+    items: document.querySelectorAll(selector).length
+};
+if (state.ready && !state.stale && scroll && body) window.scrollTo(0, body.scrollHeight);
+return state;
+"""
+
+class _Tab:
+    """A tab of a TabPool and the page loading in it."""
+
+    def __init__(self, handle, context_id=None):
+        self.handle = handle
+        self.context_id = context_id
+        self.url = None
+        self.index = None  # position of url in the fetch_many list
+        self.started = 0.0
+        self.loaded = False
+        self.previous = None
+        self.idle_scrolls = 0
+        self.scrolls = 0
+
+    def start(self, url):
+        self.url = url
+        self.started = time.time()
+        self.loaded = False
+        self.previous = None
+        self.idle_scrolls = 0
+        self.scrolls = 0
+
+class TabPool:
+    """
+    Load several pages at once in tabs of one browser.
+
+    WebDriver drives one window at a time, but a page keeps loading, running
+    scripts and fetching lazy content while another tab has focus. fetch_many
+    starts a navigation in every free tab without waiting for it, then polls
+    the tabs in turn: each poll checks the tab's readiness and, once loaded,
+    takes one scroll step, until the page stops growing as in adaptive_scroll.
+    K concurrent pages then cost one browser process tree plus K renderers
+    instead of K browsers.
+
+    Tabs share the driver's cookies, so logins and consent carry over. With
+    isolate_contexts every tab gets its own browser context (an incognito-like
+    cookie jar) instead, for pages that must not share a session: those tabs
+    start logged out and without the saved consent cookies, so banners and
+    login walls come back.
+
+    Args:
+        driver (selenium.webdriver): Browser to open the tabs in, ideally set up
+            with setup_selenium(multi_tab=True) so background tabs aren't throttled
+        tabs (int): Pages loaded at once
+        isolate_contexts (bool): Give each tab its own cookie jar
+        listing_selector (str): Listing nodes counted while scrolling
+    """
+
+    def __init__(self, driver, tabs=None, isolate_contexts=None, listing_selector=LISTING_NODE_SELECTOR):
+        self.driver = driver
+        self.size = tabs or TAB_POOL_SETTINGS['tabs']
+        self.isolate_contexts = TAB_POOL_SETTINGS['isolate_contexts'] if isolate_contexts is None else isolate_contexts
+        self.listing_selector = listing_selector
+        self.tabs = []
+        self.home_handle = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        self.home_handle = self.driver.current_window_handle
+        for _ in range(self.size):
+            if self.isolate_contexts:
+                context_id = self.driver.execute_cdp_cmd('Target.createBrowserContext', {'disposeOnDetach': True})['browserContextId']
+                handles_before = set(self.driver.window_handles)
+                target_id = self.driver.execute_cdp_cmd('Target.createTarget', {'url': 'about:blank', 'browserContextId': context_id})['targetId']
+                new_handles = set(self.driver.window_handles) - handles_before
+                # chromedriver names windows after their target id; fall back to the new handle otherwise
+                handle = target_id if target_id in new_handles else new_handles.pop()
+                self.tabs.append(_Tab(handle, context_id))
+            else:
+                self.driver.switch_to.new_window('tab')
+                self.tabs.append(_Tab(self.driver.current_window_handle))
+        print(f"Opened {len(self.tabs)} tabs (isolated contexts: {self.isolate_contexts})")  # Debug print
+        if self.isolate_contexts:
+            print("Warning: isolated tabs don't get the browser's login or consent cookies")  # Debug print
+        return self
+
+    def close(self):
+        for tab in self.tabs:
+            try:
+                if tab.context_id:
+                    self.driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': tab.context_id})
+                else:
+                    self.driver.switch_to.window(tab.handle)
+                    self.driver.close()
+            except Exception as e:
+                print(f"Could not close tab {tab.handle}: {str(e)}")  # Debug print
+        self.tabs = []
+        if self.home_handle is not None:
+            self.driver.switch_to.window(self.home_handle)
+
+    def _navigate(self, tab, url):
+        self.driver.switch_to.window(tab.handle)
+        if not tab.context_id:
+            apply_consent_cookies(self.driver, url)
+        tab.start(url)
+        # Assigning location returns at once, unlike driver.get which blocks until the load event
+        self.driver.execute_script("window.__tabPoolStale = true; window.location.href = arguments[0];", url)
+
+    def _poll(self, tab, scroll):
+        """Advance one tab by one step; returns True once its page is done."""
+        self.driver.switch_to.window(tab.handle)
+        state = self.driver.execute_script(_TAB_POLL_SCRIPT, self.listing_selector, scroll)
+        elapsed = time.time() - tab.started
+        if not tab.loaded:
+            if (state['ready'] and not state['stale']) or elapsed > TIMEOUT_SETTINGS['page_load']:
+                tab.loaded = True
+                tab.previous = state
+            return False
+        grew = state['height'] > tab.previous['height'] or state['items'] > tab.previous['items']
+        tab.idle_scrolls = 0 if grew else tab.idle_scrolls + 1
+        tab.scrolls += 1
+        tab.previous = state
+        return (not scroll
+                or tab.idle_scrolls >= NUMBER_SCROLL
+                or tab.scrolls >= SCROLL_SETTINGS['max_scrolls']
+                or state['items'] >= SCROLL_SETTINGS['max_items']
+                or elapsed > SCROLL_SETTINGS['max_time'])
+
+    def fetch_many(self, urls, scroll=True):
+        """
+        Load the URLs across the pool's tabs.
+
+        Yields:
+            tuple: (index, url, html) in the order the pages finish, index
+            being the URL's position in urls; html is None if the tab failed
+            on that page
+        """
+        if not self.tabs:
+            self.open()
+        waiting = list(enumerate(urls))
+        busy = []
+        free = list(self.tabs)
+        poll_interval = TAB_POOL_SETTINGS['poll_interval']
+        while waiting or busy:
+            while waiting and free:
+                tab = free.pop()
+                index, url = waiting.pop(0)
+                try:
+                    self._navigate(tab, url)
+                    tab.index = index
+                    busy.append(tab)
+                except Exception as e:
+                    print(f"Could not start loading {url} in a tab: {str(e)}")  # Debug print
+                    free.append(tab)
+                    yield index, url, None
+            round_start = time.time()
+            for tab in list(busy):
+                try:
+                    if not self._poll(tab, scroll):
+                        continue
+                    self.driver.execute_script("window.scrollTo(0, 0);")
+                    html = self.driver.page_source
+                except Exception as e:
+                    print(f"Tab failed on {tab.url}: {str(e)}")  # Debug print
+                    html = None
+                busy.remove(tab)
+                free.append(tab)
+                print(f"Tab finished {tab.url} after {time.time() - tab.started:.1f}s and {tab.scrolls} scrolls")  # Debug print
+                yield tab.index, tab.url, html
+            # Give the pages time to load and react to the scroll before the next round
+            time.sleep(max(0.0, poll_interval - (time.time() - round_start)))
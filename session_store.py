@@ -0,0 +1,165 @@
+"""
+Persistent authenticated browser sessions.
+
+After a successful login the browser's cookies, localStorage and
+sessionStorage are saved, encrypted, under a key derived from the login URL
+and username. New drivers and plain HTTP requests restore that state instead
+of going through the login form again, which only happens once a
+session-validity probe fails.
+"""
+
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlparse
+
+import requests
+from cryptography.fernet import Fernet, InvalidToken
+
+from assets import SESSION_STORE_DIR, SESSION_MAX_AGE
+
+DEFAULT_LOGIN_URL = 'https://sigest.services/login'
+
+_READ_STORAGE_SCRIPT = """
+const dump = (storage) => {
+    const items = {};
+    for (let i = 0; i < storage.length; i++) {
+        const key = storage.key(i);
+        items[key] = storage.getItem(key);
+    }
+    return items;
+};
+return {local: dump(window.localStorage), session: dump(window.sessionStorage)};
+"""
+
+_WRITE_STORAGE_SCRIPT = """
+const [local, session] = arguments;
+for (const [key, value] of Object.entries(local)) window.localStorage.setItem(key, value);
+for (const [key, value] of Object.entries(session)) window.sessionStorage.setItem(key, value);
+"""
+
+
+def _load_key():
+    """Use SESSION_STORE_KEY from the environment, or a key file created on first use."""
+    key = os.getenv('SESSION_STORE_KEY')
+    if key:
+        return key.encode('utf-8')
+    key_path = os.path.join(SESSION_STORE_DIR, '.key')
+    os.makedirs(SESSION_STORE_DIR, exist_ok=True)
+    try:
+        # O_EXCL: of two runs starting at once, only one creates the key
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # The other run may still be writing it
+        for _ in range(50):
+            with open(key_path, 'rb') as f:
+                key = f.read()
+            if key:
+                return key
+            time.sleep(0.1)
+        raise RuntimeError(f"Session key file {key_path} is empty")
+    key = Fernet.generate_key()
+    with open(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def login_url(credentials):
+    """The login URL of these credentials, normalised so the session key and the login form agree."""
+    url = (credentials.get('login_url') or DEFAULT_LOGIN_URL).strip()
+    parsed = urlparse(url)
+    return parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(), fragment='').geturl().rstrip('/')
+
+
+def _origin(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+class SessionStore:
+    """Encrypted browser sessions keyed by login URL and username."""
+
+    def __init__(self, directory=SESSION_STORE_DIR, max_age=SESSION_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        self.fernet = Fernet(_load_key())
+
+    def _path(self, credentials):
+        key = hashlib.sha256(f"{login_url(credentials)}|{credentials['username']}".encode('utf-8'))
+        return os.path.join(self.directory, f"{key.hexdigest()}.session")
+
+    def load(self, credentials):
+        """Return the stored session for these credentials, or None if missing, expired or unreadable."""
+        path = self._path(credentials)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                session = json.loads(self.fernet.decrypt(f.read()))
+        except (OSError, InvalidToken, json.JSONDecodeError) as e:
+            print(f"Discarding unreadable session {path}: {str(e)}")
+            self.delete(credentials)
+            return None
+        if time.time() - session['saved_at'] > self.max_age:
+            print("Stored session expired")
+            self.delete(credentials)
+            return None
+        return session
+
+    def save(self, driver, credentials):
+        """Capture cookies for every domain plus the current origin's web storage."""
+        storage = driver.execute_script(_READ_STORAGE_SCRIPT)
+        session = {
+            'saved_at': time.time(),
+            'origin': _origin(driver.current_url),
+            'url': driver.current_url,
+            'cookies': driver.execute_cdp_cmd('Network.getAllCookies', {})['cookies'],
+            'local_storage': storage['local'],
+            'session_storage': storage['session']
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(credentials), 'wb') as f:
+            f.write(self.fernet.encrypt(json.dumps(session).encode('utf-8')))
+        print(f"Saved session with {len(session['cookies'])} cookies for {credentials['username']}")
+
+    def delete(self, credentials):
+        path = self._path(credentials)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def restore(self, driver, credentials, probe_url=None):
+        """
+        Load a stored session into the driver and check that it is still valid.
+
+        The probe navigates to probe_url (or the page the session was saved on)
+        and treats a redirect back to a login page as an expired session.
+
+        Returns:
+            bool: True if the driver is now logged in
+        """
+        session = self.load(credentials)
+        if session is None:
+            return False
+
+        # CDP can set cookies for any domain without navigating there first
+        driver.execute_cdp_cmd('Network.setCookies', {'cookies': session['cookies']})
+        driver.get(session['origin'])
+        driver.execute_script(_WRITE_STORAGE_SCRIPT, session['local_storage'], session['session_storage'])
+
+        driver.get(probe_url or session['url'])
+        if "login" in driver.current_url.lower():
+            print("Stored session rejected, logging in again")
+            self.delete(credentials)
+            return False
+        print(f"Restored session for {credentials['username']}")
+        return True
+
+    def requests_session(self, credentials):
+        """Return a requests.Session carrying the stored cookies, for HTTP-tier fetches like fetch_api_page."""
+        http_session = requests.Session()
+        session = self.load(credentials)
+        if session is not None:
+            for cookie in session['cookies']:
+                http_session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie['path'])
+        return http_session
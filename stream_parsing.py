@@ -0,0 +1,142 @@
+"""
+Incremental parsing of streamed JSON listing output.
+
+Models answer with {"listings": [{...}, {...}]}. ListingStreamParser is fed
+the response text chunk by chunk and hands out every listing object as soon
+as its closing brace arrives, so downstream sinks can start writing before the
+model has finished, and whatever was complete survives a timeout.
+"""
+
+import json
+import re
+
+# What may precede a bare [...] answer: whitespace and an opening code fence
+_ANSWER_PREFIX = re.compile(r'\s*(?:```[\w-]*\s*)?')
+
+
+class ListingStreamParser:
+    """
+    Yield listing objects from a streamed JSON answer as they complete.
+
+    The listing array is the value of the first "listings" key, or the answer
+    itself when it is a bare [...] with nothing but whitespace or a code fence
+    before it. Other arrays, such as pagination URLs before the listings, and
+    brackets in prose around the JSON are skipped.
+    """
+
+    def __init__(self, on_listing=None):
+        self.on_listing = on_listing
+        self.text = []
+        self.listings = []
+        self._buffer = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._array_depth = None  # stack depth of the listing array once found
+        self._object_start = None
+        # While looking for the "listings" key: the last string closed, and the
+        # key whose value comes next once a colon has followed that string
+        self._string_chars = None
+        self._last_string = None
+        self._last_key = None
+        self._prefix = []  # text before the first bracket, while there is none
+
+    def feed(self, chunk):
+        """
+        Consume the next piece of the response.
+
+        Returns:
+            list: listing dicts completed by this chunk
+        """
+        self.text.append(chunk)
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string_chars is not None:
+                        self._last_string = ''.join(self._string_chars)
+                        self._string_chars = None
+                elif self._string_chars is not None:
+                    self._string_chars.append(char)
+            elif char in ' \t\r\n':
+                pass
+            elif char == ':':
+                # Only a string followed by a colon inside an object is a key
+                if self._last_string is not None and self._stack and self._stack[-1] == '{':
+                    self._last_key = self._last_string
+                self._last_string = None
+            else:
+                key, self._last_key, self._last_string = self._last_key, None, None
+                if char == '"':
+                    self._in_string = True
+                    if self._array_depth is None:
+                        self._string_chars = []
+                elif char in '{[':
+                    at_answer_start = self._prefix is not None and _ANSWER_PREFIX.fullmatch(''.join(self._prefix))
+                    if char == '[' and self._array_depth is None and (key == 'listings' or at_answer_start):
+                        self._array_depth = len(self._stack) + 1
+                    elif char == '{' and self._array_depth is not None and len(self._stack) == self._array_depth:
+                        self._object_start = i
+                    self._stack.append(char)
+                    self._prefix = None
+                elif char in '}]' and self._stack:
+                    self._stack.pop()
+                    if char == '}' and self._object_start is not None and len(self._stack) == self._array_depth:
+                        listing = self._decode(buffer[self._object_start:i + 1])
+                        self._object_start = None
+                        if listing is not None:
+                            completed.append(listing)
+                    elif char == ']' and self._array_depth is not None and len(self._stack) < self._array_depth:
+                        self._array_depth = -1  # listing array closed; ignore anything after it
+            if self._prefix is not None:
+                self._prefix.append(char)
+            i += 1
+
+        # Keep only the unfinished listing in the buffer
+        if self._object_start is not None:
+            self._buffer = buffer[self._object_start:]
+            self._pos = i - self._object_start
+            self._object_start = 0
+        else:
+            self._buffer = ""
+            self._pos = 0
+
+        for listing in completed:
+            self.listings.append(listing)
+            if self.on_listing is not None:
+                self.on_listing(listing)
+        return completed
+
+    @staticmethod
+    def _decode(text):
+        try:
+            listing = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return listing if isinstance(listing, dict) else None
+
+    @property
+    def full_text(self):
+        return "".join(self.text)
+
+    def result(self):
+        """The whole answer parsed as JSON, or the listings completed so far if it doesn't parse."""
+        try:
+            parsed = json.loads(self.full_text)
+            if isinstance(parsed, dict) and "listings" in parsed:
+                return parsed
+            if isinstance(parsed, list):
+                return {"listings": parsed}
+        except json.JSONDecodeError:
+            pass
+        return {"listings": list(self.listings)}
@@ -0,0 +1,25 @@
+from change_detection import diff_listings
+
+FIELDS = ['title', 'seller', 'price']
+
+
+def test_listings_sharing_a_title_are_kept_apart():
+    previous = [
+        {'title': 'Canon EOS R6', 'seller': 'Shop A', 'price': '2 499'},
+        {'title': 'Canon EOS R6', 'seller': 'Shop B', 'price': '2 399'},
+    ]
+    current = [
+        {'title': 'Canon EOS R6', 'seller': 'Shop A', 'price': '2 299'},
+        {'title': 'Canon EOS R6', 'seller': 'Shop B', 'price': '2 399'},
+        {'title': 'Canon EOS R6', 'seller': 'Shop C', 'price': '2 450'},
+    ]
+    diff = diff_listings(previous, current, FIELDS)
+    assert diff['new'] == [current[2]]
+    assert diff['removed'] == []
+    assert diff['price_changed'] == [{'listing': current[0], 'changes': {'price': {'old': '2 499', 'new': '2 299'}}}]
+
+
+def test_duplicate_listings_are_counted_one_by_one():
+    listing = {'title': 'Lens cap', 'seller': '', 'price': '9'}
+    diff = diff_listings([listing, listing], [listing], FIELDS)
+    assert diff == {'new': [], 'removed': [listing], 'price_changed': []}
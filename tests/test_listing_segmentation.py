@@ -0,0 +1,40 @@
+from bs4 import BeautifulSoup
+
+from listing_segmentation import find_listing_items, segment_listings
+
+WORDS = "boitier objectif capteur hybride plein format stabilisation monture zoom grand angle lumineux".split()
+
+
+def _description(i, words=12):
+    return ' '.join(WORDS[(i * 5 + k) % len(WORDS)] for k in range(words))
+
+
+def _card(i, classes="product-card"):
+    return (f'<article class="{classes}"><h3 class="product-title"><a href="/item/{i}">Camera {i}</a></h3>'
+            f'<span class="price">{100 + i},00 €</span><p>{_description(i)}</p></article>')
+
+
+def _page(body):
+    return (f'<html><head><title>Shop</title></head><body><ul class="menu">'
+            + ''.join(f'<li><a href="/c/{i}">Category {i}</a></li>' for i in range(6))
+            + f'</ul><h1>Shop</h1>{body}<div class="footer">Copyright and terms.</div></body></html>')
+
+
+def test_promoted_cards_stay_in_the_grid():
+    cards = ''.join(_card(i, "product-card product-card--promo" if i in (3, 8) else "product-card") for i in range(12))
+    soup = BeautifulSoup(_page(f'<div class="grid">{cards}</div>'), 'html.parser')
+    items = find_listing_items(soup)
+    assert [item.find('a')['href'] for item in items] == [f'/item/{i}' for i in range(12)]
+
+
+def test_recommendation_strip_does_not_replace_a_product_page():
+    recommendations = ''.join(
+        f'<div class="reco-card"><a href="/item/{i}">Lens {i} {_description(i, 3)}</a><span class="price">{50 + i},00 €</span></div>'
+        for i in range(4)
+    )
+    description = ' '.join(_description(i, 20) for i in range(10))
+    html = _page(f'<div class="product-detail"><h2>Camera 99</h2><span class="price">1 499,00 €</span>'
+                 f'<p>{description}</p></div>'
+                 f'<section class="also-bought"><h2>Customers also bought</h2>{recommendations}</section>')
+    assert find_listing_items(BeautifulSoup(html, 'html.parser')) == []
+    assert segment_listings(html) == html
@@ -0,0 +1,63 @@
+import pytest
+
+import near_duplicates
+from near_duplicates import NearDuplicateIndex, assign_listings, extract_or_reuse_similar, split_items
+
+WORDS = "boitier objectif capteur hybride plein format stabilisation monture zoom grand angle lumineux".split()
+FIELDS = ['brand', 'name', 'price']
+
+
+class Page:
+    def __init__(self, url, markdown):
+        self.url = url
+        self.markdown = markdown
+
+
+def _block(i, price):
+    description = ' '.join(f"{WORDS[(i * 7 + k) % len(WORDS)]}{i}{k}" for k in range(40))
+    return f"ITEM_ID: {i:06x}\n\n[Camera {i}](/item/{i})\n\nCanon\n\n{price} €\n\n{description}\n\n"
+
+
+def _page(order, prices):
+    return "# Cameras\n\n" + ''.join(_block(i, prices[i]) for i in order)
+
+
+def _listing(i, price):
+    return {'name': f'Camera {i}', 'brand': 'Canon', 'price': f'{price} €'}
+
+
+@pytest.fixture(autouse=True)
+def no_tokenizer(monkeypatch):
+    monkeypatch.setattr(near_duplicates, 'count_tokens', lambda text, model: len(text) // 4)
+
+
+def test_listings_with_a_shared_brand_go_to_their_own_blocks():
+    prices = {i: 100 + i for i in range(6)}
+    _, blocks = split_items(_page(range(6), prices))
+    listings = [_listing(i, prices[i]) for i in range(6)]
+    assigned, unassigned = assign_listings(blocks, listings, FIELDS)
+    assert not unassigned
+    assert [assigned[f'{i:06x}'] for i in range(6)] == [[listing] for listing in listings]
+
+
+def test_sort_variant_with_one_changed_block_extracts_only_that_block():
+    prices = {i: 100 + i for i in range(8)}
+    index = NearDuplicateIndex()
+    index.add('https://shop/cameras?sort=name', FIELDS, _page(range(8), prices),
+              {'listings': [_listing(i, prices[i]) for i in range(8)]})
+
+    order = [1, 0, 3, 2, 5, 4, 7, 6]
+    prices[5] = 999
+    sent = []
+
+    def extract(markdown):
+        sent.append(markdown)
+        return {'listings': [_listing(5, 999)]}, {'input_tokens': 50, 'output_tokens': 10}
+
+    page = Page('https://shop/cameras?sort=price', _page(order, prices))
+    formatted_data, token_counts = extract_or_reuse_similar(index, page, FIELDS, extract, 'gpt-4o-mini')
+
+    assert len(sent) == 1 and '[Camera 5]' in sent[0] and '[Camera 4]' not in sent[0]
+    assert formatted_data['listings'] == [_listing(i, prices[i]) for i in order]
+    assert token_counts == {'input_tokens': 50, 'output_tokens': 10}
+    assert index.summary()['partial'] == 1
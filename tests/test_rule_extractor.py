@@ -0,0 +1,17 @@
+from rule_extractor import extract_with_rules, page_coverage
+
+
+def _card(title, price):
+    return f"## PRODUCT_TITLE: {title}\n\nPRODUCT_PRICE: {price}\n\n[{title}](/p/{title})\n\n{price} €\n\n"
+
+
+def test_fully_marked_page_is_covered():
+    markdown = "".join(_card(f"Camera {i}", f"1 {i}99,00") for i in range(4))
+    assert page_coverage(markdown, extract_with_rules(markdown)['listings']) == 1.0
+
+
+def test_unmarked_cards_lower_the_coverage():
+    marked = "".join(_card(f"Camera {i}", f"1 {i}99,00") for i in range(3))
+    unmarked = "".join(f"[Lens {i}](/p/lens-{i})\n\n{i}49,00 €\n\n" for i in range(9))
+    markdown = marked + unmarked
+    assert page_coverage(markdown, extract_with_rules(markdown)['listings']) == 0.25
@@ -0,0 +1,30 @@
+from stream_parsing import ListingStreamParser
+
+
+def _feed_in_chunks(text, size=3):
+    parser = ListingStreamParser()
+    streamed = []
+    for i in range(0, len(text), size):
+        streamed.extend(parser.feed(text[i:i + size]))
+    return streamed, parser.result()
+
+
+def test_array_field_before_listings_is_skipped():
+    streamed, result = _feed_in_chunks('{"page_urls": ["/p/2", "/p/3"], "listings": [{"name": "a"}, {"name": "b"}]}')
+    assert streamed == [{"name": "a"}, {"name": "b"}]
+    assert result["listings"] == streamed
+
+
+def test_bare_array_answer():
+    streamed, _ = _feed_in_chunks('```json\n[{"name": "a"}, {"name": "b"}]\n```')
+    assert streamed == [{"name": "a"}, {"name": "b"}]
+
+
+def test_listings_as_a_string_value_is_not_a_key():
+    streamed, _ = _feed_in_chunks('{"tabs": ["listings", ["/p/2"]], "listings": [{"name": "a"}]}')
+    assert streamed == [{"name": "a"}]
+
+
+def test_bracket_in_prose_before_the_json_is_skipped():
+    streamed, _ = _feed_in_chunks('Found 2 items [see below]:\n{"listings": [{"name": "a"}, {"name": "b"}]}')
+    assert streamed == [{"name": "a"}, {"name": "b"}]
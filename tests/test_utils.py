@@ -0,0 +1,15 @@
+import pytest
+
+from utils import calculate_price
+
+
+def test_batch_price_halves_input_and_output():
+    token_counts = {'input_tokens': 1_000_000, 'output_tokens': 1_000_000}
+    _, _, cost = calculate_price(token_counts, 'gpt-4o-mini', batch=True)
+    assert cost == pytest.approx(0.075 + 0.300)
+
+
+def test_interactive_price_uses_full_rates():
+    token_counts = {'input_tokens': 1_000_000, 'output_tokens': 1_000_000}
+    _, _, cost = calculate_price(token_counts, 'gpt-4o-mini')
+    assert cost == pytest.approx(0.150 + 0.600)
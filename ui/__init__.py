@@ -9,13 +9,15 @@ from .components import (
     render_cookie_handling_section,
     render_scraping_settings,
     handle_scraping,
-    display_scraping_results
+    display_scraping_results,
+    display_scrape_progress
 )
 
 from .utils import (
     init_session_state,
     reset_session_state,
-    get_session_state
+    get_session_state,
+    ScrapeJob
 )
 
 __version__ = '1.0.0'
@@ -27,7 +29,9 @@ __all__ = [
     'render_scraping_settings',
     'handle_scraping',
     'display_scraping_results',
+    'display_scrape_progress',
     'init_session_state',
     'reset_session_state',
-    'get_session_state'
+    'get_session_state',
+    'ScrapeJob'
 ]
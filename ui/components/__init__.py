@@ -9,6 +9,7 @@ from .cookie_handling import render_cookie_handling_section
 from .scraping_settings import render_scraping_settings
 from .scraping_logic import handle_scraping
 from .results_display import display_scraping_results
+from .progress_display import display_scrape_progress
 
 __all__ = [
     'render_api_keys_section',
@@ -16,5 +17,6 @@ __all__ = [
     'render_cookie_handling_section',
     'render_scraping_settings',
     'handle_scraping',
-    'display_scraping_results'
+    'display_scraping_results',
+    'display_scrape_progress'
 ]
@@ -0,0 +1,39 @@
+import streamlit as st
+import pandas as pd
+import sys
+import os
+
+# Add project root to Python path to allow importing from project modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+def format_duration(seconds):
+    """Format seconds as m:ss, or '--' when unknown."""
+    if seconds is None:
+        return "--"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+def display_scrape_progress(snapshot):
+    """Display live progress of a running scrape job from a ScrapeProgress snapshot."""
+    pages_done = snapshot['pages_done']
+    pages_total = snapshot['pages_total']
+    st.progress(
+        min(pages_done / pages_total, 1.0) if pages_total else 0.0,
+        text=f"{pages_done}/{pages_total} pages scraped"
+    )
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Listings", snapshot['listings'])
+    col2.metric("Tokens", snapshot['input_tokens'] + snapshot['output_tokens'])
+    col3.metric("Cost", f"${snapshot['cost']:.4f}")
+    col4.metric("ETA", format_duration(snapshot['eta']))
+
+    for level, text in snapshot['messages'][-5:]:
+        getattr(st, level, st.info)(text)
+
+    if snapshot['seed_progress']:
+        st.dataframe(pd.DataFrame(snapshot['seed_progress']), use_container_width=True)
+
+    if snapshot['recent_listings']:
+        st.write("Latest listings:")
+        st.dataframe(pd.DataFrame(snapshot['recent_listings'][::-1]), use_container_width=True)
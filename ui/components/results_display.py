@@ -3,51 +3,63 @@ import pandas as pd
 import json
 import sys
 import os
+import re
+import glob
 
 # Add project root to Python path to allow importing from project modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from assets import RESULTS_DISPLAY_SETTINGS
 
 def display_scraping_results(results, show_tags):
     """Display the scraping results including data tables and statistics."""
     if not results:
         return
 
-    all_data = results['data']
     total_input_tokens = results['input_tokens']
+    total_cached_input_tokens = results.get('cached_input_tokens', 0)
     total_output_tokens = results['output_tokens']
     total_cost = results['total_cost']
     output_folder = results['output_folder']
     pagination_info = results['pagination_info']
+    change_detection = results.get('change_detection')
+    near_duplicates = results.get('near_duplicates')
+    seed_progress = results.get('seed_progress')
+    routing = results.get('routing')
+    request_packing = results.get('request_packing')
+    snapshots = results.get('snapshots')
 
     # Display scraping details
     if show_tags:
-        st.subheader("Scraping Results")
-        for i, data in enumerate(all_data, start=1):
-            st.write(f"Data from URL {i}:")
-            
-            try:
-                # Convert data to DataFrame
-                df = convert_data_to_dataframe(data)
-                
-                # Display the dataframe
-                if not df.empty:
-                    st.dataframe(df, use_container_width=True)
-                else:
-                    st.warning(f"No data found for URL {i}")
-                
-                # Display raw data for debugging
-                with st.expander("Show raw data"):
-                    st.json(data)
-                    
-            except Exception as e:
-                st.error(f"Error displaying data for URL {i}: {str(e)}")
-                st.json(data)  # Show raw data when there's an error
+        if seed_progress:
+            display_seed_progress(seed_progress)
+
+        display_result_tables(output_folder)
 
         # Display token usage and cost
-        display_token_metrics(total_input_tokens, total_output_tokens, total_cost)
+        display_token_metrics(total_input_tokens, total_output_tokens, total_cost, total_cached_input_tokens)
+
+        # Display which models the router used and what that saved
+        if routing:
+            display_routing_report(routing)
+
+        # Display re-crawl hit rate and listing changes
+        if change_detection:
+            display_change_detection(change_detection)
+
+        # Display pages that reused a near-duplicate's extraction and the tokens that saved
+        if near_duplicates:
+            display_near_duplicates(near_duplicates)
+
+        # Display how many pages shared a model request
+        if request_packing:
+            display_request_packing(request_packing)
+
+        # Display how much page re-processing the snapshots saved
+        if snapshots:
+            display_snapshot_stats(snapshots)
 
         # Download options
-        display_download_options(all_data)
+        display_download_options(output_folder)
 
         st.success(f"Scraping completed. Results saved in {output_folder}")
 
@@ -57,7 +69,7 @@ def display_scraping_results(results, show_tags):
 
     # Display combined totals if both scraping and pagination were performed
     if show_tags and pagination_info:
-        display_combined_totals(total_input_tokens, total_output_tokens, total_cost, pagination_info)
+        display_combined_totals(total_input_tokens, total_output_tokens, total_cost)
 
 def convert_data_to_dataframe(data):
     """Convert various data formats to a pandas DataFrame."""
@@ -79,49 +91,196 @@ def convert_data_to_dataframe(data):
     else:
         return pd.DataFrame([{"error": "Failed to parse data"}])
 
-def display_token_metrics(input_tokens, output_tokens, cost):
+def display_token_metrics(input_tokens, output_tokens, cost, cached_input_tokens=0):
     """Display token usage and cost metrics in the sidebar."""
     st.sidebar.markdown("---")
     st.sidebar.markdown("### Scraping Details")
     st.sidebar.markdown("#### Token Usage")
     st.sidebar.markdown(f"*Input Tokens:* {input_tokens}")
+    if cached_input_tokens:
+        st.sidebar.markdown(f"*Cached Input Tokens:* {cached_input_tokens} ({cached_input_tokens / input_tokens:.0%} of input)")
     st.sidebar.markdown(f"*Output Tokens:* {output_tokens}")
     st.sidebar.markdown(f"**Total Cost:** :green-background[**${cost:.4f}**]")
 
-def display_download_options(all_data):
-    """Display download buttons for JSON and CSV formats."""
+def display_seed_progress(seed_progress):
+    """Display pages, tokens and cost per seed URL of a batch crawl."""
+    st.subheader("Batch Summary")
+    seed_df = pd.DataFrame(seed_progress)
+    st.dataframe(
+        seed_df,
+        column_config={
+            "seed": st.column_config.LinkColumn("Seed URL"),
+            "cost": st.column_config.NumberColumn("Cost", format="$%.4f")
+        },
+        use_container_width=True
+    )
+
+def display_change_detection(summary):
+    """Display change detection hit rate and listing diffs in the sidebar."""
+    st.sidebar.markdown("#### Change Detection")
+    st.sidebar.markdown(
+        f"*Unchanged Pages:* {summary['pages_unchanged']}/{summary['pages_checked']} "
+        f"({summary['hit_rate']:.0%} hit rate)"
+    )
+    st.sidebar.markdown(
+        f"*New:* {summary['new']} | *Removed:* {summary['removed']} | *Price Changed:* {summary['price_changed']}"
+    )
+
+def display_near_duplicates(summary):
+    """Display near-duplicate pages found across URLs and the tokens they saved in the sidebar."""
+    st.sidebar.markdown("#### Near-Duplicate Pages")
+    st.sidebar.markdown(
+        f"*Reused:* {summary['reused']} | *Partly Extracted:* {summary['partial']} "
+        f"of {summary['pages_checked']} pages"
+    )
+    st.sidebar.markdown(f"*Tokens Saved:* {summary['tokens_saved']:,}")
+
+def display_request_packing(stats):
+    """Display pages extracted in packed requests and those that fell back to their own request in the sidebar."""
+    st.sidebar.markdown("#### Request Packing")
+    st.sidebar.markdown(
+        f"*Packed Pages:* {stats['packed_pages']} in {stats['packed_requests']} requests | "
+        f"*Extracted Alone:* {stats['fallback_pages']}"
+    )
+
+def display_snapshot_stats(summary):
+    """Display page conversions computed and avoided through page snapshots in the sidebar."""
+    st.sidebar.markdown("#### Page Processing")
+    st.sidebar.markdown(f"*Conversions:* {summary['computed']} | *Avoided:* {summary['avoided']}")
+    if summary['avoided_by_kind']:
+        st.sidebar.markdown(
+            "*Reused:* " + ", ".join(f"{kind.replace('_', ' ')} ×{count}" for kind, count in summary['avoided_by_kind'].items())
+        )
+
+def list_result_files(output_folder):
+    """Return the sorted_data_N.json files of a run, in page order (batch seeds included)."""
+    def page_order(path):
+        number = re.search(r'sorted_data_(\d+)\.json$', path)
+        return (os.path.dirname(path), int(number.group(1)) if number else 0)
+    pattern = os.path.join(output_folder, '**', 'sorted_data_*.json')
+    return sorted(glob.glob(pattern, recursive=True), key=page_order)
+
+def results_signature(output_folder):
+    """Cache key that changes whenever a result file is added or rewritten."""
+    return tuple((path, os.path.getmtime(path)) for path in list_result_files(output_folder))
+
+@st.cache_data(max_entries=RESULTS_DISPLAY_SETTINGS["cached_files"], show_spinner=False)
+def load_result_file(path, mtime):
+    """Load one page's listings as a DataFrame; mtime keys the cache."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return convert_data_to_dataframe(json.load(f))
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def summarize_results(output_folder, signature):
+    """Count pages and listings without keeping the listings around."""
+    listings = 0
+    for path, mtime in signature:
+        listings += len(load_result_file(path, mtime))
+    return {'pages': len(signature), 'listings': listings}
+
+def display_result_tables(output_folder):
+    """Display the extracted listings one page at a time, read from the output folder."""
+    st.subheader("Scraping Results")
+    signature = results_signature(output_folder)
+    if not signature:
+        st.warning("No data found")
+        return
+
+    summary = summarize_results(output_folder, signature)
+    st.write(f"{summary['listings']} listings from {summary['pages']} pages")
+
+    labels = [os.path.relpath(path, output_folder) for path, _ in signature]
+    selected = st.selectbox("Page", options=range(len(labels)), format_func=lambda i: labels[i])
+    path, mtime = signature[selected]
+
+    try:
+        df = load_result_file(path, mtime)
+    except Exception as e:
+        st.error(f"Error displaying data for {labels[selected]}: {str(e)}")
+        return
+    if df.empty:
+        st.warning(f"No data found for {labels[selected]}")
+        return
+
+    # Page through large result files instead of rendering them whole
+    rows_per_page = RESULTS_DISPLAY_SETTINGS["rows_per_page"]
+    num_table_pages = (len(df) - 1) // rows_per_page + 1
+    table_page = 1
+    if num_table_pages > 1:
+        table_page = st.number_input("Table page", min_value=1, max_value=num_table_pages, value=1)
+    start = (table_page - 1) * rows_per_page
+    st.dataframe(df.iloc[start:start + rows_per_page], use_container_width=True)
+
+    # Display raw data for debugging
+    with st.expander("Show raw data"):
+        with open(path, 'r', encoding='utf-8') as f:
+            st.json(json.load(f))
+
+def build_download_artifacts(output_folder):
+    """
+    Write the combined JSON and CSV downloads once, one page at a time.
+    They are rebuilt only when a result file is newer than the artifacts.
+    """
+    json_path = os.path.join(output_folder, 'scraped_data.json')
+    csv_path = os.path.join(output_folder, 'scraped_data.csv')
+    result_files = list_result_files(output_folder)
+    newest = max((os.path.getmtime(path) for path in result_files), default=0)
+    if all(os.path.exists(path) and os.path.getmtime(path) >= newest for path in (json_path, csv_path)):
+        return json_path, csv_path
+
+    with open(json_path, 'w', encoding='utf-8') as json_file, open(csv_path, 'w', encoding='utf-8', newline='') as csv_file:
+        json_file.write('[\n')
+        header = True
+        for i, path in enumerate(result_files):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if i:
+                json_file.write(',\n')
+            json.dump(data, json_file, indent=4)
+            df = convert_data_to_dataframe(data)
+            df.to_csv(csv_file, index=False, header=header)
+            header = header and df.empty
+        json_file.write('\n]\n')
+    return json_path, csv_path
+
+def display_download_options(output_folder):
+    """Display download buttons for JSON and CSV formats, streamed from disk."""
     st.subheader("Download Extracted Data")
+    json_path, csv_path = build_download_artifacts(output_folder)
     col1, col2 = st.columns(2)
     
     with col1:
-        json_data = json.dumps(all_data, default=lambda o: o.dict() if hasattr(o, 'dict') else str(o), indent=4)
-        st.download_button(
-            "Download JSON",
-            data=json_data,
-            file_name="scraped_data.json"
-        )
+        with open(json_path, 'rb') as f:
+            st.download_button(
+                "Download JSON",
+                data=f,
+                file_name="scraped_data.json"
+            )
     
     with col2:
-        # Convert all data to a single DataFrame
-        all_listings = []
-        for data in all_data:
-            if isinstance(data, str):
-                try:
-                    data = json.loads(data)
-                except json.JSONDecodeError:
-                    continue
-            if isinstance(data, dict) and 'listings' in data:
-                all_listings.extend(data['listings'])
-            elif hasattr(data, 'listings'):
-                all_listings.extend([item.dict() for item in data.listings])
-            else:
-                all_listings.append(data)
-        
-        combined_df = pd.DataFrame(all_listings)
-        st.download_button(
-            "Download CSV",
-            data=combined_df.to_csv(index=False),
-            file_name="scraped_data.csv"
+        with open(csv_path, 'rb') as f:
+            st.download_button(
+                "Download CSV",
+                data=f,
+                file_name="scraped_data.csv"
+            )
+
+def display_routing_report(routing):
+    """Display the model router's choices and its savings against the top model in the sidebar."""
+    st.sidebar.markdown("#### Model Routing")
+    for model, pages in routing['by_model'].items():
+        st.sidebar.markdown(f"*{model}:* {pages} page(s)")
+    st.sidebar.markdown(f"*Escalations:* {routing['escalations']}")
+    if routing['budget'] is not None:
+        st.sidebar.markdown(f"*Spend:* ${routing['spend']:.4f} of ${routing['budget']:.2f} budget")
+    st.sidebar.markdown(
+        f"*Saved vs. {routing['baseline_model']}:* ${routing['savings']:.4f} "
+        f"(would have cost ${routing['baseline_spend']:.4f})"
+    )
+    if routing['baseline_latency'] is not None:
+        st.sidebar.markdown(
+            f"*Model time:* {routing['latency']:.1f}s "
+            f"(~{routing['baseline_latency']:.1f}s with {routing['baseline_model']})"
         )
 
 def display_pagination_info(pagination_info):
@@ -166,12 +325,12 @@ def display_pagination_info(pagination_info):
             file_name="pagination_urls.json"
         )
 
-def display_combined_totals(input_tokens, output_tokens, cost, pagination_info):
-    """Display combined totals including both scraping and pagination."""
+def display_combined_totals(input_tokens, output_tokens, cost):
+    """Display combined totals; pagination detection runs once per crawl and is already in them."""
     st.markdown("---")
-    total_input_tokens_combined = input_tokens + pagination_info['token_counts']['input_tokens']
-    total_output_tokens_combined = output_tokens + pagination_info['token_counts']['output_tokens']
-    total_combined_cost = cost + pagination_info['price']
+    total_input_tokens_combined = input_tokens
+    total_output_tokens_combined = output_tokens
+    total_combined_cost = cost
     
     st.markdown("### Total Counts and Cost (Including Pagination)")
     st.markdown(f"**Total Input Tokens:** {total_input_tokens_combined}")
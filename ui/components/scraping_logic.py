@@ -10,77 +10,164 @@ from scraper import (
     format_data,
     save_formatted_data,
     calculate_price,
-    html_to_markdown_with_readability,
     create_dynamic_listing_model,
     create_listings_container_model,
     setup_selenium,
     generate_unique_folder_name,
-    scrape_with_pagination
+    scrape_with_pagination,
+    scrape_with_api_capture,
+    scrape_with_batch_api
 )
-from pagination_detector import detect_pagination_elements
-
-def handle_scraping(settings, credentials=None, cookie_selectors=None):
-    """Handle the main scraping process."""
-    with st.spinner('Scraping in progress...'):
-        # Initialize output folder
-        output_folder = os.path.join('output', generate_unique_folder_name(settings['urls'][0]))
-        os.makedirs(output_folder, exist_ok=True)
-
-        # Initialize counters and data containers
-        total_input_tokens = 0
-        total_output_tokens = 0
-        total_cost = 0
-        all_data = []
-        pagination_info = None
-
-        driver = st.session_state.get('driver', None)
-        
-        try:
+from assets import API_CAPTURE_MAX_PAGES, AUTO_MODEL, NEAR_DUPLICATE_SETTINGS, NEAR_DUPLICATE_STORE_PATH
+from page_snapshot import PageSnapshot, SnapshotStats, pagination_page_urls
+from change_detection import FingerprintStore, extract_or_reuse
+from file_operations import StreamedListingWriter
+from batch_scraper import BatchScraper
+from scrape_progress import ScrapeProgress
+from model_router import ModelRouter
+from browser_governor import get_governor
+from near_duplicates import NearDuplicateIndex, extract_or_reuse_similar
+import json
+
+def handle_scraping(settings, credentials=None, cookie_selectors=None, progress=None):
+    """
+    Handle the main scraping process.
+    Runs in a background job: instead of drawing to the page, it reports pages,
+    listings, costs and messages to progress, and stops early once progress is cancelled.
+    """
+    progress = progress if progress is not None else ScrapeProgress()
+
+    # Initialize output folder
+    output_folder = os.path.join('output', generate_unique_folder_name(settings['urls'][0]))
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Initialize counters and data containers
+    total_input_tokens = 0
+    total_cached_input_tokens = 0
+    total_output_tokens = 0
+    total_cost = 0
+    pagination_info = None
+    snapshot_stats = SnapshotStats()
+    fingerprint_store = FingerprintStore() if settings.get('use_change_detection') else None
+    # Sort orders, filters and tracking parameters of one catalogue reuse each other's extractions
+    near_duplicates = None
+    if settings.get('use_near_duplicates'):
+        near_duplicates = NearDuplicateIndex(NEAR_DUPLICATE_STORE_PATH if NEAR_DUPLICATE_SETTINGS['persist'] else None)
+    
+    # With the Auto model, a router stands in for the model name and picks one per page
+    router = None
+    if settings['model_selection'] == AUTO_MODEL:
+        router = ModelRouter(budget=settings.get('router_budget'))
+        settings = dict(settings, model_selection=router)
+
+    driver = st.session_state.get('driver', None)
+    governor = get_governor()
+    if driver is not None and not governor.is_alive(driver):
+        # Reaped while the session wasn't using it
+        driver = st.session_state['driver'] = None
+    
+    try:
+        if settings['attended_mode']:
+            if driver is None:
+                # The page the user prepared is gone; an unattended run wouldn't scrape it
+                raise RuntimeError("The attended browser was closed before scraping resumed. Launch the scraper again.")
+            # From here the run's session_busy protects it, and afterwards the idle limits apply again
+            governor.unpin(driver)
+        with governor.session_busy():
             if settings['attended_mode'] and driver is not None:
                 results = handle_attended_mode_scraping(
-                    driver, settings, credentials, cookie_selectors, output_folder
+                    driver, settings, credentials, cookie_selectors, output_folder, fingerprint_store, progress, snapshot_stats,
+                    near_duplicates
+                )
+            elif settings.get('use_batch_api'):
+                results = handle_batch_api_scraping(
+                    settings, credentials, cookie_selectors, output_folder, progress
+                )
+            elif len(settings['urls']) > 1:
+                results = handle_batch_scraping(
+                    settings, credentials, cookie_selectors, output_folder, fingerprint_store, progress, snapshot_stats,
+                    near_duplicates
                 )
             else:
                 results = handle_unattended_mode_scraping(
-                    settings, credentials, cookie_selectors, output_folder
+                    settings, credentials, cookie_selectors, output_folder, fingerprint_store, progress, snapshot_stats,
+                    near_duplicates
                 )
-            
-            # Update totals
-            total_input_tokens += results['input_tokens']
-            total_output_tokens += results['output_tokens']
-            total_cost += results['cost']
-            all_data.extend(results['data'])
-            pagination_info = results.get('pagination_info')
-
-        except Exception as e:
-            st.error(f"Error during scraping: {str(e)}")
-            if driver and not settings['attended_mode']:
-                driver.quit()
-                st.session_state['driver'] = None
-            raise
-
-        # Return results
-        return {
-            'data': all_data,
-            'input_tokens': total_input_tokens,
-            'output_tokens': total_output_tokens,
-            'total_cost': total_cost,
-            'output_folder': output_folder,
-            'pagination_info': pagination_info
-        }
-
-def handle_attended_mode_scraping(driver, settings, credentials, cookie_selectors, output_folder):
+        
+        # Update totals
+        total_input_tokens += results['input_tokens']
+        total_cached_input_tokens += results['cached_input_tokens']
+        total_output_tokens += results['output_tokens']
+        total_cost += results['cost']
+        pagination_info = results.get('pagination_info')
+
+    except Exception as e:
+        progress.message(f"Error during scraping: {str(e)}", 'error')
+        # The unattended handler puts its own driver in session state
+        driver = st.session_state.get('driver')
+        if driver and not settings['attended_mode']:
+            driver.quit()
+            st.session_state['driver'] = None
+        raise
+    finally:
+        if fingerprint_store is not None:
+            fingerprint_store.save()
+        if near_duplicates is not None:
+            near_duplicates.save()
+        if router is not None:
+            router.save()
+
+    # Return results. Listings stay on disk in output_folder and are
+    # loaded page by page for display, so they aren't kept in session state.
+    return {
+        'input_tokens': total_input_tokens,
+        'cached_input_tokens': total_cached_input_tokens,
+        'output_tokens': total_output_tokens,
+        'total_cost': total_cost,
+        'output_folder': output_folder,
+        'pagination_info': pagination_info,
+        'change_detection': fingerprint_store.summary() if fingerprint_store is not None else None,
+        'near_duplicates': near_duplicates.summary() if near_duplicates is not None else None,
+        'seed_progress': results.get('seed_progress'),
+        'request_packing': results.get('request_packing'),
+        'routing': router.report() if router is not None else None,
+        'snapshots': snapshot_stats.summary(),
+        'cancelled': progress.cancelled
+    }
+
+def first_page_pagination_info(first_page, settings):
+    """Pagination info for display, taken from the first page's memoised detection."""
+    if first_page is None:
+        return None
+    pagination_data, p_token_counts, p_cost = first_page.pagination(
+        settings['pagination_details'],
+        settings['model_selection']
+    )
+    return {
+        "page_urls": pagination_page_urls(pagination_data),
+        "token_counts": p_token_counts,
+        "price": p_cost
+    }
+
+def handle_attended_mode_scraping(driver, settings, credentials, cookie_selectors, output_folder, fingerprint_store=None, progress=None, snapshot_stats=None, near_duplicates=None):
     """Handle scraping in attended mode."""
     # Get current URL from driver
     current_url = driver.current_url
     
     results = {
         'input_tokens': 0,
+        'cached_input_tokens': 0,
         'output_tokens': 0,
         'cost': 0,
         'data': []
     }
 
+    # Read listings straight from the page's JSON API if possible
+    if settings.get('use_api_capture') and apply_api_capture(
+        results, current_url, settings, output_folder, driver, None, cookie_selectors, progress
+    ):
+        return results
+
     # Handle pagination if enabled
     if settings['use_pagination']:
         # Use the scrape_with_pagination function with existing driver
@@ -92,62 +179,83 @@ def handle_attended_mode_scraping(driver, settings, credentials, cookie_selector
             settings['pagination_details'],
             driver=driver,  # Pass the existing driver
             credentials=credentials,
-            cookie_selectors=cookie_selectors
+            cookie_selectors=cookie_selectors,
+            fingerprint_store=fingerprint_store,
+            progress=progress,
+            snapshot_stats=snapshot_stats,
+            near_duplicates=near_duplicates
         )
         results['data'].extend(data)
         results['input_tokens'] = token_counts['input_tokens']
+        results['cached_input_tokens'] = token_counts['cached_input_tokens']
         results['output_tokens'] = token_counts['output_tokens']
         results['cost'] = token_counts['total_cost']
         
-        # Get initial page content for pagination info
-        raw_html = driver.page_source
-        markdown = html_to_markdown_with_readability(raw_html)
-        
-        # Get pagination info for display
-        pagination_data, p_token_counts, p_cost = detect_pagination_elements(
-            current_url,
-            settings['pagination_details'],
-            settings['model_selection'],
-            markdown
-        )
-        results['pagination_info'] = {
-            "page_urls": pagination_data.page_urls if hasattr(pagination_data, 'page_urls') 
-                        else pagination_data.get('page_urls', []),
-            "token_counts": p_token_counts,
-            "price": p_cost
-        }
+        # Pagination info for display, already detected and paid for while crawling
+        results['pagination_info'] = first_page_pagination_info(token_counts['first_page'], settings)
     else:
         # Process single page
-        raw_html = driver.page_source
-        markdown = html_to_markdown_with_readability(raw_html)
-        save_raw_data(markdown, output_folder, f'rawData_1.md')
+        progress.add_pages(1)
+        page = PageSnapshot(current_url, driver.page_source, 1, snapshot_stats)
+        save_raw_data(page.markdown, output_folder, f'rawData_1.md')
         
         data_results = process_page_data(
-            markdown,
+            page,
             settings['fields'],
             settings['model_selection'],
             output_folder,
-            1
+            fingerprint_store=fingerprint_store,
+            progress=progress,
+            near_duplicates=near_duplicates
         )
         results.update(data_results)
 
     return results
 
-def handle_unattended_mode_scraping(settings, credentials, cookie_selectors, output_folder):
+def handle_unattended_mode_scraping(settings, credentials, cookie_selectors, output_folder, fingerprint_store=None, progress=None, snapshot_stats=None, near_duplicates=None):
     """Handle scraping in unattended mode."""
     results = {
         'input_tokens': 0,
+        'cached_input_tokens': 0,
         'output_tokens': 0,
         'cost': 0,
         'data': []
     }
 
     # Create a single driver for all URLs
-    driver = setup_selenium(attended_mode=False)
+    driver = setup_selenium(
+        attended_mode=False,
+        capture_network=settings.get('use_api_capture', False),
+        profile=settings.get('launch_profile')
+    )
     st.session_state['driver'] = driver  # Store driver in session state
     
+    def finish_page(page):
+        save_raw_data(page.markdown, output_folder, f'rawData_{page.page_num}.md')
+        
+        data_results = process_page_data(
+            page,
+            settings['fields'],
+            settings['model_selection'],
+            output_folder,
+            fingerprint_store=fingerprint_store,
+            progress=progress,
+            near_duplicates=near_duplicates
+        )
+        results['input_tokens'] += data_results['input_tokens']
+        results['cached_input_tokens'] += data_results['cached_input_tokens']
+        results['output_tokens'] += data_results['output_tokens']
+        results['cost'] += data_results['cost']
+        results['data'].extend(data_results['data'])
+    
     try:
         for i, url in enumerate(settings['urls'], start=1):
+            if progress.cancelled:
+                break
+            if settings.get('use_api_capture') and i == 1 and apply_api_capture(
+                results, url, settings, output_folder, driver, credentials, cookie_selectors, progress
+            ):
+                continue
             if settings['use_pagination'] and i == 1:
                 # Use scrape_with_pagination with the shared driver
                 data, token_counts = scrape_with_pagination(
@@ -158,75 +266,152 @@ def handle_unattended_mode_scraping(settings, credentials, cookie_selectors, out
                     settings['pagination_details'],
                     driver=driver,  # Pass the shared driver
                     credentials=credentials,
-                    cookie_selectors=cookie_selectors
+                    cookie_selectors=cookie_selectors,
+                    fingerprint_store=fingerprint_store,
+                    progress=progress,
+                    snapshot_stats=snapshot_stats,
+                    near_duplicates=near_duplicates
                 )
                 results['data'].extend(data)
                 results['input_tokens'] += token_counts['input_tokens']
+                results['cached_input_tokens'] += token_counts['cached_input_tokens']
                 results['output_tokens'] += token_counts['output_tokens']
                 results['cost'] += token_counts['total_cost']
                 
-                # Get pagination info for display
-                raw_html = driver.page_source
-                markdown = html_to_markdown_with_readability(raw_html)
-                
-                pagination_data, p_token_counts, p_cost = detect_pagination_elements(
-                    url,
-                    settings['pagination_details'],
-                    settings['model_selection'],
-                    markdown
-                )
-                results['pagination_info'] = {
-                    "page_urls": pagination_data.page_urls if hasattr(pagination_data, 'page_urls') 
-                                else pagination_data.get('page_urls', []),
-                    "token_counts": p_token_counts,
-                    "price": p_cost
-                }
+                # Pagination info for display, already detected and paid for while crawling
+                results['pagination_info'] = first_page_pagination_info(token_counts['first_page'], settings)
             else:
                 # Process single page using the same driver
+                progress.add_pages(1)
                 driver.get(url)
-                raw_html = driver.page_source
-                markdown = html_to_markdown_with_readability(raw_html)
-                save_raw_data(markdown, output_folder, f'rawData_{i}.md')
-                
-                data_results = process_page_data(
-                    markdown,
-                    settings['fields'],
-                    settings['model_selection'],
-                    output_folder,
-                    i
-                )
-                results['input_tokens'] += data_results['input_tokens']
-                results['output_tokens'] += data_results['output_tokens']
-                results['cost'] += data_results['cost']
-                results['data'].extend(data_results['data'])
+                # Nothing else runs meanwhile, so the page converts inline
+                finish_page(PageSnapshot(url, driver.page_source, i, snapshot_stats))
 
         return results
     except Exception as e:
-        st.error(f"Error during unattended scraping: {str(e)}")
+        progress.message(f"Error during unattended scraping: {str(e)}", 'error')
         raise
     finally:
-        # Don't quit the driver here - let the caller handle it
-        pass
+        # Nothing reuses an unattended driver, so don't leave a browser running for the session
+        driver.quit()
+        st.session_state['driver'] = None
+
+def handle_batch_scraping(settings, credentials, cookie_selectors, output_folder, fingerprint_store=None, progress=None, snapshot_stats=None, near_duplicates=None):
+    """Handle scraping of multiple seed URLs, each with its own pagination crawl."""
+    batch = BatchScraper(
+        settings['urls'],
+        settings,
+        output_folder,
+        credentials=credentials,
+        cookie_selectors=cookie_selectors,
+        fingerprint_store=fingerprint_store,
+        progress=progress,
+        snapshot_stats=snapshot_stats,
+        near_duplicates=near_duplicates
+    )
+    
+    def publish_seed_progress(seed_progress):
+        progress.seed_progress = seed_progress
+    
+    data, totals, seed_progress = batch.run(progress_callback=publish_seed_progress)
+    return {
+        'input_tokens': totals['input_tokens'],
+        'cached_input_tokens': totals['cached_input_tokens'],
+        'output_tokens': totals['output_tokens'],
+        'cost': totals['total_cost'],
+        'data': data,
+        'seed_progress': seed_progress,
+        'request_packing': totals.get('request_packing')
+    }
 
-def process_page_data(markdown, fields, model_selection, output_folder, index):
-    """Process data from a single page."""
+def handle_batch_api_scraping(settings, credentials, cookie_selectors, output_folder, progress):
+    """Fetch all pages, then extract them through the OpenAI Batch API."""
+    driver = setup_selenium(attended_mode=False, multi_tab=True, profile=settings.get('launch_profile'))
+    st.session_state['driver'] = driver
+    try:
+        data, totals = scrape_with_batch_api(
+            settings['urls'],
+            settings['model_selection'],
+            settings['fields'],
+            output_folder,
+            settings['pagination_details'],
+            use_pagination=settings['use_pagination'],
+            driver=driver,
+            credentials=credentials,
+            cookie_selectors=cookie_selectors,
+            progress=progress
+        )
+    finally:
+        driver.quit()
+        st.session_state['driver'] = None
+    
+    if totals['batch_status'] == 'completed':
+        progress.message(f"Batch {totals['batch_id']} completed with {len(data)} page(s) extracted.", 'success')
+    return {
+        'input_tokens': totals['input_tokens'],
+        'cached_input_tokens': totals['cached_input_tokens'],
+        'output_tokens': totals['output_tokens'],
+        'cost': totals['total_cost'],
+        'data': data
+    }
+
+def apply_api_capture(results, url, settings, output_folder, driver, credentials, cookie_selectors, progress):
+    """
+    Try to scrape the URL through its JSON API and merge the outcome into results.
+    
+    Returns True if a listing API was found, False to fall back to DOM scraping.
+    """
+    captured = scrape_with_api_capture(
+        url,
+        settings['fields'],
+        output_folder,
+        driver=driver,
+        credentials=credentials,
+        cookie_selectors=cookie_selectors,
+        max_pages=API_CAPTURE_MAX_PAGES if settings['use_pagination'] else 1,
+        progress=progress
+    )
+    if captured is None:
+        progress.message("No listing API found, falling back to page scraping.")
+        return False
+    
+    data, totals = captured
+    results['data'].extend(data)
+    progress.message(f"Extracted {totals['api_pages']} page(s) from API endpoint {totals['api_endpoint']}")
+    return True
+
+def process_page_data(page, fields, model_selection, output_folder, fingerprint_store=None, progress=None, near_duplicates=None):
+    """Process data from a single page snapshot."""
+    markdown, url, index = page.markdown, page.url, page.page_num
     # Create dynamic models
     DynamicListingModel = create_dynamic_listing_model(fields)
     DynamicListingsContainer = create_listings_container_model(DynamicListingModel)
     
-    # Format data
-    formatted_data, token_counts = format_data(
-        markdown, DynamicListingsContainer, DynamicListingModel, model_selection
+    # Format data, reusing the last crawl's listings if the page is unchanged,
+    # or the extraction of a near-duplicate page of another URL
+    streamed = StreamedListingWriter(output_folder, f'streamed_data_{index}.jsonl')
+    formatted_data, token_counts, diff = extract_or_reuse(
+        fingerprint_store if url else None, page, fields,
+        lambda: extract_or_reuse_similar(
+            near_duplicates, page, fields,
+            lambda text: format_data(text, DynamicListingsContainer, DynamicListingModel, model_selection, streamed, url),
+            model_selection
+        )
     )
+    if diff is not None:
+        save_raw_data(json.dumps(diff, indent=4), output_folder, f'diff_data_{index}.json')
     
     # Calculate costs
     input_tokens, output_tokens, cost = calculate_price(token_counts, model_selection)
     
     # Save formatted data
     save_formatted_data(formatted_data, output_folder, f'sorted_data_{index}.json', f'sorted_data_{index}.xlsx')
+    if progress is not None:
+        progress.page_done(formatted_data, token_counts, cost)
     
     return {
         'input_tokens': input_tokens,
+        'cached_input_tokens': token_counts.get('cached_input_tokens', 0),
         'output_tokens': output_tokens,
         'cost': cost,
         'data': [formatted_data]
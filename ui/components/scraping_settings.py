@@ -5,13 +5,28 @@ import os
 
 # Add project root to Python path to allow importing from assets
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from assets import PRICING
+from assets import PRICING, BATCH_PRICING, AUTO_MODEL, ROUTER_SETTINGS, LAUNCH_PROFILES, DEFAULT_LAUNCH_PROFILE, PACKING_SETTINGS
 
 def render_scraping_settings():
     """Render the main scraping settings in the sidebar."""
     # Model selection
-    model_options = ["Ollama"] + [k for k in PRICING.keys() if k != "Ollama"]  # Put Ollama first
-    model_selection = st.sidebar.selectbox("Select Model", options=model_options, index=0)
+    model_options = ["Ollama", AUTO_MODEL] + [k for k in PRICING.keys() if k != "Ollama"]  # Put Ollama first
+    model_selection = st.sidebar.selectbox(
+        "Select Model",
+        options=model_options,
+        index=0,
+        help=f"{AUTO_MODEL} picks a model per page: cheap and local models first, escalating to "
+             f"{ROUTER_SETTINGS['ladder'][-1]} only when the extracted data fails validation"
+    )
+    router_budget = None
+    if model_selection == AUTO_MODEL:
+        router_budget = st.sidebar.number_input(
+            "Cost Budget ($)",
+            min_value=0.0,
+            value=ROUTER_SETTINGS['default_budget'],
+            step=0.5,
+            help="Paid models are skipped once a page would take the job over this budget"
+        )
 
     # URL input with default value
     default_url = "https://weboutilmag.sigest.services/shop-product-prices/management"
@@ -44,17 +59,20 @@ def render_scraping_settings():
     attended_mode = False
     pagination_details = ""
 
-    if num_urls <= 1:
-        # Pagination settings
-        use_pagination = st.sidebar.toggle("Enable Pagination")
-        if use_pagination:
-            pagination_details = st.sidebar.text_input(
-                "Enter Pagination Details (optional)",
-                help="Describe how to navigate through pages (e.g., 'Next' button class, URL pattern)"
-            )
+    # Pagination settings
+    use_pagination = st.sidebar.toggle(
+        "Enable Pagination",
+        help="With multiple URLs, every URL gets its own pagination crawl" if num_urls > 1 else None
+    )
+    if use_pagination:
+        pagination_details = st.sidebar.text_input(
+            "Enter Pagination Details (optional)",
+            help="Describe how to navigate through pages (e.g., 'Next' button class, URL pattern)"
+        )
 
-        st.sidebar.markdown("---")
+    st.sidebar.markdown("---")
 
+    if num_urls <= 1:
         # Attended mode toggle
         attended_mode = st.sidebar.toggle("Enable Attended Mode")
         if attended_mode:
@@ -65,8 +83,61 @@ def render_scraping_settings():
             3. Click 'Resume Scraping' when ready
             """)
     else:
-        # Multiple URLs entered; disable Pagination and Attended Mode
-        st.sidebar.info("Pagination and Attended Mode are disabled when multiple URLs are entered.")
+        # Multiple URLs entered; run them as a batch and disable Attended Mode
+        st.sidebar.info(f"Batch mode: {num_urls} URLs will be crawled in parallel. Attended Mode is disabled.")
+
+    st.sidebar.markdown("---")
+
+    # Extraction source
+    use_api_capture = st.sidebar.toggle(
+        "API Capture Mode",
+        help="Read listings from the JSON API calls the page makes instead of sending the page to the model, "
+             "and paginate the API directly. Falls back to normal scraping if no listing API is found."
+    )
+
+    # Batch API extraction, for OpenAI models outside attended mode
+    use_batch_api = False
+    if model_selection in BATCH_PRICING and not attended_mode:
+        use_batch_api = st.sidebar.toggle(
+            "Batch API Mode",
+            help="Fetch all pages first and extract them in one OpenAI Batch API job: half the price, "
+                 "but results can take up to 24 hours. Meant for large refreshes that don't need to be interactive."
+        )
+
+    # Several small pages per request, for models with schema-constrained output.
+    # Only batch crawls of several URLs have pages to pack together
+    use_request_packing = False
+    if model_selection in PACKING_SETTINGS['models'] and not attended_mode and not use_batch_api and num_urls > 1:
+        use_request_packing = st.sidebar.toggle(
+            "Pack Small Pages",
+            help="Send several small pages of the crawl in one model request instead of one request each. "
+                 "Pages are split back into their own result files; if the answer doesn't parse, "
+                 "the pages are extracted one by one."
+        )
+
+    # Re-crawl settings
+    use_change_detection = st.sidebar.toggle(
+        "Skip Unchanged Pages",
+        value=False,
+        help="Reuse the listings from the last crawl when a page hasn't changed, and save only the differences"
+    )
+    use_near_duplicates = st.sidebar.toggle(
+        "Reuse Near-Duplicate Pages",
+        value=False,
+        help="Pages that show the same listings as another URL of this run (another sort order, filter or "
+             "tracking parameter) reuse its listings; only listings that differ are sent to the model. "
+             "A page reused whole gets the other page's listings in that page's order"
+    )
+
+    # Chrome launch profile
+    profile_names = list(LAUNCH_PROFILES.keys())
+    launch_profile = st.sidebar.selectbox(
+        "Browser Profile",
+        options=profile_names,
+        index=profile_names.index(DEFAULT_LAUNCH_PROFILE),
+        help="max-density runs more pages per machine: headless, images and background services off, "
+             "capped renderer memory. compat is a full browser for sites that break without them."
+    )
 
     st.sidebar.markdown("---")
 
@@ -81,7 +152,14 @@ def render_scraping_settings():
         'fields': fields,
         'use_pagination': use_pagination,
         'pagination_details': pagination_details,
-        'attended_mode': attended_mode
+        'attended_mode': attended_mode,
+        'use_change_detection': use_change_detection,
+        'use_near_duplicates': use_near_duplicates,
+        'use_api_capture': use_api_capture,
+        'use_batch_api': use_batch_api,
+        'router_budget': router_budget,
+        'launch_profile': launch_profile,
+        'use_request_packing': use_request_packing
     })
 
     # Validate inputs
@@ -104,6 +182,13 @@ def render_scraping_settings():
         'use_pagination': use_pagination,
         'pagination_details': pagination_details,
         'attended_mode': attended_mode,
+        'use_change_detection': use_change_detection,
+        'use_near_duplicates': use_near_duplicates,
+        'use_api_capture': use_api_capture,
+        'use_batch_api': use_batch_api,
+        'router_budget': router_budget,
+        'launch_profile': launch_profile,
+        'use_request_packing': use_request_packing,
         'is_valid': is_valid,
         'error_message': error_message
     }
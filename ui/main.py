@@ -1,10 +1,13 @@
 import streamlit as st
 import sys
 import os
+import time
+from concurrent.futures import CancelledError
 
 # Add project root to Python path to allow importing from project modules
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from selenium_utils import setup_selenium, handle_cookies, handle_login
+from selenium_utils import setup_selenium, handle_cookies, handle_login, apply_consent_cookies
+from browser_governor import get_governor
 
 # Import UI components using relative imports
 from .components.api_keys import render_api_keys_section
@@ -13,7 +16,10 @@ from .components.cookie_handling import render_cookie_handling_section
 from .components.scraping_settings import render_scraping_settings
 from .components.scraping_logic import handle_scraping
 from .components.results_display import display_scraping_results
+from .components.progress_display import display_scrape_progress
 from .utils.session_state import init_session_state
+from .utils.scrape_job import ScrapeJob
+from assets import SCRAPE_JOB_SETTINGS
 
 def main():
     """Main entry point for the Universal Web Scraper UI."""
@@ -63,9 +69,16 @@ def main():
     # Handle scraping states
     if st.session_state['scraping_state'] == 'waiting':
         # Attended mode: set up driver and wait for user interaction
+        if st.session_state['driver'] is not None and not get_governor().is_alive(st.session_state['driver']):
+            print("Driver was reaped while idle, setting up a new one")  # Debug print
+            st.session_state['driver'] = None
         if st.session_state['driver'] is None:
             print("Setting up new driver")  # Debug print
-            st.session_state['driver'] = setup_selenium(attended_mode=True)
+            st.session_state['driver'] = setup_selenium(
+                attended_mode=True,
+                capture_network=settings.get('use_api_capture', False),
+                profile=settings.get('launch_profile')
+            )
             
             # First handle login if enabled
             if st.session_state.get('credentials'):
@@ -87,6 +100,7 @@ def main():
             
             # Then navigate to the target URL
             print(f"Navigating to URL: {settings['urls'][0]}")  # Debug print
+            apply_consent_cookies(st.session_state['driver'], settings['urls'][0])
             st.session_state['driver'].get(settings['urls'][0])
             
             # Handle cookies if enabled
@@ -105,27 +119,47 @@ def main():
             st.rerun()
 
     elif st.session_state['scraping_state'] == 'scraping':
-        # Perform scraping
-        try:
+        # Scraping runs in the background; each rerun shows its progress so far
+        job = st.session_state.get('scrape_job')
+        if job is None:
             print("Starting scraping with credentials:", st.session_state.get('credentials'))  # Debug print
-            results = handle_scraping(
+            job = ScrapeJob(
+                handle_scraping,
                 settings,
                 st.session_state.get('credentials'),  # Use credentials from session state
                 st.session_state.get('cookie_selectors')  # Use cookie selectors from session state
             )
-            st.session_state['results'] = results
-            st.session_state['scraping_state'] = 'completed'
+            st.session_state['scrape_job'] = job
+
+        st.subheader("Scraping in progress...")
+        display_scrape_progress(job.progress.snapshot())
+        if not job.progress.cancelled and st.button("Cancel Scraping"):
+            job.cancel()
+
+        if job.done():
+            st.session_state['scrape_job'] = None
+            try:
+                st.session_state['results'] = job.result()
+                st.session_state['scraping_state'] = 'completed'
+            except CancelledError:
+                st.session_state['scraping_state'] = 'idle'
+            except Exception as e:
+                st.error(f"Error during scraping: {str(e)}")
+                print(f"Scraping error: {str(e)}")  # Debug print
+                if st.session_state.get('driver'):
+                    st.session_state['driver'].quit()
+                    st.session_state['driver'] = None
+                st.session_state['scraping_state'] = 'idle'
+            else:
+                st.rerun()
+        else:
+            time.sleep(SCRAPE_JOB_SETTINGS['poll_interval'])
             st.rerun()
-        except Exception as e:
-            st.error(f"Error during scraping: {str(e)}")
-            print(f"Scraping error: {str(e)}")  # Debug print
-            if st.session_state.get('driver'):
-                st.session_state['driver'].quit()
-                st.session_state['driver'] = None
-            st.session_state['scraping_state'] = 'idle'
 
     # Display results if available
     if st.session_state['scraping_state'] == 'completed' and st.session_state['results']:
+        if st.session_state['results'].get('cancelled'):
+            st.warning("Scraping was cancelled. Showing the pages scraped before cancelling.")
         display_scraping_results(st.session_state['results'], settings['show_tags'])
         
         # Reset scraping state button
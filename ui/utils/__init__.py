@@ -4,9 +4,11 @@ This package contains utility functions and helpers used across the UI component
 """
 
 from .session_state import init_session_state, reset_session_state, get_session_state
+from .scrape_job import ScrapeJob
 
 __all__ = [
     'init_session_state',
     'reset_session_state',
-    'get_session_state'
+    'get_session_state',
+    'ScrapeJob'
 ]
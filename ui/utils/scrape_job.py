@@ -0,0 +1,50 @@
+"""
+Background execution of scrape runs.
+
+Scraping runs on a shared thread pool instead of inside the Streamlit script,
+so the page stays responsive: it polls the job's ScrapeProgress on every rerun
+and can cancel the job at any time.
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# Add project root to Python path to allow importing from project modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from assets import SCRAPE_JOB_SETTINGS
+from scrape_progress import ScrapeProgress
+
+_executor = ThreadPoolExecutor(
+    max_workers=SCRAPE_JOB_SETTINGS["max_concurrent_jobs"],
+    thread_name_prefix="scrape-job"
+)
+
+class ScrapeJob:
+    """A scrape function running in the background with its progress and result."""
+
+    def __init__(self, target, *args, **kwargs):
+        self.progress = ScrapeProgress()
+        # The job reads API keys and the driver from the session that started it
+        script_ctx = get_script_run_ctx()
+
+        def run():
+            add_script_run_ctx(threading.current_thread(), script_ctx)
+            return target(*args, progress=self.progress, **kwargs)
+
+        self.future = _executor.submit(run)
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        """Ask the job to stop after the page it is working on; partial results are kept."""
+        self.progress.cancel()
+        self.future.cancel()  # Only succeeds if the job hasn't started yet
+
+    def result(self):
+        """Return the job's result, re-raising any exception it failed with."""
+        return self.future.result()
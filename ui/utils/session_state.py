@@ -14,6 +14,10 @@ def init_session_state():
     if 'results' not in st.session_state:
         st.session_state['results'] = None
     
+    # Background scrape job
+    if 'scrape_job' not in st.session_state:
+        st.session_state['scrape_job'] = None
+    
     # Selenium driver
     if 'driver' not in st.session_state:
         st.session_state['driver'] = None
@@ -64,6 +68,11 @@ def reset_session_state():
     st.session_state['credentials'] = None
     st.session_state['cookie_selectors'] = []
     
+    # Stop a running scrape job
+    if st.session_state.get('scrape_job'):
+        st.session_state['scrape_job'].cancel()
+        st.session_state['scrape_job'] = None
+    
     # Clean up Selenium driver if it exists
     if st.session_state.get('driver'):
         try:
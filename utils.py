@@ -1,7 +1,16 @@
 import re
+import json
 from datetime import datetime
 import tiktoken
-from assets import PRICING
+from assets import PRICING, BATCH_PRICING
+
+def count_tokens(text, model='gpt-4o-mini'):
+    """Tokens in text for model's tokenizer (cl100k_base if unknown)."""
+    try:
+        encoder = tiktoken.encoding_for_model(str(model))
+    except KeyError:
+        encoder = tiktoken.get_encoding('cl100k_base')
+    return len(encoder.encode(text))
 
 def trim_to_token_limit(text, model, max_tokens=120000):
     encoder = tiktoken.encoding_for_model(model)
@@ -11,12 +20,25 @@ def trim_to_token_limit(text, model, max_tokens=120000):
         return trimmed_text
     return text
 
-def calculate_price(token_counts, model):
+def calculate_price(token_counts, model, batch=False):
     input_token_count = token_counts.get("input_tokens", 0)
     output_token_count = token_counts.get("output_tokens", 0)
+    if "attempts" in token_counts:
+        # Routed extraction: every model tried is billed at its own rate
+        total_cost = sum(calculate_price(attempt["token_counts"], attempt["model"], batch)[2]
+                         for attempt in token_counts["attempts"])
+        return input_token_count, output_token_count, total_cost
+    if not input_token_count and not output_token_count:
+        # Nothing was sent, e.g. listings reused from the last crawl
+        return 0, 0, 0
+    # Prompt tokens served from the provider's prefix cache are part of
+    # input_tokens but billed at the discounted cached rate
+    cached_token_count = min(token_counts.get("cached_input_tokens", 0), input_token_count)
     
-    input_cost = input_token_count * PRICING[model]["input"]
-    output_cost = output_token_count * PRICING[model]["output"]
+    pricing = BATCH_PRICING[model] if batch else PRICING[model]
+    input_cost = (input_token_count - cached_token_count) * pricing["input"]
+    input_cost += cached_token_count * pricing.get("cached_input", pricing["input"])
+    output_cost = output_token_count * pricing["output"]
     total_cost = input_cost + output_cost
     
     return input_token_count, output_token_count, total_cost
@@ -25,3 +47,19 @@ def generate_unique_folder_name(url):
     timestamp = datetime.now().strftime('%Y_%m_%d__%H_%M_%S')
     url_name = re.sub(r'\W+', '_', url.split('//')[1].split('/')[0])
     return f"{url_name}_{timestamp}"
+
+def extract_listings(formatted_data):
+    """Return the listings of a format_data result as a list of plain dicts."""
+    if isinstance(formatted_data, str):
+        try:
+            formatted_data = json.loads(formatted_data)
+        except json.JSONDecodeError:
+            return []
+    if hasattr(formatted_data, 'listings'):
+        return [item.dict() if hasattr(item, 'dict') else item for item in formatted_data.listings]
+    if isinstance(formatted_data, dict):
+        listings = formatted_data.get('listings', [])
+        return listings if isinstance(listings, list) else [listings]
+    if isinstance(formatted_data, list):
+        return formatted_data
+    return []